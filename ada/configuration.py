@@ -1,3 +1,7 @@
+# Standard imports
+import os
+from collections import namedtuple
+
 # Global configuration for the app
 file_types = ["Algem Pro", "Algem HT24", "IP", "PSI", "ADA", "MicrobeMeter", "SpectroStar"]
 replicate_types = ["Algem Pro", "IP", "PSI", "ADA", "MicrobeMeter"]
@@ -17,6 +21,8 @@ font_options = ["sans-serif", "serif", "cursive", "fantasy", "monospace"]
 table_row_options = ["profile", "reactor", "gradient", "time to",
                      "average of condition", "condition at time",
                      "fit parameter"]
+outlier_options = ["jump", "hampel", "rolling MAD", "z-score"]
+calibration_options = ["linear", "PCHIP", "polynomial", "log-linear"]
 fit_options = ["flat line", "linear", "quadratic", "exponential", "zweitering"]
 test_options = ["T-test", "ANOVA"]
 measurement_options = ['',"gradient", "time to", "fit parameter"]
@@ -109,6 +115,23 @@ sg_order = 0
 sg_deriv = 0
 sg_rate = 1
 outlier_threshold = 20
+outlier_method = 'jump'
+outlier_window = 11
+outlier_sigma = 3
+calibration_model = 'linear'
+calibration_degree = 2
+load_workers = 4
+fit_workers = 4
+# Maximum size of the processed data kept in memory in MB
+processing_cache_size = 250
+# Maximum number of fit results kept in memory
+fit_cache_size = 1000
+
+# Cache of previously read in files
+use_cache = True
+cache_dir = os.path.join(os.path.expanduser('~'), '.ada', 'cache')
+# Maximum size of the cache in MB
+cache_size = 1000
 
 # Fitting configuration
 do_fit = False
@@ -118,4 +141,32 @@ fit_from = 0
 fit_to = 0
 fit_start = []
 fit_min = []
-fit_max = []
\ No newline at end of file
+fit_max = []
+
+# Class: Immutable snapshot of the settings used to process and fit data
+# Hashable so it can be used as a cache key and sent to worker processes
+class ProcessingConfig(namedtuple('ProcessingConfig', [
+        'xvar', 'yvar', 'condition_yvar', 'ynormlog',
+        'calibration_model', 'calibration_degree',
+        'initial_y', 'align', 'y_alignment',
+        'remove_above', 'remove_below', 'auto_remove', 'outlier_threshold',
+        'outlier_method', 'outlier_window', 'outlier_sigma',
+        'smooth', 'sg_window_size', 'sg_order', 'sg_deriv', 'sg_rate',
+        'growth_average', 'condition_average', 'std_err',
+        'fit_type', 'fit_from', 'fit_to', 'fit_start', 'fit_min', 'fit_max'])):
+    __slots__ = ()
+
+    # Values of a group of settings
+    def subset(self, fields):
+        return tuple(getattr(self, field) for field in fields)
+
+
+# Take a snapshot of the current processing settings
+def processing_config():
+    values = []
+    for field in ProcessingConfig._fields:
+        value = globals()[field]
+        if isinstance(value, list):
+            value = tuple(value)
+        values.append(value)
+    return ProcessingConfig(*values)
@@ -1,6 +1,106 @@
 from datetime import datetime, date, time
+import hashlib
+import itertools
+import weakref
 import numpy as np
 
+# Read only arrays that can be shared between datasets, keyed by contents
+# Entries disappear once no dataset is using them
+shared_arrays = weakref.WeakValueDictionary()
+# Every change to a buffer gets a new number so cached results can be checked
+buffer_versions = itertools.count()
+
+
+# Get a read only array with the same contents as the data, shared if possible
+def share_array(data):
+    data = np.ascontiguousarray(data, dtype=float).reshape(-1)
+    key = (data.size, hashlib.sha1(data.tobytes()).hexdigest())
+    shared = shared_arrays.get(key)
+    if shared is not None and np.array_equal(shared, data):
+        return shared
+    # Writes have to go through the buffer, which copies first
+    data = data.view()
+    data.flags.writeable = False
+    shared_arrays[key] = data
+    return data
+
+
+# Class: Growable column of float64 data with amortised constant time appends
+class ColumnBuffer():
+
+    def __init__(self, data=None):
+        self._buffer = np.empty(0)
+        self._size = 0
+        # False when the buffer wraps an array that belongs to someone else
+        self._owned = True
+        self.version = next(buffer_versions)
+        if data is not None:
+            self.set(data)
+
+    # Buffers that come from other processes were numbered there, so give
+    # them a new version from this process
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.version = next(buffer_versions)
+
+    def __len__(self):
+        return self._size
+
+    def get(self):
+        return self._buffer[:self._size]
+
+    def set(self, data):
+        data = np.asarray(data, dtype=float)
+        if data.ndim != 1:
+            data = data.reshape(-1)
+        self._buffer = data
+        self._size = self._buffer.size
+        self._owned = False
+        self.version = next(buffer_versions)
+
+    def reserve(self, size):
+        if self._owned and size <= self._buffer.size:
+            return
+        # Double the capacity so that appends are amortised O(1)
+        capacity = max(size, 2 * self._buffer.size, 16)
+        if self._owned:
+            try:
+                # Grow in place where possible to avoid a second allocation
+                self._buffer.resize(capacity, refcheck=True)
+                return
+            except ValueError:
+                pass
+        new_buffer = np.empty(capacity)
+        new_buffer[:self._size] = self._buffer[:self._size]
+        self._buffer = new_buffer
+        self._owned = True
+
+    def append(self, dat):
+        self.reserve(self._size + 1)
+        self._buffer[self._size] = dat
+        self._size += 1
+        self.version = next(buffer_versions)
+
+    def extend(self, dat):
+        dat = np.asarray(dat, dtype=float).reshape(-1)
+        self.reserve(self._size + dat.size)
+        self._buffer[self._size:self._size + dat.size] = dat
+        self._size += dat.size
+        self.version = next(buffer_versions)
+
+    # Swap the data for a shared read only copy, appends will copy it first
+    def share(self):
+        self.set(share_array(self.get()))
+
+    # Release any spare capacity once all of the data has been read
+    def finalise(self):
+        if not self._owned or self._buffer.size == self._size:
+            return
+        try:
+            self._buffer.resize(self._size, refcheck=True)
+        except ValueError:
+            self._buffer = self._buffer[:self._size].copy()
+
 
 # Class to store algae data
 class AlgaeData():
@@ -82,7 +182,7 @@ class AlgaeData():
             x_title = x_title.replace("["+self.xaxis.unit+"]", "["+x_unit+"]")
         return x_title
         
-    def get_ydata(self, yvar, calib=None):
+    def get_ydata(self, yvar, calib=None, model='linear', degree=2):
         found_ydata = False
         for sig in self.signals:
             if sig.name == yvar:
@@ -93,7 +193,7 @@ class AlgaeData():
                 ydata = sig.data
             elif yvar == 'CD' and calib is not None and sig.name == 'OD':
                 found_ydata = True
-                ydata = calib.calibrate_od(sig.data)
+                ydata = calib.calibrate_od(sig.data, model, degree)
         if not found_ydata:
             raise RuntimeError('Could not find signal %s' % (yvar))
         return ydata
@@ -125,6 +225,19 @@ class AlgaeData():
                 y_title = y_title + " ["+unit_name+"]"
         return y_title
 
+    # Identifies the current contents of the dataset, changes whenever the
+    # data is modified
+    def version(self):
+        return (self.xaxis.buffer.version,
+                tuple((sig.name, sig.buffer.version) for sig in self.signals))
+
+    # Trim the data buffers to their final size after reading
+    # Time axes are shared with any other dataset measured at the same times
+    def finalise(self):
+        self.xaxis.buffer.finalise()
+        self.xaxis.buffer.share()
+        for sig in self.signals:
+            sig.buffer.finalise()
 
     # Class: Store x axis data (time)
     class XAxis():
@@ -132,7 +245,15 @@ class AlgaeData():
         def __init__(self):
             self.name = ''
             self.unit = ''
-            self.data = np.array([])
+            self.buffer = ColumnBuffer()
+
+        @property
+        def data(self):
+            return self.buffer.get()
+
+        @data.setter
+        def data(self, data):
+            self.buffer.set(data)
 
         def set_info(self, info):
             for i in info:
@@ -141,15 +262,21 @@ class AlgaeData():
                 if i.find('Unit=') != -1:
                     self.unit = i.split('=')[1]
 
-        def append(self, dat):
+        # Conversion factor from the file time unit to seconds
+        def scale(self):
             if self.unit.lower() in ['m', 'min', 'mins', 'minutes', 'minute']:
-                self.data = np.append(self.data, dat * 60.)
+                return 60.
             elif self.unit.lower() in ['h', 'hr', 'hrs', 'hour', 'hours']:
-                self.data = np.append(self.data, dat * 60. * 60.)
+                return 60. * 60.
             elif self.unit.lower() in ['d', 'day', 'days']:
-                self.data = np.append(self.data, dat * 60. * 60. * 24.)
-            else:
-                self.data = np.append(self.data, dat)
+                return 60. * 60. * 24.
+            return 1.
+
+        def append(self, dat):
+            self.buffer.append(dat * self.scale())
+
+        def extend(self, dat):
+            self.buffer.extend(np.asarray(dat, dtype=float) * self.scale())
 
         def title(self):
             return self.name + " [" + self.unit + "]"
@@ -168,10 +295,21 @@ class AlgaeData():
                     self.unit = i.split('=')[1]
                 if i.find('Range=') != -1:
                     self.range = float(i.split('=')[1])
-            self.data = np.array([])
+            self.buffer = ColumnBuffer()
+
+        @property
+        def data(self):
+            return self.buffer.get()
+
+        @data.setter
+        def data(self, data):
+            self.buffer.set(data)
 
         def append(self, dat):
-            self.data = np.append(self.data, dat)
+            self.buffer.append(dat)
+
+        def extend(self, dat):
+            self.buffer.extend(dat)
 
         def title(self):
             return self.name + " [" + self.unit + "]"
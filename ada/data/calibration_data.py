@@ -1,4 +1,5 @@
 import numpy as np
+from scipy.interpolate import PchipInterpolator
 
 
 # Class to store algae data
@@ -10,32 +11,104 @@ class CalibrationData():
         # Data information
         self.true = []
         self.measured = []
+        # Piecewise linear model, made by compile()
+        self.breakpoints = None
+        self.values = None
+        self.slopes = None
+        # Other calibration models, the selected one is fitted by compile()
+        self.models = {}
 
-    def calibrate_od(self, ods):
-        cds = []
-        measured = self.measured
-        true = self.true
+    # Precompute the piecewise linear calibration curve and fit the selected
+    # model, so a calibration that doesn't work is found when it is loaded
+    # Needs to be called again if the calibration points change
+    def compile(self, model='linear', degree=2):
+        self.models = {}
+        measured = np.asarray(self.measured, dtype=float)
+        true = np.asarray(self.true, dtype=float)
+        size = measured.size
+        if size < 2 or size != true.size:
+            self.breakpoints = np.array([])
+            return
         if measured[0] > measured[-1]:
-            measured = list(reversed(self.measured))
-            true = list(reversed(self.true))
-        size = len(measured)
-        if size < 2 or size != len(true):
+            measured = measured[::-1]
+            true = true[::-1]
+        self.breakpoints = measured
+        self.values = true
+        # Slopes of the lines projected out from the first and last points
+        self.slopes = (
+            (true[1] - true[0]) / (measured[1] - measured[0]),
+            (true[-1] - true[-2]) / (measured[-1] - measured[-2]))
+        self.get_model(model, degree)
+
+    # Get a fitted calibration model, fitting it if it hasn't been already
+    # Only the polynomial depends on the degree
+    def get_model(self, model, degree):
+        if model == 'linear':
+            return None
+        if model == 'polynomial':
+            if not isinstance(degree, (int, np.integer)) or degree < 1:
+                raise RuntimeError('Issue processing calibration:\n'
+                                   'Polynomial degree must be a whole number '
+                                   'above 0, not %s' % degree)
+        else:
+            degree = None
+        key = (model, degree)
+        if key not in self.models:
+            self.models[key] = self.fit_model(model, degree)
+        return self.models[key]
+
+    # Fit one of the calibration models to the calibration points
+    def fit_model(self, model, degree):
+        measured = self.breakpoints
+        true = self.values
+        if model == 'PCHIP':
+            # Sort so that unordered calibration points still work
+            order = np.argsort(measured)
+            curve = PchipInterpolator(measured[order], true[order])
+            return curve, curve.derivative()
+        if model == 'polynomial':
+            if measured.size <= degree:
+                raise RuntimeError('Issue processing calibration:\n'
+                                   'Need more than %i points for a degree %i '
+                                   'polynomial' % (degree, degree))
+            return np.polyfit(measured, true, degree)
+        if model == 'log-linear':
+            if np.any(true <= 0):
+                raise RuntimeError('Issue processing calibration:\n'
+                                   'Log-linear calibration needs positive '
+                                   'values')
+            return np.polyfit(measured, np.log(true), 1)
+        raise RuntimeError('Issue processing calibration:\n'
+                           'Unknown calibration model %s' % model)
+
+    def calibrate_od(self, ods, model='linear', degree=2):
+        if self.breakpoints is None:
+            self.compile()
+        ods = np.asarray(ods, dtype=float)
+        if self.breakpoints.size < 2:
             return ods
+        measured = self.breakpoints
+        true = self.values
+        if model == 'linear':
+            cds = np.interp(ods, measured, true)
+            # Project out from the first and last points
+            low = ods < measured[0]
+            cds[low] = true[0] + self.slopes[0] * (ods[low] - measured[0])
+            high = ods > measured[-1]
+            cds[high] = true[-1] + self.slopes[1] * (ods[high] - measured[-1])
+            return cds
 
-        low_p = np.polyfit([measured[0], measured[1]], [true[0], true[1]], 1)
-        low_fit = np.poly1d(low_p)
-        high_p = np.polyfit([measured[size-2], measured[size-1]],
-                            [true[size-2], true[size-1]], 1)
-        high_fit = np.poly1d(high_p)
-        for od in ods:
-            cd = 0
-            if od < measured[0]:
-                # Project out from first point
-                cd = low_fit(od)
-            elif od > measured[-1]:
-                # Project out from last point
-                cd = high_fit(od)
-            else:
-                cd = np.interp(od, measured, true)
-            cds.append(cd)
-        return cds
+        fitted = self.get_model(model, degree)
+        if model == 'PCHIP':
+            curve, derivative = fitted
+            low, high = curve.x[0], curve.x[-1]
+            cds = curve(np.clip(ods, low, high))
+            # Project out along the end slopes so the curve stays monotonic
+            below = ods < low
+            cds[below] += derivative(low) * (ods[below] - low)
+            above = ods > high
+            cds[above] += derivative(high) * (ods[above] - high)
+            return cds
+        if model == 'polynomial':
+            return np.polyval(fitted, ods)
+        return np.exp(np.polyval(fitted, ods))
@@ -1,15 +1,36 @@
 import numpy as np
-from scipy.optimize import curve_fit
 
 # Local includes
 from ada.data.data_holder import DataHolder
-from ada.data.processor import (process_data, time_average, time_average_arrays,
-                                average_data, calculate_gradient, calculate_time_to, get_fit_data_range)
+from ada.data.processor import (align_data, clean_data, time_average, time_average_arrays, average_blocks,
+                                savitzky_golay_batch, average_data, calculate_gradients, calculate_times_to, get_fit_data_range,
+                                calibration_config, alignment_config, outlier_config, smoothing_config)
+from ada.data.stage_cache import StageCache, Stage
 from ada.data.models import get_model
+from ada.data.fitting import FitJob, FitCache, CONVERGED, FAILED
 import ada.configuration as config
 from ada.logger import logger
 
 
+# Function to smooth all of the replicates of a data set together
+def smooth_replicates(settings, *xys):
+    xdatas = [xy[0] for xy in xys]
+    ydatas = [xy[1] for xy in xys]
+    if settings.smooth:
+        ydatas = savitzky_golay_batch(ydatas, settings.sg_window_size, settings.sg_order,
+                                      settings.sg_deriv, settings.sg_rate)
+    return xdatas, ydatas
+
+
+# Function to take the log of the data relative to the first point
+def normlog_data(xdata, ydata, yerr, ynormlog):
+    if ynormlog:
+        if yerr is not None:
+            yerr = yerr/ydata
+        ydata = np.log(ydata/ydata[0])
+    return xdata, ydata, yerr
+
+
 # Class to store data files in
 class DataManager():
 
@@ -17,11 +38,51 @@ class DataManager():
         self.growth_data = DataHolder()
         self.condition_data = DataHolder()
         self.calibration = None
+        # Results of each processing step
+        self.cache = StageCache()
+        # Results of fits to the processed data
+        self.fit_cache = FitCache()
 
     def clear(self):
         self.growth_data.clear()
         self.condition_data.clear()
         self.calibration = None
+        self.cache.clear()
+        self.fit_cache.clear()
+
+    # Create a processing step that depends on a group of settings
+    def config_stage(self, name, settings, fields, inputs, func):
+        return Stage(self.cache, name, settings.subset(fields), inputs, func)
+
+    # Processing pipeline for a single data set, stops after outlier removal
+    def replicate_stage(self, data, signal_name, xvar, settings, calibrate=True):
+        unit = Stage(self.cache, 'unit', (data.version(), xvar), [],
+                     lambda: data.get_xdata(xvar))
+        calibration = None
+        model = ()
+        if calibrate and signal_name == 'CD' and self.calibration is not None:
+            calibration = self.calibration
+            model = settings.subset(calibration_config)
+        signal = Stage(self.cache, 'calibration', (data.version(), signal_name, calibration, model), [],
+                       lambda: np.asarray(data.get_ydata(signal_name, calibration, *model), dtype=float))
+        if not calibrate:
+            return [unit, signal]
+        alignment = self.config_stage('alignment', settings, alignment_config, [unit, signal],
+                                      lambda x, y: align_data(x, y, settings))
+        return self.config_stage('outliers', settings, outlier_config, [alignment],
+                                 lambda xy: clean_data(xy[0], xy[1], settings))
+
+    # Processing pipeline for averaging replicates
+    def average_stage(self, xy_stage, time_window, std_err):
+        return Stage(self.cache, 'averaging', (time_window, std_err), [xy_stage],
+                     lambda xy: self.get_averaged_data(xy[0], xy[1], time_window, std_err))
+
+    # Processing pipeline for all replicates of a growth data set
+    def growth_stage(self, i, signal_name, xvar, settings):
+        reps = [self.replicate_stage(rep, signal_name, xvar, settings)
+                for rep in self.growth_data.replicate_files[i]]
+        return self.config_stage('smoothing', settings, smoothing_config, reps,
+                                 lambda *xys: smooth_replicates(settings, *xys))
 
     def get_growth_data_files(self):
         return self.growth_data.data_files
@@ -118,37 +179,32 @@ class DataManager():
             raise RuntimeError('No data found')
         return xdata, ydata, yerr
 
-    def get_replicate_xy_data(self, i, signal_name, xvar=None):
+    def get_replicate_xy_data(self, i, signal_name, xvar=None, settings=None):
+        if settings is None:
+            settings = config.processing_config()
         if xvar is None:
-            xvar = config.xvar
-
-        xdatas = []
-        ydatas = []
-        for rep in self.growth_data.replicate_files[i]:
-            xdata = rep.get_xdata(xvar)
-            ydata = rep.get_ydata(signal_name, self.calibration)
-            xdata, ydata = process_data(xdata, ydata)
-            xdatas.append(xdata)
-            ydatas.append(ydata)
+            xvar = settings.xvar
 
-        return xdatas, ydatas
+        xdatas, ydatas = self.growth_stage(i, signal_name, xvar, settings).result()
+        return list(xdatas), list(ydatas)
 
-    def get_xy_data(self, i, signal_name, xvar=None, growth_average=None, std_err=False, ynormlog=False):
-        if config.std_err:
+    def get_xy_data(self, i, signal_name, xvar=None, growth_average=None, std_err=False, ynormlog=False,
+                    settings=None):
+        if settings is None:
+            settings = config.processing_config()
+        if xvar is None:
+            xvar = settings.xvar
+        if settings.std_err:
             std_err = True
-        if config.ynormlog:
+        if settings.ynormlog:
             ynormlog = True
         if growth_average is None:
-            growth_average = config.growth_average
-
-        xdatas, ydatas = self.get_replicate_xy_data(i, signal_name, xvar)
-        xdata, ydata, yerr = self.get_averaged_data(xdatas, ydatas, growth_average, std_err)
-        if ynormlog:
-            if yerr is not None:
-                yerr = yerr/ydata
-            ydata = np.log(ydata/ydata[0])
+            growth_average = settings.growth_average
 
-        return xdata, ydata, yerr
+        averaging = self.average_stage(self.growth_stage(i, signal_name, xvar, settings), growth_average, std_err)
+        normlog = Stage(self.cache, 'normlog', ynormlog, [averaging],
+                        lambda result: normlog_data(*result, ynormlog))
+        return normlog.result()
 
     def get_xtitle(self, i, xvar=None, xname=None, xunit=None):
         if xvar is None:
@@ -202,12 +258,15 @@ class DataManager():
             legend_label = self.growth_data.data_files[i].get_header_info(extra_info)
         return legend_label
 
-    def get_condition_xy_data(self, i, cond_name, xvar=None, condition_average=None, std_err=False):
+    def get_condition_xy_data(self, i, cond_name, xvar=None, condition_average=None, std_err=False,
+                              settings=None):
+        if settings is None:
+            settings = config.processing_config()
         if xvar is None:
-            xvar = config.xvar
+            xvar = settings.xvar
         if condition_average is None:
-            condition_average = config.condition_average
-        if config.std_err:
+            condition_average = settings.condition_average
+        if settings.std_err:
             std_err = True
 
         for j, cond in enumerate(self.condition_data.data_files):
@@ -219,29 +278,28 @@ class DataManager():
                 continue
             if self.growth_data.data_files[i].time != cond.time:
                 continue
-            return self.get_condition_data(j, xvar, cond_name, condition_average, std_err)
+            return self.get_condition_data(j, xvar, cond_name, condition_average, std_err, settings)
         raise RuntimeError('No condition data found for %s'
                            % (self.growth_data.data_files[i].name))
 
-    def get_condition_data(self, i, xvar=None, yvar=None, condition_average=None, std_err=False):
+    def get_condition_data(self, i, xvar=None, yvar=None, condition_average=None, std_err=False,
+                           settings=None):
+        if settings is None:
+            settings = config.processing_config()
         if xvar is None:
-            xvar = config.xvar
+            xvar = settings.xvar
         if yvar is None:
-            yvar = config.condition_yvar
+            yvar = settings.condition_yvar
         if condition_average is None:
-            condition_average = config.condition_average
-        if config.std_err:
-            std_err = config.std_err
+            condition_average = settings.condition_average
+        if settings.std_err:
+            std_err = settings.std_err
 
-        xdatas = []
-        ydatas = []
-        for rep in self.condition_data.replicate_files[i]:
-            xdata = rep.get_xdata(xvar)
-            ydata = rep.get_ydata(yvar)
-            xdatas.append(xdata)
-            ydatas.append(ydata)
-        
-        return self.get_averaged_data(xdatas, ydatas, condition_average, std_err)
+        reps = [self.replicate_stage(rep, yvar, xvar, settings, calibrate=False)
+                for rep in self.condition_data.replicate_files[i]]
+        replicates = Stage(self.cache, 'replicates', None, sum(reps, []),
+                           lambda *xys: (xys[::2], xys[1::2]))
+        return self.average_stage(replicates, condition_average, std_err).result()
 
     def get_condition_ytitle(self, i, yvar=None, yname=None, yunit=None):
         if yvar is None:
@@ -274,156 +332,156 @@ class DataManager():
                 self.condition_data.data_files[i].get_header_info(extra_info)
         return legend_label
 
-    def get_replicate_gradients(self, i, signal_name, grad_from, grad_to):
+    # Get the processed data of every growth data set
+    def get_all_xy_data(self, signal_name, settings=None):
+        xdatas = []
+        ydatas = []
+        for i, _ in enumerate(self.growth_data.data_files):
+            xdata, ydata, _ = self.get_xy_data(i, signal_name, settings=settings)
+            xdatas.append(xdata)
+            ydatas.append(ydata)
+        return xdatas, ydatas
+
+    def get_replicate_gradients(self, i, signal_name, grad_from, grad_to, settings=None):
         logger.debug('Getting gradient of %s from %.2f to %.2f' %
                      (signal_name, grad_from, grad_to))
-        gradients = []
-        xdatas, ydatas = self.get_replicate_xy_data(i, signal_name)
-        for rep_i, xdata in enumerate(xdatas):
-            gradients.append(calculate_gradient(xdata, ydatas[rep_i], grad_from, grad_to))
-        return gradients
+        xdatas, ydatas = self.get_replicate_xy_data(i, signal_name, settings=settings)
+        return calculate_gradients(xdatas, ydatas, grad_from, grad_to)
 
-    def get_gradients(self, signal_name, grad_from, grad_to):
+    def get_gradients(self, signal_name, grad_from, grad_to, settings=None):
         logger.debug('Getting gradient of %s from %.2f to %.2f' %
                      (signal_name, grad_from, grad_to))
-        gradients = []
-        for i, _ in enumerate(self.growth_data.data_files):
-            xdata, ydata, _ = self.get_xy_data(i, signal_name)
-            gradients.append(calculate_gradient(xdata, ydata, grad_from, grad_to))
-        return gradients
+        xdatas, ydatas = self.get_all_xy_data(signal_name, settings)
+        return calculate_gradients(xdatas, ydatas, grad_from, grad_to)
 
-    def get_replicate_time_to(self, i, signal_name, time_to):
+    def get_replicate_time_to(self, i, signal_name, time_to, settings=None):
         logger.debug('Getting the time to reach %s of %.2f' %
                      (signal_name, time_to))
-        times = []
-        xdatas, ydatas = self.get_replicate_xy_data(i, signal_name)
-        for rep_i, xdata in enumerate(xdatas):
-            times.append(calculate_time_to(xdata, ydatas[rep_i], time_to))
-        return times
+        xdatas, ydatas = self.get_replicate_xy_data(i, signal_name, settings=settings)
+        return calculate_times_to(xdatas, ydatas, time_to)
 
-    def get_time_to(self, signal_name, time_to):
+    def get_time_to(self, signal_name, time_to, settings=None):
         logger.debug('Getting the time to reach %s of %.2f' %
                      (signal_name, time_to))
-        times = []
-        for i, _ in enumerate(self.growth_data.data_files):
-            xdata, ydata, _ = self.get_xy_data(i, signal_name)
-            times.append(calculate_time_to(xdata, ydata, time_to))
-            
-        return times
+        xdatas, ydatas = self.get_all_xy_data(signal_name, settings)
+        return calculate_times_to(xdatas, ydatas, time_to)
 
-    def get_averages(self, cond_name, start_t, end_t):
+    def get_averages(self, cond_name, start_t, end_t, settings=None):
         logger.debug('Getting average of %s between time %.2f and %.2f' %
                      (cond_name, start_t, end_t))
+        if settings is None:
+            settings = config.processing_config()
         averages = []
         errors = []
         for i, _ in enumerate(self.growth_data.data_files):
-            xdata, ydata, _ = self.get_condition_xy_data(i, cond_name)
-            dat = np.array([])
-            for i, x in enumerate(xdata):
-                if x >= start_t and x <= end_t:
-                    dat = np.append(dat, ydata[i])
-            if dat.size == 0:
-                averages.append(None)
-                errors.append(None)
-                continue
-            mean = np.mean(dat)
+            xdata, ydata, _ = self.get_condition_xy_data(i, cond_name, settings=settings)
+            # Conditions are processed as whole arrays, so this is one block
+            mean, error = average_blocks([(xdata, ydata)], start_t, end_t,
+                                         settings.std_err)
             averages.append(mean)
-            if config.std_err:
-                errors.append(np.std(dat, ddof=1)/np.sqrt(dat.size))
-            else:
-                errors.append(np.std(dat, ddof=1))
+            errors.append(error)
         return averages, errors
 
-    def get_condition_at(self, cond_name, time):
+    def get_condition_at(self, cond_name, time, settings=None):
         logger.debug('Getting condition %s at time %.2f' % (cond_name, time))
         values = []
         for i, _ in enumerate(self.growth_data.data_files):
-            xdata, ydata, _ = self.get_condition_xy_data(i, cond_name)
+            xdata, ydata, _ = self.get_condition_xy_data(i, cond_name, settings=settings)
             values.append(np.interp(time, xdata, ydata))
         return values
 
-    def get_all_fit_params(self, signal_name, fit_name, fit_from, fit_to, fit_param):
+    # Fit every data set at once, results are in the same order as the data
+    def get_all_fits(self, signal_name, fit_name, fit_from, fit_to, settings=None):
+        if settings is None:
+            settings = config.processing_config()
+        jobs = [self.get_fit_job(i, signal_name, fit_name, fit_from, fit_to, settings=settings)
+                for i, _ in enumerate(self.growth_data.data_files)]
+        results = self.fit_cache.fit_batch(jobs, config.fit_workers)
+        for i, result in enumerate(results):
+            if result.status != CONVERGED:
+                logger.warning('Fit of %s %s: %s' % (
+                    self.growth_data.data_files[i].label, result.status, result.message))
+        return results
+
+    def get_all_fit_params(self, signal_name, fit_name, fit_from, fit_to, fit_param, settings=None):
         logger.debug('Fitting %s with %s from %.2f to %.2f and recording %s' % (
             signal_name, fit_name, fit_from, fit_to, fit_param))
+        param_i = get_model(fit_name).params.index(fit_param)
         values = []
         errors = []
-        for i, _ in enumerate(self.growth_data.data_files):
-            fit_result, covm = self.get_fit(
-                i, signal_name, fit_name, fit_from, fit_to)
-            param_errors = np.sqrt(np.diag(covm))
-
-            model = get_model(fit_name)
-
-            for i, param in enumerate(model.params):
-                if param == fit_param:
-                    values.append(fit_result[i])
-                    errors.append(param_errors[i])
-        return values, errors
-
-    def get_fit_data(self, index, signal_name=None, fit_from=None, fit_to=None):
+        statuses = []
+        for result in self.get_all_fits(signal_name, fit_name, fit_from, fit_to, settings):
+            values.append(result.params[param_i])
+            errors.append(result.errors()[param_i])
+            statuses.append(result.status)
+        return values, errors, statuses
+
+    def get_fit_data(self, index, signal_name=None, fit_from=None, fit_to=None, settings=None):
+        if settings is None:
+            settings = config.processing_config()
         if signal_name is None:
-            signal_name = config.yvar
+            signal_name = settings.yvar
         if fit_from is None:
-            fit_from = config.fit_from
+            fit_from = settings.fit_from
         if fit_to is None:
-            fit_to = config.fit_to
+            fit_to = settings.fit_to
 
-        fit_x, fit_y, fit_sigma = self.get_xy_data(index, signal_name)
+        fit_x, fit_y, fit_sigma = self.get_xy_data(index, signal_name, settings=settings)
         return get_fit_data_range(fit_x, fit_y, fit_sigma, fit_from, fit_to)
 
-    def get_replicate_fits(self, index, signal_name, fit_name, fit_from, fit_to, fit_param):
-        fit_start = None
-        if fit_name == 'exponential':
-            fit_start = [1, 1./config.unit_map[config.xvar]]
-        model = get_model(fit_name)
-        func = model.func()
-        xdatas, ydatas = self.get_replicate_xy_data(index, signal_name)
-        values = []
+    def get_replicate_fits(self, index, signal_name, fit_name, fit_from, fit_to, fit_param, settings=None):
+        if settings is None:
+            settings = config.processing_config()
+        param_i = get_model(fit_name).params.index(fit_param)
+        xdatas, ydatas = self.get_replicate_xy_data(index, signal_name, settings=settings)
+        jobs = []
         for rep_i, xdata in enumerate(xdatas):
             fit_x, fit_y, _ = get_fit_data_range(xdata, ydatas[rep_i], None, fit_from, fit_to)
-            fit_result, _ = curve_fit(func, fit_x, fit_y, p0=fit_start)
-            for i, param in enumerate(model.params):
-                if param == fit_param:
-                    values.append(fit_result[i])
-        return values
-
-    def get_fit(self, index, signal_name=None, fit_name=None, fit_from=None, fit_to=None, fit_start=None, fit_min=None, fit_max=None):
+            jobs.append(FitJob(fit_name, fit_x, fit_y))
+        results = self.fit_cache.fit_batch(jobs, config.fit_workers)
+        for result in results:
+            if result.status == FAILED:
+                raise RuntimeError('Issue fitting replicates:\n%s' % result.message)
+        return [result.params[param_i] for result in results]
+
+    # Collect everything needed to fit one data set
+    def get_fit_job(self, index, signal_name=None, fit_name=None, fit_from=None, fit_to=None, fit_start=None,
+                    fit_min=None, fit_max=None, settings=None):
+        if settings is None:
+            settings = config.processing_config()
         if signal_name is None:
-            signal_name = config.yvar
+            signal_name = settings.yvar
         if fit_name is None:
-            fit_name = config.fit_type
+            fit_name = settings.fit_type
         if fit_from is None:
-            fit_from = config.fit_from
+            fit_from = settings.fit_from
         if fit_to is None:
-            fit_to = config.fit_to
+            fit_to = settings.fit_to
         if fit_start is None:
-            fit_start = config.fit_start
+            fit_start = settings.fit_start
         if fit_min is None:
-            fit_min = config.fit_min
+            fit_min = settings.fit_min
         if fit_max is None:
-            fit_max = config.fit_max
-            
+            fit_max = settings.fit_max
+
         bounds = (-np.inf, np.inf)
-        if fit_min is not None and fit_min != [] and fit_max is not None and fit_max != []:
+        if fit_min is not None and len(fit_min) > 0 and fit_max is not None and len(fit_max) > 0:
             bounds = (fit_min, fit_max)
-        if fit_start == []:
+        if fit_start is not None and len(fit_start) == 0:
             fit_start = None
-        if fit_start is None and fit_name == 'exponential':
-            fit_start = [1, 1./config.unit_map[config.xvar]]
 
+        # If there are replicate files then the averaged data has errors
         fit_x, fit_y, fit_sigma = self.get_fit_data(
-            index, signal_name, fit_from, fit_to)
-
-        model = get_model(fit_name)
-        func = model.func()
-
-        # If there are replicate files then average the data
-        if fit_sigma is not None:
-            fit_result, covm = curve_fit(func, fit_x, fit_y, sigma=fit_sigma, p0=fit_start, bounds=bounds)
-        else:
-            fit_result, covm = curve_fit(func, fit_x, fit_y, p0=fit_start, bounds=bounds)
-
-        return fit_result, covm
+            index, signal_name, fit_from, fit_to, settings)
+        return FitJob(fit_name, fit_x, fit_y, fit_sigma, fit_start, bounds)
+
+    def get_fit(self, index, signal_name=None, fit_name=None, fit_from=None, fit_to=None, fit_start=None, fit_min=None, fit_max=None,
+                settings=None):
+        result = self.fit_cache.run_fit(self.get_fit_job(index, signal_name, fit_name, fit_from, fit_to, fit_start, fit_min,
+                                          fit_max, settings))
+        if result.status == FAILED:
+            raise RuntimeError(result.message)
+        return result.params, result.covm
 
 
 data_manager = DataManager()
@@ -0,0 +1,302 @@
+import hashlib
+import warnings
+from collections import OrderedDict
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scipy.optimize import curve_fit, OptimizeWarning
+
+from ada.data.models import get_model
+import ada.configuration as config
+from ada.logger import logger
+
+# Status of a finished fit
+CONVERGED = 'converged'
+FAILED = 'failed'
+HIT_BOUNDS = 'hit bounds'
+NO_ERRORS = 'no errors'
+
+# Only start worker processes when there are enough fits to share out
+min_parallel_fits = 8
+
+# Models that are linear in their parameters and can be solved directly
+linear_models = ['flat line', 'linear', 'quadratic']
+# Most Gauss-Newton steps used to polish a direct exponential fit
+max_polish_steps = 10
+# Leave badly conditioned problems to curve_fit
+max_condition = 1e12
+# How close a parameter has to be to a bound, relative to its scale
+bound_tolerance = 1e-8
+
+
+# Class: Everything needed to fit one data set, can be sent to other processes
+# Without starting values they are estimated from the data
+class FitJob():
+
+    def __init__(self, fit_name, xdata, ydata, sigma=None, p0=None,
+                 bounds=(-np.inf, np.inf)):
+        self.fit_name = fit_name
+        self.xdata = np.asarray(xdata, dtype=float)
+        self.ydata = np.asarray(ydata, dtype=float)
+        self.sigma = sigma
+        self.p0 = p0
+        self.bounds = bounds
+
+
+# Class: Result of a single fit
+class FitResult():
+
+    def __init__(self, params, covm, status=CONVERGED, message=''):
+        self.params = params
+        self.covm = covm
+        self.status = status
+        self.message = message
+
+    def errors(self):
+        return np.sqrt(np.diag(self.covm))
+
+
+# Function to check if any fitted parameter ended up on a bound
+# Parameters can be tiny, so closeness is relative to the width of the
+# allowed range, or to the starting value if the range is open
+def at_bounds(params, bounds, p0):
+    lower = np.broadcast_to(np.asarray(bounds[0], dtype=float), params.shape)
+    upper = np.broadcast_to(np.asarray(bounds[1], dtype=float), params.shape)
+    start = np.broadcast_to(np.abs(np.asarray(p0, dtype=float)), params.shape)
+    width = upper - lower
+    scale = np.where(np.isfinite(width), width,
+                     np.maximum(start, np.abs(params)))
+    tolerance = bound_tolerance * scale
+    on_lower = np.isfinite(lower) & (params - lower <= tolerance)
+    on_upper = np.isfinite(upper) & (upper - params <= tolerance)
+    return bool(np.any(on_lower | on_upper))
+
+
+# Function to get the status of a fit that didn't fail
+def fit_status(params, covm, bounds, p0):
+    if not np.all(np.isfinite(np.diag(covm))):
+        return NO_ERRORS
+    if at_bounds(params, bounds, p0):
+        return HIT_BOUNDS
+    return CONVERGED
+
+
+# Function to check if the fit parameters have any finite bounds
+def has_bounds(bounds):
+    return bool(np.any(np.isfinite(bounds[0])) or
+                np.any(np.isfinite(bounds[1])))
+
+
+# Function to solve a weighted linear least squares problem
+# The covariance is scaled by the reduced chi squared like curve_fit does
+# Returns None if the parameters can't all be determined
+def least_squares(design, ydata, sigma=None):
+    if sigma is not None:
+        weights = 1. / sigma
+        design = design * weights[:, None]
+        ydata = ydata * weights
+    # Normal equations scaled to a unit diagonal so powers of x don't make
+    # them ill conditioned, there are only ever a few parameters
+    normal = design.T @ design
+    scale = np.sqrt(np.diagonal(normal))
+    if not np.all(scale > 0):
+        return None
+    try:
+        inverse = np.linalg.inv(normal / np.outer(scale, scale))
+    except np.linalg.LinAlgError:
+        return None
+    if not np.max(np.diagonal(inverse)) < max_condition:
+        return None
+    covm = inverse / np.outer(scale, scale)
+    params = covm @ (design.T @ ydata)
+    dof = ydata.size - params.size
+    if dof > 0:
+        residuals = ydata - design @ params
+        covm *= residuals @ residuals / dof
+    else:
+        covm.fill(np.inf)
+    return params, covm
+
+
+# Function to fit an exponential as a straight line through log(y)
+# then polish the result with Gauss-Newton steps on the original data
+def exponential_fit(model, xdata, ydata, sigma):
+    if np.any(ydata <= 0):
+        return None
+    # Weight by y so the log fit approximates a fit to y itself
+    log_sigma = 1. / ydata if sigma is None else sigma / ydata
+    design = np.column_stack((np.ones(xdata.size), xdata))
+    result = least_squares(design, np.log(ydata), log_sigma)
+    if result is None:
+        return None
+    params = np.array([np.exp(result[0][0]), result[0][1]])
+    func = model.func()
+    jac = model.jac()
+    weights = 1. if sigma is None else 1. / sigma
+    residuals = (ydata - func(xdata, *params)) * weights
+    cost = residuals @ residuals
+    for _ in range(max_polish_steps):
+        result = least_squares(jac(xdata, *params),
+                               ydata - func(xdata, *params), sigma)
+        if result is None:
+            return None
+        step, covm = result
+        new_params = params + step
+        residuals = (ydata - func(xdata, *new_params)) * weights
+        new_cost = residuals @ residuals
+        # Give up if a step makes the fit worse
+        if not new_cost < cost * (1 + 1e-8):
+            return None
+        params, cost = new_params, new_cost
+        # Done once the step is negligible compared to the parameter errors
+        if np.all(np.abs(step) <= 1e-3 * np.sqrt(np.diag(covm))):
+            break
+    else:
+        return None
+    # The last step barely moved, so its covariance is the one at the solution
+    return params, covm
+
+
+# Function to fit without iterating when the model allows it
+# Returns None if the fit has to be done by curve_fit instead
+def direct_fit(job, model):
+    xdata, ydata, sigma = job.xdata, job.ydata, job.sigma
+    n_params = len(model.params)
+    if has_bounds(job.bounds) or xdata.size < n_params:
+        return None
+    if not (np.all(np.isfinite(xdata)) and np.all(np.isfinite(ydata))):
+        return None
+    if sigma is not None:
+        sigma = np.asarray(sigma, dtype=float)
+        if sigma.shape != ydata.shape or not np.all(sigma > 0):
+            return None
+    if job.fit_name in linear_models:
+        # The Jacobian of a linear model is its design matrix
+        design = model.jac()(xdata, *np.ones(n_params))
+        result = least_squares(design, ydata, sigma)
+    elif job.fit_name == 'exponential':
+        result = exponential_fit(model, xdata, ydata, sigma)
+    else:
+        return None
+    if result is None:
+        return None
+    params, covm = result
+    return FitResult(params, covm, fit_status(params, covm, job.bounds, params))
+
+
+# Function to fit with curve_fit, failures are returned rather than raised
+def iterative_fit(job):
+    model = get_model(job.fit_name)
+    n_params = len(model.params)
+    p0 = job.p0
+    if p0 is None:
+        # Start from values worked out from the data, inside any bounds
+        p0 = np.clip(model.initial_guess(job.xdata, job.ydata),
+                     job.bounds[0], job.bounds[1])
+    try:
+        with warnings.catch_warnings():
+            # Covariance that can't be estimated comes back as inf
+            warnings.simplefilter('ignore', OptimizeWarning)
+            params, covm = curve_fit(model.func(), job.xdata, job.ydata,
+                                     sigma=job.sigma, p0=p0,
+                                     bounds=job.bounds, jac=model.jac())
+    except (RuntimeError, ValueError, TypeError) as e:
+        return FitResult(np.full(n_params, np.nan),
+                         np.full((n_params, n_params), np.nan), FAILED, str(e))
+    return FitResult(params, covm, fit_status(params, covm, job.bounds, p0))
+
+
+# Function to run a single fit, directly if the model allows it
+def run_fit(job):
+    result = direct_fit(job, get_model(job.fit_name))
+    if result is not None:
+        return result
+    return iterative_fit(job)
+
+
+# Function to run a list of independent fits, in parallel if requested
+# Results are returned in the same order as the jobs
+def fit_batch(jobs, workers=1):
+    results = [direct_fit(job, get_model(job.fit_name)) for job in jobs]
+    # Only the fits that can't be solved directly are worth sharing out
+    remaining = [i for i, result in enumerate(results) if result is None]
+    if workers <= 1 or len(remaining) < min_parallel_fits:
+        for i in remaining:
+            results[i] = iterative_fit(jobs[i])
+        return results
+    logger.debug('Running %i fits with %i workers' % (len(remaining), workers))
+    workers = min(workers, len(remaining))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(len(remaining) // (4 * workers), 1)
+        fitted = pool.map(iterative_fit, [jobs[i] for i in remaining],
+                          chunksize=chunksize)
+        for i, result in zip(remaining, fitted):
+            results[i] = result
+    return results
+
+
+# Function to turn start values or bounds into something hashable
+def param_key(values):
+    if values is None:
+        return None
+    return tuple(np.atleast_1d(np.asarray(values, dtype=float)).tolist())
+
+
+# Function to get a key for everything that determines the result of a fit
+# The data is identified by a hash of its contents
+def fit_key(job):
+    digest = hashlib.sha1()
+    for array in (job.xdata, job.ydata, job.sigma):
+        if array is None:
+            digest.update(b'none')
+            continue
+        array = np.ascontiguousarray(array, dtype=float)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    return (job.fit_name, digest.hexdigest(), param_key(job.p0),
+            param_key(job.bounds[0]), param_key(job.bounds[1]))
+
+
+# Class: Least recently used store of fit results
+class FitCache():
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    # Run a list of fits, only solving the ones that aren't stored
+    def fit_batch(self, jobs, workers=1):
+        keys = [fit_key(job) for job in jobs]
+        results = [self.entries.get(key) for key in keys]
+        # The same fit can appear more than once in a batch
+        missing = OrderedDict()
+        for i, result in enumerate(results):
+            if result is None:
+                missing.setdefault(keys[i], jobs[i])
+            else:
+                self.entries.move_to_end(keys[i])
+                self.hits += 1
+        self.misses += len(missing)
+        fitted = fit_batch(list(missing.values()), workers)
+        for key, result in zip(missing, fitted):
+            result.params.flags.writeable = False
+            result.covm.flags.writeable = False
+            self.entries[key] = result
+        for i, key in enumerate(keys):
+            if results[i] is None:
+                results[i] = self.entries[key]
+        self.evict()
+        return results
+
+    def run_fit(self, job):
+        return self.fit_batch([job])[0]
+
+    # Remove the least recently used results until the store fits in its limit
+    def evict(self):
+        while len(self.entries) > max(config.fit_cache_size, 1):
+            self.entries.popitem(last=False)
@@ -1,6 +1,29 @@
 import numpy as np
+from scipy.special import expit
 
-from ada.data.processor import exponent_text, exponent_text_errors
+from ada.data.processor import (exponent_text, exponent_text_errors,
+                                savitzky_golay, odd_window)
+
+
+# Function to get the finite points of the data as float arrays
+def finite_data(xdata, ydata):
+    xdata = np.asarray(xdata, dtype=float)
+    ydata = np.asarray(ydata, dtype=float)
+    finite = np.isfinite(xdata) & np.isfinite(ydata)
+    return xdata[finite], ydata[finite]
+
+
+# Function to get the window used to smooth data for starting values
+def guess_window(size):
+    return odd_window(max(size // 10, 5))
+
+
+# Function to lightly smooth data before estimating starting values
+def smooth_for_guess(ydata):
+    window = guess_window(ydata.size)
+    if ydata.size <= window:
+        return ydata
+    return savitzky_golay(ydata, window, 2)
 
 
 class GrowthModel:
@@ -41,6 +64,17 @@ class GrowthModel:
                 return self.units[i]
         return ''
 
+    # Starting values for the fit, worked out from the data
+    def initial_guess(self, xdata, ydata):
+        return np.ones(len(self.params))
+
+    # Starting values from a polynomial fit, exact for polynomial models
+    def polynomial_guess(self, xdata, ydata, degree):
+        xdata, ydata = finite_data(xdata, ydata)
+        if xdata.size <= degree:
+            return np.ones(degree + 1)
+        return np.polyfit(xdata, ydata, degree)[::-1]
+
 
 class FlatLine(GrowthModel):
     def __init__(self, x_unit, y_unit):
@@ -51,6 +85,14 @@ class FlatLine(GrowthModel):
             return np.ones(len(x)) * p
         return return_func
 
+    def jac(self):
+        def return_jac(x, p):
+            return np.ones((len(x), 1))
+        return return_jac
+
+    def initial_guess(self, xdata, ydata):
+        return self.polynomial_guess(xdata, ydata, 0)
+
 
 class Linear(GrowthModel):
     def __init__(self, x_unit, y_unit):
@@ -64,6 +106,15 @@ class Linear(GrowthModel):
             return p1 * np.array(x) + p0
         return return_func
 
+    def jac(self):
+        def return_jac(x, p0, p1):
+            x = np.asarray(x, dtype=float)
+            return np.column_stack((np.ones(len(x)), x))
+        return return_jac
+
+    def initial_guess(self, xdata, ydata):
+        return self.polynomial_guess(xdata, ydata, 1)
+
 
 class Quadratic(GrowthModel):
     def __init__(self, x_unit, y_unit):
@@ -77,6 +128,15 @@ class Quadratic(GrowthModel):
             return p2 * np.power(np.array(x), 2) + p1 * np.array(x) + p0
         return return_func
 
+    def jac(self):
+        def return_jac(x, p0, p1, p2):
+            x = np.asarray(x, dtype=float)
+            return np.column_stack((np.ones(len(x)), x, x * x))
+        return return_jac
+
+    def initial_guess(self, xdata, ydata):
+        return self.polynomial_guess(xdata, ydata, 2)
+
 
 class Exponential(GrowthModel):
     def __init__(self, x_unit, y_unit):
@@ -90,6 +150,22 @@ class Exponential(GrowthModel):
             return p0 * np.exp(p1 * np.array(x))
         return return_func
 
+    def jac(self):
+        def return_jac(x, p0, p1):
+            x = np.asarray(x, dtype=float)
+            exp_val = np.exp(p1 * x)
+            return np.column_stack((exp_val, p0 * x * exp_val))
+        return return_jac
+
+    # Straight line fit to log(y) using only the positive points
+    def initial_guess(self, xdata, ydata):
+        xdata, ydata = finite_data(xdata, ydata)
+        positive = ydata > 0
+        if np.count_nonzero(positive) < 2:
+            return np.ones(2)
+        rate, log_scale = np.polyfit(xdata[positive], np.log(ydata[positive]), 1)
+        return np.array([np.exp(log_scale), rate])
+
 
 class Zweitering(GrowthModel):
     def __init__(self, x_unit, y_unit):
@@ -104,6 +180,46 @@ class Zweitering(GrowthModel):
             return y0 + (A - y0) / (1 + np.exp(exp_val))
         return return_func
 
+    def jac(self):
+        def return_jac(x, y0, A, mu, lam):
+            dt = lam - np.asarray(x, dtype=float)
+            # Logistic term written with expit so it doesn't overflow
+            s = expit(-((4*mu/A) * dt + 2))
+            # Derivative of the whole curve with respect to the exponent
+            d_exp = -(A - y0) * s * (1 - s)
+            return np.column_stack((1 - s,
+                                    s - d_exp * 4 * mu * dt / (A * A),
+                                    d_exp * 4 * dt / A,
+                                    d_exp * 4 * mu / A))
+        return return_jac
+
+    # Baseline and plateau from the smoothed data, maximum growth rate from
+    # the steepest slope and lag time from where that tangent meets the baseline
+    def initial_guess(self, xdata, ydata):
+        xdata, ydata = finite_data(xdata, ydata)
+        if xdata.size < 3:
+            return np.ones(4)
+        order = np.argsort(xdata, kind='stable')
+        xdata = xdata[order]
+        smoothed = smooth_for_guess(ydata[order])
+        y0 = np.min(smoothed)
+        A = np.max(smoothed)
+        # Slopes across the smoothing window so close points don't dominate
+        half = min(guess_window(xdata.size) // 2, (xdata.size - 1) // 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slopes = ((smoothed[2*half:] - smoothed[:-2*half]) /
+                      (xdata[2*half:] - xdata[:-2*half]))
+        slopes[~np.isfinite(slopes)] = 0
+        steepest = np.argmax(slopes)
+        slope = slopes[steepest]
+        steepest += half
+        if A <= y0 or A == 0 or slope <= 0:
+            return np.array([y0, A, (A - y0) / max(np.ptp(xdata), 1e-12), xdata[0]])
+        # The steepest slope of the curve is mu * (A - y0) / A
+        mu = slope * A / (A - y0)
+        lam = xdata[steepest] - (smoothed[steepest] - y0) / slope
+        return np.array([y0, A, mu, lam])
+
 
 def get_model(name, x_unit='', y_unit=''):
     if name == 'flat line':
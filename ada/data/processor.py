@@ -1,35 +1,61 @@
 import numpy as np
+from bisect import bisect_left, insort
 from math import factorial
+from functools import lru_cache
+from numpy.lib.stride_tricks import as_strided
+from scipy.ndimage import median_filter, correlate1d
+from scipy.signal import oaconvolve
 
 import ada.configuration as config
 from ada.logger import logger
 
 
+# Configuration read by each of the processing steps
+calibration_config = ('calibration_model', 'calibration_degree')
+alignment_config = ('initial_y', 'align', 'y_alignment')
+outlier_config = ('remove_above', 'remove_below', 'auto_remove',
+                  'outlier_threshold', 'outlier_method', 'outlier_window',
+                  'outlier_sigma')
+smoothing_config = ('smooth', 'sg_window_size', 'sg_order', 'sg_deriv',
+                    'sg_rate')
+
+
 # Function to apply alignment, outlier removal and smoothing
-def process_data(xdata, ydata):
+def process_data(xdata, ydata, smooth=True, settings=None):
     logger.debug('Processing data')
+    if settings is None:
+        settings = config.processing_config()
+    xdata, ydata = align_data(xdata, ydata, settings)
+    xdata, ydata = clean_data(xdata, ydata, settings)
+    # Smooth the data
+    if(settings.smooth and smooth):
+        ydata = savitzky_golay(ydata, settings.sg_window_size,
+                               settings.sg_order, settings.sg_deriv, settings.sg_rate)
+    return xdata, ydata
+
 
-    if config.initial_y != -1:
-        ydata = ydata - ydata[0] + config.initial_y
+# Function to apply the initial y value and time alignment
+def align_data(xdata, ydata, settings):
+    if settings.initial_y != -1:
+        ydata = ydata - ydata[0] + settings.initial_y
 
     # Align at time 0 if option selected
-    if config.align and config.y_alignment == -1:
+    if settings.align and settings.y_alignment == -1:
         xdata = xdata - xdata[0]
 
-    if config.y_alignment != -1:
-        xdata = align_to_y(xdata, ydata, config.y_alignment)
+    if settings.y_alignment != -1:
+        xdata = align_to_y(xdata, ydata, settings.y_alignment)
+    return xdata, ydata
 
-    # remove outliers
-    if (config.remove_above is not None or
-        config.remove_below is not None or
-            config.auto_remove):
-        xdata, ydata = remove_outliers(xdata, ydata, config.remove_below,
-                                       config.remove_above, config.auto_remove, config.outlier_threshold)
 
-    # Smooth the data
-    if(config.smooth):
-        ydata = savitzky_golay(ydata, config.sg_window_size,
-                               config.sg_order, config.sg_deriv, config.sg_rate)
+# Function to apply any outlier removal
+def clean_data(xdata, ydata, settings):
+    if (settings.remove_above is not None or
+        settings.remove_below is not None or
+            settings.auto_remove):
+        xdata, ydata = remove_outliers(xdata, ydata, settings.remove_below,
+                                       settings.remove_above, settings.auto_remove, settings.outlier_threshold,
+                                       settings.outlier_method, settings.outlier_window, settings.outlier_sigma)
     return xdata, ydata
 
 
@@ -37,178 +63,462 @@ def process_data(xdata, ydata):
 def align_to_y(xdata, ydata, y_alignment):
     logger.debug('Aligning data to y = %.2f' % y_alignment)
     # Find the first y index greater than the alignment point
-    index = 0
-    for i, y in enumerate(ydata):
-        if y >= y_alignment:
-            index = i
-            break
+    index = max(crossing_index(ydata, y_alignment), 0)
     xdata = xdata - xdata[index]
     return xdata
 
 
+# Function to find the first index where the data reaches a threshold
+# Works along the last axis and broadcasts over many thresholds or series
+# Returns -1 where the threshold is never reached
+def crossing_index(ydata, threshold):
+    above = np.asarray(ydata) >= np.asarray(threshold)[..., None]
+    index = np.argmax(above, axis=-1)
+    found = np.take_along_axis(above, index[..., None], axis=-1)[..., 0]
+    return np.where(found, index, -1)
+
+
+# Function to find the x and y values where the data first reaches a threshold
+# With interpolation the x value is found between the bracketing points,
+# otherwise the first point at or above the threshold is used
+# Returns NaN where the threshold is never reached
+def crossing_point(xdata, ydata, threshold, interpolate=False):
+    xdata, ydata = np.broadcast_arrays(np.asarray(xdata, dtype=float),
+                                       np.asarray(ydata, dtype=float))
+    threshold = np.asarray(threshold, dtype=float)
+    index = crossing_index(ydata, threshold)
+    xdata = np.broadcast_to(xdata, index.shape + xdata.shape[-1:])
+    ydata = np.broadcast_to(ydata, index.shape + ydata.shape[-1:])
+    found = index >= 0
+    safe = np.where(found, index, 0)[..., None]
+    x = np.take_along_axis(xdata, safe, axis=-1)[..., 0]
+    y = np.take_along_axis(ydata, safe, axis=-1)[..., 0]
+    if interpolate:
+        before = np.maximum(safe - 1, 0)
+        x0 = np.take_along_axis(xdata, before, axis=-1)[..., 0]
+        y0 = np.take_along_axis(ydata, before, axis=-1)[..., 0]
+        step = (safe[..., 0] > 0) & (y != y0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.where(step, (threshold - y0) / (y - y0), 1)
+        x = np.where(step, x0 + fraction * (x - x0), x)
+        y = np.where(step, threshold, y)
+    return np.where(found, x, np.nan), np.where(found, y, np.nan)
+
+
+# Function to stack data sets of different lengths into 2D arrays
+# Missing points are NaN so they never cross a threshold
+def stack_series(datas):
+    size = max([len(data) for data in datas] + [1])
+    stacked = np.full((len(datas), size), np.nan)
+    for i, data in enumerate(datas):
+        stacked[i, :len(data)] = data
+    return stacked
+
+
+# Function to find the points removed by one pass of jump detection
+# Scanning along the data, a jump to the next point removes that point and
+# the scan continues from the point after it, so within a run of jumps only
+# every other one leads to a removal
+def jump_removals(jumps):
+    index = np.arange(jumps.size)
+    starts = jumps.copy()
+    starts[1:] &= ~jumps[:-1]
+    run_start = np.maximum.accumulate(np.where(starts, index, 0))
+    return jumps & ((index - run_start) % 2 == 0)
+
+
+# Scale factor so the median absolute deviation estimates a standard deviation
+MAD_SCALE = 1.4826
+# Largest rolling window that is handled by copying out every window
+# Above this the copies take too much memory and a sorted window is faster
+MAX_VECTORISED_WINDOW = 32
+
+
+# Function to make a rolling window size odd and at least 3 points
+def odd_window(window):
+    window = max(int(window), 3)
+    return window + 1 - window % 2
+
+
+# Function to get the start of the rolling window around each point
+# Windows at the ends are shifted so they stay inside the data
+def window_starts(size, window):
+    return np.clip(np.arange(size) - window // 2, 0, size - window)
+
+
+# Function to get a read only view of every rolling window in the data
+def rolling_windows(ydata, window):
+    ydata = np.ascontiguousarray(ydata)
+    stride = ydata.strides[0]
+    return as_strided(ydata, shape=(ydata.size - window + 1, window),
+                      strides=(stride, stride), writeable=False)
+
+
+# Function to get the median absolute deviation of a sorted odd sized window
+# The deviations below and above the median are each already in order, so the
+# middle one is found by a binary search over how many come from below
+def sorted_window_mad(ordered, half):
+    median = ordered[half]
+
+    # i-th smallest deviation below and at or above the median
+    def below(i):
+        return median - ordered[half - 1 - i]
+
+    def above(i):
+        return ordered[half + i] - median
+
+    low, high = 0, half
+    while True:
+        n_below = (low + high) // 2
+        if n_below < high and above(half - n_below) > below(n_below):
+            low = n_below + 1
+        elif n_below > low and below(n_below - 1) > above(half + 1 - n_below):
+            high = n_below - 1
+        else:
+            break
+    if n_below == 0:
+        return above(half)
+    return max(above(half - n_below), below(n_below - 1))
+
+
+# Function to get the rolling median and MAD by keeping a sorted copy of the
+# window, each step is a bisect insert and removal rather than a full sort
+# Those shift the list so this is still O(n window), but as a memory move with
+# no copies of the windows, which is fast for the window sizes used
+def sorted_median_mad(ydata, window):
+    values = ydata.tolist()
+    half = window // 2
+    n_windows = len(values) - window + 1
+    medians = np.empty(n_windows)
+    mads = np.empty(n_windows)
+    ordered = sorted(values[:window])
+    for start in range(n_windows):
+        if start > 0:
+            del ordered[bisect_left(ordered, values[start - 1])]
+            insort(ordered, values[start + window - 1])
+        medians[start] = ordered[half]
+        mads[start] = sorted_window_mad(ordered, half)
+    starts = window_starts(ydata.size, window)
+    return medians[starts], MAD_SCALE * mads[starts]
+
+
+# Function to get the rolling median and scaled median absolute deviation
+# Small windows are copied out and handled in one vectorised call, which is
+# O(n window) in memory, so larger windows use a sorted window instead
+def rolling_median_mad(ydata, window):
+    if window > MAX_VECTORISED_WINDOW:
+        return sorted_median_mad(ydata, window)
+    windows = rolling_windows(ydata, window)
+    median = median_filter(ydata, size=window, mode='nearest')
+    half_window = window // 2
+    median[:half_window] = np.median(windows[0])
+    median[ydata.size - half_window:] = np.median(windows[-1])
+    starts = window_starts(ydata.size, window)
+    deviations = np.abs(windows[starts] - median[:, None])
+    return median, MAD_SCALE * np.median(deviations, axis=1)
+
+
+# Function to get the smallest step between different values in the data
+# Returns 0 if all of the values are the same
+def data_resolution(ydata):
+    steps = np.diff(np.unique(ydata))
+    if steps.size == 0:
+        return 0.
+    return steps.min()
+
+
+# Function to get the rolling median and the scale deviations are compared to
+# Quantised readings often have more than half of a window on one value, which
+# makes the MAD zero, so the scale is never less than the step between values
+def rolling_median_scale(ydata, window):
+    median, mad = rolling_median_mad(ydata, window)
+    return median, np.maximum(mad, data_resolution(ydata))
+
+
+# Function to flag points more than sigma rolling MADs from the rolling median
+def rolling_mad_outliers(ydata, window, sigma):
+    median, scale = rolling_median_scale(ydata, window)
+    return np.abs(ydata - median) > sigma * scale
+
+
+# Function to flag points more than sigma standard deviations from the mean
+# of the other points in a rolling window
+def rolling_zscore_outliers(ydata, window, sigma):
+    # Remove the overall mean to reduce rounding errors in the sums
+    ydata = ydata - np.mean(ydata)
+    sums = np.concatenate(([0], np.cumsum(ydata)))
+    sums_sq = np.concatenate(([0], np.cumsum(ydata**2)))
+    starts = window_starts(ydata.size, window)
+    total = sums[starts + window] - sums[starts]
+    total_sq = sums_sq[starts + window] - sums_sq[starts]
+    # Leave the point itself out of the window it is compared to
+    mean = (total - ydata) / (window - 1)
+    var = (total_sq - ydata**2) / (window - 1) - mean**2
+    std = np.sqrt(np.clip(var, 0, None))
+    return np.abs(ydata - mean) > sigma * std
+
+
+# Function to replace outliers with the rolling median (Hampel filter)
+def hampel_filter(ydata, window, sigma):
+    median, scale = rolling_median_scale(ydata, window)
+    outliers = np.abs(ydata - median) > sigma * scale
+    return np.where(outliers, median, ydata), outliers
+
+
+# Function to remove outliers by iteratively looking for jumps between points
+def remove_jumps(xdata, ydata, threshold):
+    # Do this iteratively until no points are removed
+    removed_points = 1
+    iteration = 0
+    while removed_points != 0 and ydata.size > 1:
+        # If the difference to the next point is over threshold x the
+        # mean difference between points, remove the next point
+        jumps = np.abs(np.diff(ydata))
+        jumps = jumps > threshold * np.mean(jumps)
+        keep = np.ones(ydata.size, dtype=bool)
+        keep[1:] = ~jump_removals(jumps)
+        removed_points = ydata.size - np.count_nonzero(keep)
+        xdata = xdata[keep]
+        ydata = ydata[keep]
+        logger.debug('Data %i, iteration %i, removed points = %i' %
+                     (ydata.size, iteration, removed_points))
+        iteration += 1
+    return xdata, ydata
+
+
+# Function to remove outliers with one of the rolling window detectors
+# Missing values are left alone and not included in the windows
+def remove_rolling_outliers(xdata, ydata, method, window, sigma):
+    window = odd_window(window)
+    finite = np.isfinite(ydata)
+    values = ydata[finite].astype(float)
+    if values.size < window:
+        return xdata, ydata
+    if method == 'hampel':
+        ydata = ydata.astype(float)
+        ydata[finite], outliers = hampel_filter(values, window, sigma)
+        logger.debug('Replaced %i points' % np.count_nonzero(outliers))
+        return xdata, ydata
+    if method == 'rolling MAD':
+        outliers = rolling_mad_outliers(values, window, sigma)
+    elif method == 'z-score':
+        outliers = rolling_zscore_outliers(values, window, sigma)
+    else:
+        raise RuntimeError('Issue processing data:\n'
+                           'Unknown outlier method %s' % method)
+    keep = np.ones(ydata.size, dtype=bool)
+    keep[finite] = ~outliers
+    logger.debug('Removed %i points' % np.count_nonzero(outliers))
+    return xdata[keep], ydata[keep]
+
+
 # Function to remove outliers in the data
-def remove_outliers(xdata, ydata, min, max, auto, threshold):
-    data_index = 0
-    while data_index < len(ydata):
-        if (max is not None and ydata[data_index] > max):
-            ydata = np.delete(ydata, data_index)
-            xdata = np.delete(xdata, data_index)
-            data_index = data_index - 1
-        if (min is not None and ydata[data_index] < min):
-            ydata = np.delete(ydata, data_index)
-            xdata = np.delete(xdata, data_index)
-            data_index = data_index - 1
-        data_index = data_index + 1
+def remove_outliers(xdata, ydata, min, max, auto, threshold, method='jump',
+                    window=11, sigma=3):
+    xdata = np.asarray(xdata)
+    ydata = np.asarray(ydata)
+    keep = np.ones(ydata.size, dtype=bool)
+    if max is not None:
+        keep &= ~(ydata > max)
+    if min is not None:
+        keep &= ~(ydata < min)
+    xdata = xdata[keep]
+    ydata = ydata[keep]
     # Apply automatic outlier detection
     if(auto):
-        logger.debug('Auto-removing outliers')
-        # Do this iteratively until no points are removed
-        removed_points = 1
-        iteration = 0
-        while (removed_points != 0):
-            logger.debug('')
-            removed_points = 0
-            # get the average difference between data points
-            mean_diff = 0
-            for i in range(0, len(ydata)-1, 1):
-                mean_diff = mean_diff + abs(ydata[i]-ydata[i+1])
-            mean_diff = mean_diff / (len(ydata)-1)
-            data_index = 0
-            # If the difference to the next point is over 20x the mean,
-            # delete the next point
-            while data_index < len(ydata)-1:
-                if abs(ydata[data_index] - ydata[data_index+1]) > threshold * mean_diff:
-                    removed_points += 1
-                    ydata = np.delete(ydata, data_index+1)
-                    xdata = np.delete(xdata, data_index+1)
-                data_index = data_index + 1
-            logger.debug('Data %i, iteration %i, removed points = %i' %
-                         (data_index, iteration, removed_points))
+        logger.debug('Auto-removing outliers with %s method' % method)
+        if method == 'jump':
+            return remove_jumps(xdata, ydata, threshold)
+        return remove_rolling_outliers(xdata, ydata, method, window, sigma)
     return xdata, ydata
 
 
+# Use FFT convolution for series and windows at least this long
+FFT_MIN_SIZE = 50000
+FFT_MIN_WINDOW = 33
+
+
+# Function to calculate the savitsky golay filter coefficients
+# These only depend on the filter settings so are only calculated once
+@lru_cache(maxsize=32)
+def savitzky_golay_coefficients(window_size, order, deriv, rate):
+    half_window = (window_size - 1) // 2
+    b = np.arange(-half_window, half_window + 1)[:, None] ** np.arange(order + 1)
+    # On windows the first call to linalg gives nans for some reason
+    m = np.linalg.pinv(b)[deriv] * rate**deriv * factorial(deriv)
+    if np.isnan(m).any():
+        m = np.linalg.pinv(b)[deriv] * rate**deriv * factorial(deriv)
+    m.flags.writeable = False
+    return m
+
+
 # Function to apply savitsky golay smoothing to data from SciPy cookbook
+# Each row of a 2D array is smoothed separately
 def savitzky_golay(y, window_size, order, deriv=0, rate=1):
     logger.debug('Smoothing data')
     try:
-        window_size = np.abs(np.int(window_size))
-        order = np.abs(np.int(order))
+        window_size = np.abs(int(window_size))
+        order = np.abs(int(order))
+        deriv = int(deriv)
     except ValueError:
         raise ValueError("window_size and order have to be of type int")
     if window_size % 2 != 1 or window_size < 1:
         raise TypeError("window_size size must be a positive odd number")
     if window_size < order + 2:
         raise TypeError("window_size is too small for the polynomials order")
-    order_range = range(order + 1)
     half_window = (window_size - 1) // 2
-    # precompute coefficients
-    b = np.mat([[k**i for i in order_range] for k in range(-half_window,
-                                                           half_window+1)])
-    # On windows the first call to linalg gives nans for some reason
-    m = np.linalg.pinv(b).A[deriv] * rate**deriv * factorial(deriv)
-    if np.isnan(m).any():
-        m = np.linalg.pinv(b).A[deriv] * rate**deriv * factorial(deriv)
+    m = savitzky_golay_coefficients(window_size, order, deriv, rate)
     # pad the signal at the extremes with
     # values taken from the signal itself
-    firstvals = y[0] - np.abs(y[1:half_window+1][::-1] - y[0])
-    lastvals = y[-1] + np.abs(y[-half_window-1:-1][::-1] - y[-1])
-    y = np.concatenate((firstvals, y, lastvals))
-    y = np.convolve(m[::-1], y, mode='valid')
-    return y
+    y = np.asarray(y)
+    first = y[..., :1]
+    last = y[..., -1:]
+    firstvals = first - np.abs(y[..., 1:half_window+1][..., ::-1] - first)
+    lastvals = last + np.abs(y[..., -half_window-1:-1][..., ::-1] - last)
+    y = np.concatenate((firstvals, y, lastvals), axis=-1).astype(float)
+    if y.shape[-1] >= FFT_MIN_SIZE and window_size >= FFT_MIN_WINDOW:
+        kernel = m[::-1].reshape((1,) * (y.ndim - 1) + (-1,))
+        return oaconvolve(y, kernel, mode='valid', axes=-1)
+    y = correlate1d(y, m, axis=-1, mode='constant')
+    return y[..., half_window:y.shape[-1]-half_window]
+
+
+# Function to smooth a list of data sets, ones with the same length are
+# stacked and smoothed together
+def savitzky_golay_batch(ys, window_size, order, deriv=0, rate=1):
+    smoothed = [None] * len(ys)
+    sizes = {}
+    for i, y in enumerate(ys):
+        sizes.setdefault(len(y), []).append(i)
+    for indices in sizes.values():
+        batch = savitzky_golay(np.stack([ys[i] for i in indices]),
+                               window_size, order, deriv, rate)
+        for i, y in zip(indices, batch):
+            smoothed[i] = y
+    return smoothed
 
 
 # Function to average replicate data sets
 def average_data(xdatas, ydatas, show_err=False):
     logger.debug('Averaging data')
-    new_xdata = np.array([])
-    new_ydata = np.array([])
-    new_yerr = np.array([])
     if len(xdatas) <= 1:
-        return xdatas[0], ydatas[0], new_yerr
-    for i, x_i in enumerate(xdatas[0]):
-        ys = np.array([ydatas[0][i]])
-        for j in range(1, len(xdatas), 1):
-            # Interpolate between points to do average
-            ys = np.append(ys, np.interp(x_i, xdatas[j], ydatas[j]))
-        mean = np.mean(ys)
-        std_dev = np.std(ys, ddof=1)
+        return xdatas[0], ydatas[0], np.array([])
+    # Interpolate every replicate onto the x points of the first one
+    # Points outside of a replicate's x range are missing rather than clamped
+    new_xdata = np.asarray(xdatas[0], dtype=float)
+    ys = np.empty((len(xdatas), new_xdata.size))
+    ys[0] = ydatas[0]
+    for j in range(1, len(xdatas)):
+        ys[j] = np.interp(new_xdata, xdatas[j], ydatas[j],
+                          left=np.nan, right=np.nan)
+    valid = np.isfinite(ys)
+    count = np.count_nonzero(valid, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        new_ydata = np.where(valid, ys, 0).sum(axis=0) / count
+        sq_diff = np.where(valid, (ys - new_ydata)**2, 0).sum(axis=0)
+        new_yerr = np.sqrt(sq_diff / (count - 1))
         if(show_err):
-            std_dev = std_dev/np.sqrt(ys.size)
-        new_xdata = np.append(new_xdata, x_i)
-        new_ydata = np.append(new_ydata, mean)
-        new_yerr = np.append(new_yerr, std_dev)
+            new_yerr = new_yerr / np.sqrt(count)
+    # The spread is unknown if only one replicate covers the point
+    new_yerr[count == 1] = np.nan
     return new_xdata, new_ydata, new_yerr
 
 
 # Function to average data over time period
+# Points before time 0 are included in the first window
 def time_average(xdata, ydata, window, show_err=False):
     logger.debug('Averaging data over time window of %i' % window)
-    new_xdata = np.array([])
-    new_ydata = np.array([])
-    new_yerr = np.array([])
-    w_i = 1
-    i = 0
-    while(i < len(xdata)):
-        data_x = np.array([])
-        data_y = np.array([])
-        while(i < len(xdata) and xdata[i] < w_i * window):
-            data_x = np.append(data_x, xdata[i])
-            data_y = np.append(data_y, ydata[i])
-            i = i + 1
-        if(data_y.size == 0):
-            w_i = w_i + 1
-            continue
-        mean_x = np.mean(data_x)
-        mean_y = np.mean(data_y)
-        std_dev = np.std(data_y, ddof=1)
-        if(show_err):
-            std_dev = std_dev/np.sqrt(data_y.size)
-        new_xdata = np.append(new_xdata, mean_x)
-        new_ydata = np.append(new_ydata, mean_y)
-        if(data_y.size == 1):
-            new_yerr = np.append(new_yerr, 0)
-        else:
-            new_yerr = np.append(new_yerr, std_dev)
-        w_i = w_i + 1
-    return new_xdata, new_ydata, new_yerr
+    xdata = np.asarray(xdata, dtype=float)
+    finite = np.isfinite(xdata)
+    return time_average_blocks([(xdata[finite], np.asarray(ydata)[finite])],
+                               window, show_err)
+
 
 # Function to average arrays of data over time period
+# Points before time 0 are not included
 def time_average_arrays(xdatas, ydatas, window, show_err=False):
     logger.debug('Averaging data over time window of %i' % window)
-    new_xdata = np.array([])
-    new_ydata = np.array([])
-    new_yerr = np.array([])
-    w_i = 1
-    data_remaining = True
-    while data_remaining:
-        window_x = np.array([])
-        window_y = np.array([])
-        finished = True
-        for i, xdata in enumerate(xdatas):
-            # Check if there's any data in the next window
-            if len(xdata[xdata >= (w_i) * window]) > 0:
-                finished = False
-            mask = ((xdata >= (w_i - 1) * window) & (xdata < w_i * window))
-            window_x = np.append(window_x, xdata[mask])
-            window_y = np.append(window_y, ydatas[i][mask])
-        if finished:
-            data_remaining = False
-        if(window_y.size == 0):
-            w_i = w_i + 1
+    blocks = []
+    for xdata, ydata in zip(xdatas, ydatas):
+        xdata = np.asarray(xdata, dtype=float)
+        mask = xdata >= 0
+        blocks.append((xdata[mask], np.asarray(ydata)[mask]))
+    return time_average_blocks(blocks, window, show_err)
+
+
+# Function to merge running statistics of bins seen in a new block of data
+# Uses the pairwise update of the mean and sum of squared differences
+def merge_bin_stats(stats, bins, xdata, ydata):
+    new_bins, inverse = np.unique(bins, return_inverse=True)
+    count = np.bincount(inverse).astype(float)
+    sum_x = np.bincount(inverse, weights=xdata)
+    mean_y = np.bincount(inverse, weights=ydata) / count
+    sq_diff = np.bincount(inverse, weights=(ydata - mean_y[inverse])**2)
+    if stats is None:
+        return [new_bins, count, sum_x, mean_y, sq_diff]
+
+    old_bins, old_count, old_sum_x, old_mean_y, old_sq_diff = stats
+    all_bins = np.union1d(old_bins, new_bins)
+    merged = [all_bins] + [np.zeros(all_bins.size) for _ in range(4)]
+    old_i = np.searchsorted(all_bins, old_bins)
+    for stat, old_stat in zip(merged[1:], stats[1:]):
+        stat[old_i] = old_stat
+    new_i = np.searchsorted(all_bins, new_bins)
+    total = merged[1][new_i] + count
+    delta = mean_y - merged[3][new_i]
+    merged[4][new_i] += sq_diff + delta**2 * merged[1][new_i] * count / total
+    merged[3][new_i] += delta * count / total
+    merged[2][new_i] += sum_x
+    merged[1][new_i] = total
+    return merged
+
+
+# Function to average blocks of data over time period in a single pass
+# The blocks are (x, y) pairs, e.g. from one of the reader block generators
+# Nothing streams blocks from a file into this yet, loaded data is one block
+def time_average_blocks(blocks, window, show_err=False):
+    logger.debug('Averaging blocks of data over time window of %i' % window)
+    stats = None
+    for xdata, ydata in blocks:
+        xdata = np.asarray(xdata, dtype=float)
+        if xdata.size == 0:
             continue
-        mean_x = np.mean(window_x)
-        mean_y = np.mean(window_y)
-        std_dev = np.std(window_y, ddof=1)
-        if(show_err):
-            std_dev = std_dev/np.sqrt(window_y.size)
-        new_xdata = np.append(new_xdata, mean_x)
-        new_ydata = np.append(new_ydata, mean_y)
-        if(window_y.size == 1):
-            new_yerr = np.append(new_yerr, 0)
-        else:
-            new_yerr = np.append(new_yerr, std_dev)
-        w_i = w_i + 1
-    return new_xdata, new_ydata, new_yerr
+        bins = np.clip(np.floor(xdata / window), 0, None).astype(np.int64)
+        stats = merge_bin_stats(stats, bins, xdata,
+                                np.asarray(ydata, dtype=float))
+    if stats is None:
+        return np.array([]), np.array([]), np.array([])
+    _, count, sum_x, mean_y, sq_diff = stats
+    new_yerr = np.zeros(count.size)
+    multiple = count > 1
+    new_yerr[multiple] = np.sqrt(sq_diff[multiple] / (count[multiple] - 1))
+    if show_err:
+        new_yerr = new_yerr / np.sqrt(count)
+    return sum_x / count, mean_y, new_yerr
+
+
+# Function to average blocks of data between two times in a single pass
+def average_blocks(blocks, start, end, show_err=False):
+    stats = None
+    for xdata, ydata in blocks:
+        xdata = np.asarray(xdata, dtype=float)
+        mask = (xdata >= start) & (xdata <= end)
+        if not np.any(mask):
+            continue
+        stats = merge_bin_stats(stats, np.zeros(np.count_nonzero(mask), int),
+                                xdata[mask],
+                                np.asarray(ydata, dtype=float)[mask])
+    if stats is None:
+        return None, None
+    count = stats[1][0]
+    mean = stats[3][0]
+    # The spread is unknown from a single point
+    if count == 1:
+        return mean, np.nan
+    error = np.sqrt(stats[4][0] / (count - 1))
+    if show_err:
+        error = error / np.sqrt(count)
+    return mean, error
 
 
 def get_exponent(value):
@@ -239,30 +549,35 @@ def exponent_text_errors(value, error):
                                                  value, config.sig_figs, error, exponent)
     return text
 
-def calculate_gradient(xdata, ydata, grad_from, grad_to):
-    # Calculate the gradient
-    x1 = None
-    y1 = None
-    x2 = None
-    y2 = None
-    for i, ydat in enumerate(ydata):
-        if ydat >= grad_from and x1 is None:
-            x1 = xdata[i]
-            y1 = ydat
-        if ydat >= grad_to and x2 is None:
-            x2 = xdata[i]
-            y2 = ydat
-        if x1 is not None and x2 is not None:
-            break
-    if x1 is None or x2 is None:
-        return None
-    return (y2-y1)/(x2-x1)
+def calculate_gradient(xdata, ydata, grad_from, grad_to, interpolate=False):
+    return calculate_gradients([xdata], [ydata], grad_from, grad_to,
+                               interpolate)[0]
+
+
+# Function to calculate the gradient between two y values for many data sets
+def calculate_gradients(xdatas, ydatas, grad_from, grad_to, interpolate=False):
+    if len(xdatas) == 0:
+        return []
+    x, y = crossing_point(stack_series(xdatas)[:, None], stack_series(ydatas)[:, None],
+                          [grad_from, grad_to], interpolate)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        gradients = (y[:, 1] - y[:, 0]) / (x[:, 1] - x[:, 0])
+    found = ~np.isnan(x).any(axis=1)
+    return [gradient if ok else None for gradient, ok in zip(gradients, found)]
+
+
+def calculate_time_to(xdata, ydata, time_to, interpolate=False):
+    return calculate_times_to([xdata], [ydata], time_to, interpolate)[0]
+
+
+# Function to calculate the time to reach a y value for many data sets
+def calculate_times_to(xdatas, ydatas, time_to, interpolate=False):
+    if len(xdatas) == 0:
+        return []
+    x, _ = crossing_point(stack_series(xdatas), stack_series(ydatas), time_to,
+                          interpolate)
+    return [None if np.isnan(time) else time for time in x]
 
-def calculate_time_to(xdata, ydata, time_to):
-    for i, ydat in enumerate(ydata):
-        if ydat >= time_to:
-            return xdata[i]
-    return None
 
 def get_fit_data_range(xdata, ydata, yerr, fit_from, fit_to):
     fit_x, fit_y, fit_sigma = xdata, ydata, yerr
@@ -276,5 +591,17 @@ def get_fit_data_range(xdata, ydata, yerr, fit_from, fit_to):
         if fit_sigma is not None:
             fit_sigma = fit_sigma[from_index:to_index]
 
+    # Points without a usable error would get infinite weight, so leave them
+    # out, or fit without errors if none of the points have one
+    if fit_sigma is not None:
+        fit_sigma = np.asarray(fit_sigma, dtype=float)
+        usable = np.isfinite(fit_sigma) & (fit_sigma > 0)
+        if not np.any(usable):
+            fit_sigma = None
+        elif not np.all(usable):
+            fit_x = np.asarray(fit_x)[usable]
+            fit_y = np.asarray(fit_y)[usable]
+            fit_sigma = fit_sigma[usable]
+
     return fit_x, fit_y, fit_sigma
     
\ No newline at end of file
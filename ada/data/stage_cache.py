@@ -0,0 +1,71 @@
+from collections import OrderedDict
+import numpy as np
+
+import ada.configuration as config
+from ada.logger import logger
+
+
+# Function to make the arrays in a cached result read only
+# Returns the total size of the arrays in bytes
+def freeze(value):
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(freeze(v) for v in value)
+    return 0
+
+
+# Class: Least recently used store of processing stage results
+class StageCache():
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        value = compute()
+        nbytes = freeze(value)
+        self.entries[key] = (value, nbytes)
+        self.nbytes += nbytes
+        self.evict()
+        return value
+
+    # Remove the least recently used results until the cache fits in its limit
+    def evict(self):
+        limit = config.processing_cache_size * 1e6
+        while self.nbytes > limit and len(self.entries) > 1:
+            key, (_, nbytes) = self.entries.popitem(last=False)
+            logger.debug('Removing cached %s stage' % key[0])
+            self.nbytes -= nbytes
+
+
+# Class: One step of the processing pipeline
+# The key holds the dataset version or configuration the step depends on,
+# combined with the keys of its inputs so changes propagate down the pipeline
+class Stage():
+
+    def __init__(self, cache, name, key, inputs, func):
+        self.cache = cache
+        self.key = (name, key, tuple(stage.key for stage in inputs))
+        self.inputs = inputs
+        self.func = func
+
+    # Get the result of this step, only working out inputs that aren't cached
+    def result(self):
+        return self.cache.get(self.key, lambda: self.func(
+            *[stage.result() for stage in self.inputs]))
@@ -8,6 +8,7 @@ from PyQt5.QtWidgets import (QSizePolicy,
 from ada.plotter.correlation_plot import CorrelationCanvas
 from ada.data.models import get_model
 from ada.data.data_manager import data_manager
+from ada.data.fitting import CONVERGED
 from ada.components.user_input import TextEntry, DropDown, CheckBox
 from ada.components.button import Button
 from ada.components.window import Window
@@ -31,6 +32,10 @@ class PlotConfig():
         self.x_error = []
         self.y_error = []
         self.labels = []
+        # Whether each point comes from a fit that didn't fully converge
+        self.flagged = []
+        # Problems with the fits to show on the plot
+        self.notes = []
         self.correlation_coeff = None
 
 
@@ -120,16 +125,17 @@ class CorrelationWindow(Window):
         self.parent.update_config()
         logger.debug('Updating the correlation plot')
         self.plot_config.clear()
+        settings = config.processing_config()
         # Process the data here
         x_data, x_error = data_manager.get_averages(
                                        self.condition.currentText(),
                                        self.start_t.get_float(),
-                                       self.end_t.get_float())
-        y_data, y_error = data_manager.get_all_fit_params(self.data.currentText(),
+                                       self.end_t.get_float(), settings)
+        y_data, y_error, y_status = data_manager.get_all_fit_params(self.data.currentText(),
                                   self.fit.currentText(),
                                   self.start_t.get_float(),
                                   self.end_t.get_float(),
-                                  self.param.currentText())
+                                  self.param.currentText(), settings)
         tunit = 's'
         if config.xvar == 'minutes':
             tunit = 'min'
@@ -160,23 +166,30 @@ class CorrelationWindow(Window):
 
         self.plot_config.title = self.figure_title.text()
         labels = []
+        names = []
         for dat in data_manager.get_growth_data_files():
             labels.append('Name: %s\nReactor: %s\nProfile: %s' %
                           (dat.label, dat.reactor, dat.profile))
+            names.append(dat.label)
 
-        # Remove any broken fits
+        # Leave out any broken fits and flag the ones that can't be trusted
         for i, yerr in enumerate(y_error):
             logger.debug('Fit %i: x=%.2f (%.2f), y=%.2f (%.2f)' %
                          (i, x_data[i], x_error[i], y_data[i], y_error[i]))
-            if y_data[i] == 1 and yerr > 50:
+            if not np.isfinite(y_data[i]):
                 logger.warning('Fit ' + str(i) + ' failed')
-            else:
-                self.plot_config.x_data.append(x_data[i])
-                self.plot_config.y_data.append(y_data[i])
-                self.plot_config.x_error.append(x_error[i])
-                self.plot_config.y_error.append(y_error[i])
-                if self.label.isChecked():
-                    self.plot_config.labels.append(labels[i])
+                self.plot_config.notes.append('%s: fit failed' % names[i])
+                continue
+            if y_status[i] != CONVERGED:
+                self.plot_config.notes.append('%s: %s' % (names[i], y_status[i]))
+            self.plot_config.x_data.append(x_data[i])
+            self.plot_config.y_data.append(y_data[i])
+            # Errors that couldn't be worked out aren't drawn
+            self.plot_config.x_error.append(x_error[i] if np.isfinite(x_error[i]) else 0)
+            self.plot_config.y_error.append(yerr if np.isfinite(yerr) else 0)
+            self.plot_config.flagged.append(y_status[i] != CONVERGED)
+            if self.label.isChecked():
+                self.plot_config.labels.append(labels[i])
 
         # Work out correlation coefficient
         if self.calc_correlation.isChecked():
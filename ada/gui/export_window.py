@@ -6,6 +6,7 @@ from PyQt5.QtWidgets import QVBoxLayout
 from ada.data.data_manager import data_manager
 from ada.gui.error_window import error_wrapper
 from ada.gui.file_handler import get_save_directory_name
+from ada.reader.ada_format import write_ada_binary
 from ada.components.button import Button
 from ada.components.user_input import CheckBox
 from ada.components.window import Window
@@ -21,9 +22,11 @@ class ExportWindow(Window):
         self.initUI()
 
     def initUI(self):
-        self.rename, self.conditions, _ = self.window.addWidgets([
+        self.rename, self.conditions, self.binary, _ = self.window.addWidgets([
             CheckBox('Rename with profile'),
             CheckBox('Include conditions'),
+            CheckBox('Native ADA format', tooltip='Checked = save as .ada files that load much faster\n'
+                                                  'Unchecked = save as .csv files'),
             Button("Export", clicked=self.export)])
 
     @error_wrapper
@@ -32,13 +35,16 @@ class ExportWindow(Window):
         if self.test_path == 'none':
             path = get_save_directory_name()
         logger.info('Exporting files to %s' % path)
+        extension = '.csv'
+        if self.binary.isChecked():
+            extension = '.ada'
         for data in data_manager.get_growth_data_files():
-            filename = data.label + '.csv'
+            filename = data.label + extension
             if self.rename.isChecked():
-                filename = path + '/' + data.profile + '_ada.csv'
+                filename = path + '/' + data.profile + '_ada' + extension
             else:
                 filename = path + '/' + \
-                    filename.split('/')[-1].split('.')[0] + '_ada.csv'
+                    filename.split('/')[-1].split('.')[0] + '_ada' + extension
             logger.debug('Exporting file %s' % filename)
 
             # Get the condition data if that option is checked
@@ -53,6 +59,11 @@ class ExportWindow(Window):
                         continue
                     conditions = cond_data
 
+            # Native files keep the conditions at their own time resolution
+            if self.binary.isChecked():
+                write_ada_binary(filename, data, conditions)
+                continue
+
             with open(filename, 'w', newline='') as csvfile:
                 writer = csv.writer(csvfile)
                 name_header = ['Name', data.label,
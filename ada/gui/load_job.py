@@ -0,0 +1,89 @@
+# Standard imports
+import os
+import queue
+import threading
+import multiprocessing
+
+from PyQt5.QtCore import QThread
+
+from ada.reader.read_files import read_files
+from ada.reader.progress import ReadProgress, LoadCancelled
+from ada.logger import logger
+
+
+# Class: Read in files on a background thread so the GUI stays responsive
+# The results are only handed over once every file has been read
+class LoadJob(QThread):
+
+    def __init__(self, jobs, workers=1, parent=None):
+        super(LoadJob, self).__init__(parent)
+        self.jobs = jobs
+        self.workers = workers
+        self.results = None
+        self.error = None
+        self.cancelled = False
+        self.manager = None
+        if workers > 1 and len(jobs) > 1:
+            # Worker processes need a queue and event they can all see
+            self.manager = multiprocessing.Manager()
+            self.progress = ReadProgress(self.manager.Queue(),
+                                         self.manager.Event())
+        else:
+            self.progress = ReadProgress(queue.Queue(), threading.Event())
+        # Progress of each file
+        self.sizes = []
+        for job in jobs:
+            try:
+                self.sizes.append(os.path.getsize(job.file_name))
+            except OSError:
+                self.sizes.append(0)
+        self.rows = [0] * len(jobs)
+        self.nbytes = [0] * len(jobs)
+        self.done = [False] * len(jobs)
+
+    def run(self):
+        try:
+            self.results = read_files(self.jobs, self.workers, self.progress)
+        except LoadCancelled:
+            logger.info('File loading cancelled')
+            self.cancelled = True
+        except Exception as e:
+            self.error = e
+
+    def cancel(self):
+        self.progress.cancel_event.set()
+
+    # Shut down the worker process manager once finished
+    def close(self):
+        self.poll()
+        if self.manager is not None:
+            self.manager.shutdown()
+            self.manager = None
+
+    # Collect any progress reports sent by the readers
+    def poll(self):
+        while True:
+            try:
+                index, rows, nbytes, done = self.progress.queue.get_nowait()
+            except (queue.Empty, EOFError, OSError):
+                break
+            self.rows[index] = rows
+            self.nbytes[index] = nbytes
+            if done:
+                self.done[index] = True
+                self.nbytes[index] = self.sizes[index]
+
+    # Fraction of the total number of bytes that have been read in
+    def fraction(self):
+        total = sum(self.sizes)
+        if total == 0:
+            return sum(self.done) / max(len(self.jobs), 1)
+        read = 0
+        for i, size in enumerate(self.sizes):
+            read += min(self.nbytes[i], size)
+        return read / total
+
+    def status(self):
+        return ('Read %i of %i files (%i rows, %.1f MB)' %
+                (sum(self.done), len(self.jobs), sum(self.rows),
+                 sum(self.nbytes) / 1e6))
@@ -1,9 +1,10 @@
-from PyQt5.QtWidgets import QVBoxLayout
-from PyQt5.QtCore import QPoint
+from PyQt5.QtWidgets import QVBoxLayout, QProgressBar, QLabel
+from PyQt5.QtCore import QPoint, QTimer
 
 from ada.data.data_manager import data_manager
 from ada.gui.error_window import error_wrapper
 from ada.gui.file_handler import get_file_names
+from ada.gui.load_job import LoadJob
 from ada.type_functions import isint
 from ada.components.list import List
 from ada.components.window import Window
@@ -11,15 +12,7 @@ from ada.components.button import Button
 from ada.components.user_input import TextEntry, DropDown, CheckBox
 from ada.components.data_list_item import DelListItem
 
-from ada.reader.read_algem_ht24 import (read_algem_ht24,
-                                        read_algem_ht24_details)
-from ada.reader.read_algem_pro import read_algem_pro
-from ada.reader.read_algem_ht24_txt import read_algem_ht24_txt
-from ada.reader.read_ip import read_ip
-from ada.reader.read_psi import read_psi
-from ada.reader.read_ada import read_ada
-from ada.reader.read_microbemeter import read_microbemeter
-from ada.reader.read_spectrostar import read_spectrostar
+from ada.reader.read_files import ReadJob
 
 import ada.configuration as config
 import ada.styles as styles
@@ -35,6 +28,7 @@ class LoadWindow(Window):
         self.condition_files = []
         self.files = []
         self.row = row
+        self.load_job = None
         self.initUI()
 
     def initUI(self):
@@ -81,7 +75,21 @@ class LoadWindow(Window):
         self.merge_replicates.hide()
 
         # Button to load the data
-        self.window.addWidget(Button("Load", clicked=self.load))
+        self.load_button = self.window.addWidget(
+            Button("Load", clicked=self.load))
+
+        # Progress of the files being loaded
+        self.progress_bar = self.window.addWidget(QProgressBar())
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.hide()
+        self.progress_label = self.window.addWidget(QLabel(''))
+        self.progress_label.setStyleSheet(styles.default_font)
+        self.progress_label.hide()
+        self.cancel_button = self.window.addWidget(
+            Button("Cancel", clicked=self.cancel_load))
+        self.cancel_button.hide()
+        self.progress_timer = QTimer(self)
+        self.progress_timer.timeout.connect(self.update_progress)
 
         self.update_options()
 
@@ -151,33 +159,22 @@ class LoadWindow(Window):
         self.condition_files = get_file_names()
         self.fill_list(self.condition_files, self.conditions_file_list)
 
-    def load_algem_pro(self, file_name):
-        logger.info('Loading an Algem-Pro file %s' % file_name)
-        # Read in files from Algem Pro
-        algem_data = read_algem_pro(file_name)
+    def load_algem_pro(self, algem_data):
         if self.row == -1:
             data_manager.growth_data.add_data(algem_data)
         else:
             data_manager.growth_data.add_replicate(algem_data, self.row)
 
-    def load_algem_pro_conditions(self, file_name, downsample):
-        logger.info('Loading Algem-Pro condition file %s, downsample %i' %
-                    (file_name, downsample))
-        # Read in conditions files from Algem Pro
-        algem_conditions = read_algem_pro(file_name, downsample)
+    def load_algem_pro_conditions(self, algem_conditions):
         if self.row == -1:
             data_manager.condition_data.add_data(algem_conditions)
         else:
             data_manager.condition_data.add_replicate(
                 algem_conditions, self.row)
 
-    def load_algem_ht24_txt(self, file_name):
-        downsample = self.downsample.get_int()
-
-        logger.info('Loading a partial HT-24 file %s, downsample: %i' %
-                    (file_name, downsample))
+    def load_algem_ht24_txt(self, result):
         algem_data_list, rep_algem_data_list, cond_data_list,\
-            rep_cond_data_list = read_algem_ht24_txt(file_name, downsample)
+            rep_cond_data_list = result
         for algem_data in algem_data_list:
             data_manager.growth_data.add_data(algem_data)
         for replicate in rep_algem_data_list:
@@ -195,18 +192,15 @@ class LoadWindow(Window):
             else:
                 data_manager.condition_data.add_data(replicate[0])
 
-    def load_algem_ht24(self, file_name):
-        logger.info('Loading HT-24 file %s' % file_name)
-        # Read in files from Algem HT24 if no details file is provided
+    def load_algem_ht24(self, result):
+        # Files from Algem HT24 if no details file is provided
         if len(self.details) == 0:
-            algem_data_list = read_algem_ht24(file_name)
-            for algem_data in algem_data_list:
+            for algem_data in result:
                 data_manager.growth_data.add_data(algem_data)
 
-        # Read in files from Algem HT24 with details file
+        # Files from Algem HT24 with details file
         else:
-            algem_data_list, replicate_data_list = read_algem_ht24_details(
-                file_name, self.details[0])
+            algem_data_list, replicate_data_list = result
             for algem_data in algem_data_list:
                 data_manager.growth_data.add_data(algem_data)
             for replicate in replicate_data_list:
@@ -216,21 +210,15 @@ class LoadWindow(Window):
                 else:
                     data_manager.growth_data.add_data(replicate[0])
 
-    def load_algem_ht24_conditions(self, file_name, downsample):
-        logger.info('Loading HT-24 condition file %s, downsample %i' %
-                    (file_name, downsample))
-        # Read in files from Algem HT24 if details file is provided
+    def load_algem_ht24_conditions(self, result):
+        # Files from Algem HT24 if no details file is provided
         if len(self.details) == 0:
-            algem_conditions_list = read_algem_ht24(file_name,
-                                                    downsample)
-            for algem_conditions in algem_conditions_list:
+            for algem_conditions in result:
                 data_manager.condition_data.add_data(algem_conditions)
 
-        # Read in files from Algem HT24 without details file
+        # Files from Algem HT24 with details file
         else:
-            algem_conditions_list, replicate_conditions_list = \
-                read_algem_ht24_details(file_name, self.details[0],
-                                        downsample)
+            algem_conditions_list, replicate_conditions_list = result
             for algem_conditions in algem_conditions_list:
                 data_manager.condition_data.add_data(algem_conditions)
             for replicate in replicate_conditions_list:
@@ -240,39 +228,18 @@ class LoadWindow(Window):
                 else:
                     data_manager.condition_data.add_data(replicate[0])
 
-    def load_ip(self, file_name):
-        logger.info('Loading IP file %s' % file_name)
-        # Read in files from Industrial Plankton
-        try:
-            ip_data, condition_data = read_ip(file_name)
-        except Exception as e:
-            raise RuntimeError(
-                'Error reading file '+file_name+'\n'+str(e))
-        if self.row == -1:
-            data_manager.growth_data.add_data(ip_data)
-            data_manager.condition_data.add_data(condition_data)
-        else:
-            data_manager.growth_data.add_replicate(ip_data, self.row)
-            data_manager.condition_data.add_replicate(condition_data, self.row)
-
-    def load_psi(self, file_name):
-        logger.info('Loading PSI file %s' % file_name)
-        # Read in files from Photon System Instruments photobioreactor
-        try:
-            psi_data, condition_data = read_psi(file_name)
-        except Exception as e:
-            raise RuntimeError(
-                'Error reading file '+file_name+'\n'+str(e))
+    # Used for IP and PSI files which contain their own condition data
+    def load_with_conditions(self, result):
+        growth_data, condition_data = result
         if self.row == -1:
-            data_manager.growth_data.add_data(psi_data)
+            data_manager.growth_data.add_data(growth_data)
             data_manager.condition_data.add_data(condition_data)
         else:
-            data_manager.growth_data.add_replicate(psi_data, self.row)
+            data_manager.growth_data.add_replicate(growth_data, self.row)
             data_manager.condition_data.add_replicate(condition_data, self.row)
 
-    def load_ada(self, file_name):
-        logger.info('Loading ADA file %s' % file_name)
-        ada_data, condition_data = read_ada(file_name)
+    def load_ada(self, result):
+        ada_data, condition_data = result
         if self.row == -1:
             data_manager.growth_data.add_data(ada_data)
             if condition_data is not None:
@@ -283,9 +250,8 @@ class LoadWindow(Window):
                 data_manager.condition_data.add_replicate(
                     condition_data, self.row)
 
-    def load_microbemeter(self, file_name):
-        logger.info('Loading MicrobeMeter file %s' % file_name)
-        data_list, condition_data = read_microbemeter(file_name)
+    def load_microbemeter(self, result):
+        data_list, condition_data = result
         if self.row == -1:
             data_manager.growth_data.add_data(data_list[0])
             n_files = len(data_manager.growth_data.data_files)
@@ -300,9 +266,7 @@ class LoadWindow(Window):
             for data in data_list:
                 data_manager.growth_data.add_replicate(data, self.row)
 
-    def load_spectrostar(self, file_name):
-        logger.info('Loading SpectroStar file %s' % file_name)
-        data_map = read_spectrostar(file_name)
+    def load_spectrostar(self, data_map):
         for profile, data_list in data_map.items():
             data_manager.growth_data.add_data(data_list[0])
             n_files = len(data_manager.growth_data.data_files)
@@ -312,48 +276,121 @@ class LoadWindow(Window):
                 else:
                     data_manager.growth_data.add_data(data)
 
-    @error_wrapper
-    def load(self):
-        logger.debug('Loading files into ADA')
+    # Create the list of files to read in, growth data first
+    def get_jobs(self):
         file_type = self.file_type.currentText()
+        details = None
+        if len(self.details) > 0:
+            details = self.details[0]
+        jobs = []
         for file_name in self.files:
-            if file_type == 'Algem Pro' and file_name.endswith('.txt'):
-                self.load_algem_pro(file_name)
-            elif file_type == 'Algem HT24' and file_name.endswith('.txt'):
-                self.load_algem_ht24_txt(file_name)
-            elif file_type == 'Algem HT24' and file_name.endswith('.csv'):
-                self.load_algem_ht24(file_name)
-            elif file_type == 'IP' and file_name.endswith('.csv'):
-                self.load_ip(file_name)
-            elif file_type == 'PSI' and file_name.endswith('.ods'):
-                self.load_psi(file_name)
-            elif file_type == 'ADA' and file_name.endswith('.csv'):
-                self.load_ada(file_name)
-            elif file_type == 'MicrobeMeter' and file_name.endswith('.tsv'):
-                self.load_microbemeter(file_name)
-            elif file_type == 'SpectroStar' and file_name.endswith('.ods'):
-                self.load_spectrostar(file_name)
-            else:
-                raise RuntimeError(
-                    "File %s has the wrong extension" % (file_name))
+            downsample = -1
+            if file_type == 'Algem HT24' and file_name.endswith('.txt'):
+                downsample = self.downsample.get_int()
+            jobs.append(ReadJob(file_type, file_name, details, downsample))
 
         if len(self.condition_files) > 0:
             # Set downsampling if option selected
             downsample = -1
             if isint(self.downsample.text()):
                 downsample = int(self.downsample.text())
-
-            # Load in optional conditions data for algem machines
             for file_name in self.condition_files:
-                if file_type == 'Algem Pro' and file_name.endswith('.txt'):
-                    self.load_algem_pro_conditions(file_name, downsample)
-                elif file_type == 'Algem HT24' and file_name.endswith('.csv'):
-                    self.load_algem_ht24_conditions(file_name, downsample)
-                else:
-                    raise RuntimeError("File %s has the wrong extension" %
-                                       (file_name))
+                jobs.append(ReadJob(file_type, file_name, details,
+                                    downsample, conditions=True))
+        return jobs
+
+    # Add the data read in from a file to the data manager
+    def add_result(self, job, result):
+        file_name = job.file_name
+        if job.conditions and job.file_type == 'Algem Pro':
+            self.load_algem_pro_conditions(result)
+        elif job.conditions and job.file_type == 'Algem HT24':
+            self.load_algem_ht24_conditions(result)
+        elif job.file_type == 'Algem Pro':
+            self.load_algem_pro(result)
+        elif job.file_type == 'Algem HT24' and file_name.endswith('.txt'):
+            self.load_algem_ht24_txt(result)
+        elif job.file_type == 'Algem HT24':
+            self.load_algem_ht24(result)
+        elif job.file_type == 'IP' or job.file_type == 'PSI':
+            self.load_with_conditions(result)
+        elif job.file_type == 'ADA':
+            self.load_ada(result)
+        elif job.file_type == 'MicrobeMeter':
+            self.load_microbemeter(result)
+        elif job.file_type == 'SpectroStar':
+            self.load_spectrostar(result)
+
+    # Show or hide the loading progress widgets
+    def show_progress(self, show):
+        self.load_button.setEnabled(not show)
+        self.progress_bar.setVisible(show)
+        self.progress_label.setVisible(show)
+        self.cancel_button.setVisible(show)
+
+    @error_wrapper
+    def load(self):
+        logger.debug('Loading files into ADA')
+        if self.load_job is not None:
+            return
+        # Read the files in the background, the data manager is only
+        # updated once everything has been read
+        self.load_job = LoadJob(self.get_jobs(), config.load_workers, self)
+        self.load_job.finished.connect(self.finish_load)
+        self.progress_bar.setValue(0)
+        self.progress_label.setText('')
+        self.show_progress(True)
+        self.progress_timer.start(100)
+        self.load_job.start()
+
+    def update_progress(self):
+        if self.load_job is None:
+            return
+        self.load_job.poll()
+        self.progress_bar.setValue(int(100 * self.load_job.fraction()))
+        self.progress_label.setText(self.load_job.status())
+
+    def cancel_load(self):
+        if self.load_job is None:
+            return
+        logger.debug('Cancelling file loading')
+        self.progress_label.setText('Cancelling...')
+        self.load_job.cancel()
+
+    @error_wrapper
+    def finish_load(self):
+        self.progress_timer.stop()
+        load_job = self.load_job
+        self.load_job = None
+        load_job.close()
+        self.show_progress(False)
+        if load_job.cancelled:
+            return
+        if load_job.error is not None:
+            raise load_job.error
+        for job, result in zip(load_job.jobs, load_job.results):
+            self.add_result(job, result)
 
         # Update the data lists in the main window
         self.parent.update_data_list()
         self.parent.update_condition_data_list()
         self.close()
+
+    # Stop any loading if the window is closed
+    # The readers only notice the cancel every so often, so rather than
+    # blocking until they do the job cleans itself up once it stops
+    def closeEvent(self, event):
+        if self.load_job is not None:
+            load_job = self.load_job
+            self.load_job = None
+            self.progress_timer.stop()
+            self.show_progress(False)
+            load_job.finished.disconnect(self.finish_load)
+            load_job.cancel()
+            if load_job.isFinished():
+                load_job.close()
+                load_job.deleteLater()
+            else:
+                load_job.finished.connect(load_job.close)
+                load_job.finished.connect(load_job.deleteLater)
+        super(LoadWindow, self).closeEvent(event)
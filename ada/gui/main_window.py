@@ -348,11 +348,43 @@ class App(QMainWindow):
         ])
 
         adv_outlier_form = Form(align=True, style=styles.white_background)
-        self.outlier_threshold = adv_outlier_form.addRow(
-            TextEntry('Auto outlier threshold', default=config.outlier_threshold))
+        self.outlier_method, self.outlier_threshold, self.outlier_window, self.outlier_sigma = adv_outlier_form.addRows([
+            DropDown('Auto outlier method', config.outlier_options,
+                     tooltip='jump = remove points after large jumps\n'
+                             'hampel = replace points far from the rolling median with the median\n'
+                             'rolling MAD = remove points far from the rolling median\n'
+                             'z-score = remove points far from the rolling mean'),
+            TextEntry('Auto outlier threshold', default=config.outlier_threshold,
+                      tooltip='Jumps larger than this times the mean jump are removed'),
+            TextEntry('Outlier window size', default=config.outlier_window,
+                      tooltip='Number of points in the rolling window'),
+            TextEntry('Outlier sigma', default=config.outlier_sigma,
+                      tooltip='Number of standard deviations from the rolling\n'
+                              'median or mean before a point is an outlier')])
+
+        calibration_form = Form(align=True, style=styles.white_background)
+        self.calibration_model, self.calibration_degree = calibration_form.addRows([
+            DropDown('Calibration model', config.calibration_options,
+                     tooltip='linear = straight lines between calibration points\n'
+                             'PCHIP = smooth curve that keeps the order of the points\n'
+                             'polynomial = best fit polynomial\n'
+                             'log-linear = best fit of log(CD) against OD'),
+            TextEntry('Calibration polynomial degree', default=config.calibration_degree)])
+
+        load_form = Form(align=True, style=styles.white_background)
+        self.load_workers, self.fit_workers, self.use_cache = load_form.addRows([
+            TextEntry('Parallel file loading workers', default=config.load_workers,
+                      tooltip='Number of processes used to read in multiple files'),
+            TextEntry('Parallel fitting workers', default=config.fit_workers,
+                      tooltip='Number of processes used to fit many data sets at once'),
+            CheckBox('Cache read in files', checked=config.use_cache,
+                     tooltip='Checked = reuse previously read in files if they haven''t changed\n'
+                             'Unchecked = always read files from scratch')])
 
         advanced_options.addWidget(sg_form.widget)
         advanced_options.addWidget(adv_outlier_form.widget)
+        advanced_options.addWidget(calibration_form.widget)
+        advanced_options.addWidget(load_form.widget)
         tabs.addTab(advanced_options.widget, 'Advanced')
 
         # ----------------------------------
@@ -375,10 +407,12 @@ class App(QMainWindow):
     @error_wrapper
     def open_calibration_file(self):
         logger.debug('Loading calibration curve from file')
-        self.calibration_file.clear()
         calib_file_name = get_file_names()
+        self.update_config()
+        data_manager.calibration = read_calibration(
+            calib_file_name[0], config.calibration_model, config.calibration_degree)
+        self.calibration_file.clear()
         self.calibration_file.setText(calib_file_name[0])
-        data_manager.calibration = read_calibration(calib_file_name[0])
         self.update_data_list()
 
     # Remove the calibration file
@@ -705,4 +739,12 @@ class App(QMainWindow):
         config.sg_order = self.sg_order.get_float()
         config.sg_deriv = self.sg_deriv.get_float()
         config.sg_rate = self.sg_rate.get_float()
+        config.outlier_method = self.outlier_method.currentText()
         config.outlier_threshold = self.outlier_threshold.get_float()
+        config.outlier_window = self.outlier_window.get_int()
+        config.outlier_sigma = self.outlier_sigma.get_float()
+        config.calibration_model = self.calibration_model.currentText()
+        config.calibration_degree = self.calibration_degree.get_int()
+        config.load_workers = self.load_workers.get_int()
+        config.fit_workers = self.fit_workers.get_int()
+        config.use_cache = self.use_cache.isChecked()
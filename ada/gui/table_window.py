@@ -13,6 +13,7 @@ from ada.components.button import Button
 from ada.components.list import List
 from ada.components.user_input import DropDown
 from ada.data.data_manager import data_manager
+from ada.data.fitting import CONVERGED, FAILED
 from ada.type_functions import isfloat
 
 import ada.configuration as config
@@ -126,8 +127,10 @@ class TableWindow(Window):
                             row.param.currentText()))
         return row_title
 
-    def get_row_data(self, row):
+    # Returns the values in the row and the status of each one if it was fitted
+    def get_row_data(self, row, settings=None):
         row_data = []
+        statuses = None
         if row.type == 'profile':
             row_data = [data_manager.growth_data.get_profiles()]
         if row.type == 'reactor':
@@ -136,34 +139,34 @@ class TableWindow(Window):
             gradients = data_manager.get_gradients(
                 row.data.currentText(),
                 row.grad_from.get_float(),
-                row.grad_to.get_float())
+                row.grad_to.get_float(), settings)
             row_data = [gradients]
         if row.type == 'time to':
             time_to = data_manager.get_time_to(row.data.currentText(),
-                                               row.time_to.get_float())
+                                               row.time_to.get_float(), settings)
             row_data = [time_to]
         if row.type == 'average of condition':
             average, _ = data_manager.get_averages(
                 row.condition.currentText(),
                 row.start_t.get_float(),
-                row.end_t.get_float())
+                row.end_t.get_float(), settings)
             row_data = [average]
         if row.type == 'condition at time':
             condition = data_manager.get_condition_at(
                 row.condition.currentText(),
-                row.time.get_float())
+                row.time.get_float(), settings)
             row_data = [condition]
         if row.type == 'fit parameter':
-            fit_result, fit_error = data_manager.get_all_fit_params(row.data.currentText(),
-                                                                    row.fit.currentText(),
-                                                                    row.fit_from.get_float(),
-                                                                    row.fit_to.get_float(),
-                                                                    row.param.currentText())
+            fit_result, fit_error, statuses = data_manager.get_all_fit_params(row.data.currentText(),
+                                                                              row.fit.currentText(),
+                                                                              row.fit_from.get_float(),
+                                                                              row.fit_to.get_float(),
+                                                                              row.param.currentText(), settings)
             if row.show_error.isChecked():
                 row_data = [fit_result, fit_error]
             else:
                 row_data = [fit_result]
-        return row_data
+        return row_data, statuses
 
     # Create table and write to file
     @error_wrapper
@@ -174,13 +177,18 @@ class TableWindow(Window):
         # Record the titles and data for each row
         row_titles = []
         row_data = []
+        row_statuses = []
+        settings = config.processing_config()
         # Loop over the rows
         for row in self.rows:
             row_titles.append(self.get_row_title(row))
-            row_data.append(self.get_row_data(row))
+            data, statuses = self.get_row_data(row, settings)
+            row_data.append(data)
+            row_statuses.append(statuses)
         self.header = column_headings
         self.titles = row_titles
         self.data = row_data
+        self.statuses = row_statuses
         self.show_table()
 
     def get_headings(self):
@@ -198,18 +206,22 @@ class TableWindow(Window):
             self.table.setItem(0, col, QTableWidgetItem(str(head)))
         for row, title in enumerate(self.titles):
             self.table.setItem(row+1, 0, QTableWidgetItem(str(title)))
+            statuses = self.statuses[row]
             for col, dat in enumerate(self.data[row][0]):
-                if dat is not None:
+                if statuses is not None and statuses[col] == FAILED:
+                    self.table.setItem(row+1, col+1, QTableWidgetItem('fit failed'))
+                elif dat is not None:
                     logger.debug(dat)
                     if len(self.data[row]) == 2:
-                        self.table.setItem(
-                            row+1, col+1, QTableWidgetItem('%.*f (%.*f)' % (config.sig_figs, dat, config.sig_figs, self.data[row][1][col])))
+                        text = '%.*f (%.*f)' % (config.sig_figs, dat, config.sig_figs, self.data[row][1][col])
                     elif isfloat(dat) and title != 'Reactor':
-                        self.table.setItem(
-                            row+1, col+1, QTableWidgetItem('%.*f' % (config.sig_figs, dat)))
+                        text = '%.*f' % (config.sig_figs, dat)
                     else:
-                        self.table.setItem(
-                            row+1, col+1, QTableWidgetItem(dat))
+                        text = dat
+                    # Flag fits that finished but can't be fully trusted
+                    if statuses is not None and statuses[col] != CONVERGED:
+                        text = '%s [%s]' % (text, statuses[col])
+                    self.table.setItem(row+1, col+1, QTableWidgetItem(text))
                 else:
                     self.table.setItem(row+1, col+1, QTableWidgetItem('none'))
 
@@ -92,6 +92,7 @@ class TestWindow(Window):
         config.do_fit = True
         test_option = self.test_option.currentText()
         measurement_option = self.test_measurement.currentText()
+        settings = config.processing_config()
         # Calculate value of all replicates individually
         measurements = []
         for i, dat in enumerate(data_manager.get_growth_data_files()):
@@ -107,18 +108,18 @@ class TestWindow(Window):
                 grad_from = self.grad_from.get_float(error=True)
                 grad_to = self.grad_to.get_float(error=True)
                 measurements.append(data_manager.get_replicate_gradients(
-                    i, signal, grad_from, grad_to))
+                    i, signal, grad_from, grad_to, settings))
             elif measurement_option == 'time to':
                 time_to = self.time_to.get_float(error=True)
                 measurements.append(
-                    data_manager.get_replicate_time_to(i, signal, time_to))
+                    data_manager.get_replicate_time_to(i, signal, time_to, settings))
             elif measurement_option == 'fit parameter':
                 fit_name = self.fit.currentText(error=True)
                 fit_from = self.fit_from.get_float(error=True)
                 fit_to = self.fit_to.get_float(error=True)
                 fit_param = self.param.currentText(error=True)
                 measurements.append(data_manager.get_replicate_fits(
-                    i, signal, fit_name, fit_from, fit_to, fit_param))
+                    i, signal, fit_name, fit_from, fit_to, fit_param, settings))
             else:
                 raise RuntimeError('Unknown measurement')
         # Calculate test result
@@ -5,12 +5,16 @@ from ada.logger import logger
 
 # Standard imports
 import sys
+import multiprocessing
 
 # pyqt5 imports
 from PyQt5.QtWidgets import QApplication
 
 if __name__ == '__main__':
 
+    # Needed for the file loading worker processes in frozen applications
+    multiprocessing.freeze_support()
+
     app = QApplication(sys.argv)
 
     screen = app.primaryScreen()
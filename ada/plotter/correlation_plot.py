@@ -40,6 +40,12 @@ class CorrelationCanvas(FigureCanvasQTAgg):
             plot_config.x_data, plot_config.y_data, alpha=0)
         self.errbar = self.axes.errorbar(
             plot_config.x_data, plot_config.y_data, plot_config.y_error, plot_config.x_error, '.')
+        # Mark the points from fits that didn't fully converge
+        flagged = [i for i, flag in enumerate(plot_config.flagged) if flag]
+        if len(flagged) > 0:
+            self.axes.scatter([plot_config.x_data[i] for i in flagged],
+                              [plot_config.y_data[i] for i in flagged],
+                              marker='x', color='r', zorder=3)
         if plot_config is not None:
             self.axes.set_title(plot_config.title)
             self.axes.set_xlabel(plot_config.x_title)
@@ -53,6 +59,10 @@ class CorrelationCanvas(FigureCanvasQTAgg):
                 self.axes.text(0.25, 0.95, text,
                                transform=self.axes.transAxes,
                                bbox=bounding_box, picker=True)
+            if len(plot_config.notes) > 0:
+                self.axes.text(0.02, 0.02, '\n'.join(plot_config.notes),
+                               transform=self.axes.transAxes,
+                               bbox=bounding_box, verticalalignment='bottom')
 
             self.label_annotation = self.axes.annotate('',
                                                        xy=(0, 0),
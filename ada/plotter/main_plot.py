@@ -93,6 +93,8 @@ class PlotCanvas(FigureCanvasQTAgg):
 
     def plot(self):
         logger.debug('Creating plot')
+        # Use the same processing settings for everything on the plot
+        self.settings = config.processing_config()
 
         # Reset the plot and configure the base style
         logger.debug('Resetting plot and configuring style')
@@ -220,7 +222,7 @@ class PlotCanvas(FigureCanvasQTAgg):
             if not data_manager.get_condition_file(i).visible:
                 continue
             # Get the condition data in the right time units. averaging if required
-            xdata, ydata, yerr = data_manager.get_condition_data(i)
+            xdata, ydata, yerr = data_manager.get_condition_data(i, settings=self.settings)
             ytitle = data_manager.get_condition_ytitle(i)
             self.condition_axes.set_ylabel(ytitle)
             legend_label = data_manager.get_condition_legend(i)
@@ -260,7 +262,7 @@ class PlotCanvas(FigureCanvasQTAgg):
         for i in range(data_manager.num_growth_files()):
             if not data_manager.get_growth_file(i).visible:
                 continue
-            xdata, ydata, yerr = data_manager.get_xy_data(i, config.yvar)
+            xdata, ydata, yerr = data_manager.get_xy_data(i, config.yvar, settings=self.settings)
             self.x_title, self.y_title = data_manager.get_titles(i)
             legend_label = data_manager.get_growth_legend(i)
 
@@ -335,13 +337,13 @@ class PlotCanvas(FigureCanvasQTAgg):
         if fit_index == -1:
             return
 
-        fit_x, _, _ = data_manager.get_fit_data(fit_index)
+        fit_x, _, _ = data_manager.get_fit_data(fit_index, settings=self.settings)
         x_unit, y_unit = data_manager.get_units(fit_index)
 
         model = get_model(config.fit_type, x_unit, y_unit)
         func = model.func()
 
-        fit_result, covm = data_manager.get_fit(fit_index)
+        fit_result, covm = data_manager.get_fit(fit_index, settings=self.settings)
         self.axes.plot(fit_x, func(fit_x, *fit_result),
                        '-', color='r', label='Fit')
 
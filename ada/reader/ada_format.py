@@ -0,0 +1,110 @@
+# Standard imports
+import os
+import json
+import struct
+import numpy as np
+
+# Local import
+from ada.reader.cache import dataset_header, dataset_from_header
+
+# Native ADA files start with this so they can be told apart from the csv
+ADA_MAGIC = b'ADA\x00BIN\x00'
+ADA_VERSION = 1
+# Magic, version, header length
+PREAMBLE = struct.Struct('<8sII')
+# Columns start on an 8 byte boundary so they can be mapped as float64
+ALIGNMENT = 8
+
+
+# Write a dataset and optional conditions to a native ADA file
+# Layout: preamble, JSON header, then one contiguous float64 block per column
+def write_ada_binary(file_name, data, conditions=None):
+    datasets = [data]
+    if conditions is not None:
+        datasets.append(conditions)
+
+    columns = []
+    headers = []
+    for data_set in datasets:
+        header = dataset_header(data_set)
+        header['rows'] = data_set.xaxis.data.size
+        headers.append(header)
+        columns.append(data_set.xaxis.data)
+        for sig in data_set.signals:
+            if sig.data.size != data_set.xaxis.data.size:
+                raise RuntimeError('Issue exporting data:\n'
+                                   'Different number of %s entries'
+                                   % (sig.name))
+            columns.append(sig.data)
+
+    header = json.dumps({'datasets': headers,
+                         'has_conditions': conditions is not None}).encode()
+    # Pad the header with spaces so the data block is aligned
+    padding = -(PREAMBLE.size + len(header)) % ALIGNMENT
+    header += b' ' * padding
+
+    with open(file_name, 'wb') as f:
+        f.write(PREAMBLE.pack(ADA_MAGIC, ADA_VERSION, len(header)))
+        f.write(header)
+        for column in columns:
+            f.write(np.ascontiguousarray(column, dtype='<f8').tobytes())
+
+
+# Check if a file is a native ADA file
+def is_ada_binary(file_name):
+    with open(file_name, 'rb') as f:
+        return f.read(len(ADA_MAGIC)) == ADA_MAGIC
+
+
+# Read a native ADA file, the columns are memory mapped rather than copied
+def read_ada_binary(file_name, progress=None):
+    with open(file_name, 'rb') as f:
+        preamble = f.read(PREAMBLE.size)
+        if len(preamble) != PREAMBLE.size:
+            raise RuntimeError('Issue processing header:\n'
+                               'File is too short to be an ADA file')
+        magic, version, header_size = PREAMBLE.unpack(preamble)
+        if magic != ADA_MAGIC:
+            raise RuntimeError('Issue processing header:\n'
+                               'File is not a native ADA file')
+        if version > ADA_VERSION:
+            raise RuntimeError('Issue processing header:\n'
+                               'ADA file version %i is not supported'
+                               % version)
+        header = json.loads(f.read(header_size).decode())
+
+    offset = PREAMBLE.size + header_size
+    headers = header['datasets']
+    n_values = sum(h['rows'] * (1 + len(h['signals'])) for h in headers)
+    if os.path.getsize(file_name) < offset + 8 * n_values:
+        raise RuntimeError('Issue processing data:\n'
+                           'File is shorter than its header says')
+    values = np.empty(0)
+    if n_values > 0:
+        values = np.memmap(file_name, dtype='<f8', mode='r', offset=offset,
+                           shape=(n_values,))
+
+    datasets = []
+    start = 0
+    for i, data_header in enumerate(headers):
+        rows = data_header['rows']
+        arrays = {'x%i' % i: values[start:start + rows]}
+        start += rows
+        for j in range(len(data_header['signals'])):
+            arrays['s%i_%i' % (i, j)] = values[start:start + rows]
+            start += rows
+        data = dataset_from_header(data_header, arrays, i)
+        data.name = file_name
+        data.label = (file_name.split('/')[-1]).split('.')[0]
+        datasets.append(data)
+        if progress is not None:
+            progress.update(rows, 8 * rows * (1 + len(data.signals)))
+
+    if len(datasets) == 0 or datasets[0].xaxis.data.size == 0:
+        raise RuntimeError('Issue processing data:\n'
+                           'Did not read in any data')
+
+    condition_data = None
+    if header['has_conditions'] and len(datasets) > 1:
+        condition_data = datasets[1]
+    return datasets[0], condition_data
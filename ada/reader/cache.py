@@ -0,0 +1,252 @@
+# Standard imports
+import os
+import json
+import hashlib
+import numpy as np
+from dateutil.parser import parse
+
+# Local import
+from ada.data.algae_data import AlgaeData
+import ada.configuration as config
+from ada.logger import logger
+
+# Version of the cache file layout
+cache_format = 1
+
+# Bump the version of a reader whenever the data it returns changes
+reader_versions = {
+    'read_algem_pro': 1,
+    'read_algem_ht24': 2,
+    'read_algem_ht24_details': 2,
+    'read_algem_ht24_txt': 1,
+    'read_ip': 1,
+    'read_psi': 2,
+    'read_ada': 1,
+    'read_microbemeter': 2,
+    'read_spectrostar': 2
+}
+
+
+# Hash the contents of a file in chunks
+def file_digest(file_name):
+    digest = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_stats(file_name):
+    stat = os.stat(file_name)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def cache_key(reader, file_names, args):
+    name = reader.__name__
+    key = json.dumps([cache_format, name, reader_versions.get(name, 0),
+                      [os.path.abspath(f) for f in file_names], list(args)])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def cache_path(key):
+    return os.path.join(config.cache_dir, key + '.npz')
+
+
+# Turn the (possibly nested) reader output into something JSON can store
+# The AlgaeData objects are replaced by indices into a list of datasets
+def encode(obj, datasets):
+    if isinstance(obj, AlgaeData):
+        for i, data in enumerate(datasets):
+            if data is obj:
+                return {'dataset': i}
+        datasets.append(obj)
+        return {'dataset': len(datasets) - 1}
+    if isinstance(obj, tuple):
+        return {'tuple': [encode(o, datasets) for o in obj]}
+    if isinstance(obj, list):
+        return {'list': [encode(o, datasets) for o in obj]}
+    if isinstance(obj, dict):
+        return {'dict': [[k, encode(v, datasets)] for k, v in obj.items()]}
+    return {'value': obj}
+
+
+def decode(obj, datasets):
+    if 'dataset' in obj:
+        return datasets[obj['dataset']]
+    if 'tuple' in obj:
+        return tuple(decode(o, datasets) for o in obj['tuple'])
+    if 'list' in obj:
+        return [decode(o, datasets) for o in obj['list']]
+    if 'dict' in obj:
+        return {k: decode(v, datasets) for k, v in obj['dict']}
+    return obj['value']
+
+
+def dataset_header(data):
+    return {
+        'name': data.name,
+        'label': data.label,
+        'date': data.date.isoformat(),
+        'time': data.time.isoformat(),
+        'title': data.title,
+        'reactor': data.reactor,
+        'sub_reactor': data.sub_reactor,
+        'profile': data.profile,
+        'xaxis': [data.xaxis.name, data.xaxis.unit],
+        'signals': [[sig.name, sig.unit, sig.range] for sig in data.signals],
+        'events': [[evt.datetime.isoformat(), evt.xpos, evt.labels]
+                   for evt in data.events]
+    }
+
+
+def dataset_from_header(header, arrays, index):
+    data = AlgaeData(header['name'])
+    data.label = header['label']
+    data.date = parse(header['date']).date()
+    data.time = parse(header['time']).time()
+    data.title = header['title']
+    data.reactor = header['reactor']
+    data.sub_reactor = header['sub_reactor']
+    data.profile = header['profile']
+    data.xaxis.name, data.xaxis.unit = header['xaxis']
+    data.xaxis.data = arrays['x%i' % index]
+    for j, (name, unit, sig_range) in enumerate(header['signals']):
+        sig = data.Signal()
+        sig.name = name
+        sig.unit = unit
+        sig.range = sig_range
+        sig.data = arrays['s%i_%i' % (index, j)]
+        data.signals.append(sig)
+    for evt_datetime, xpos, labels in header['events']:
+        evt = data.Event()
+        evt.datetime = parse(evt_datetime)
+        evt.xpos = xpos
+        evt.labels = labels
+        data.events.append(evt)
+    # Share the time axis again with any matching datasets
+    data.finalise()
+    return data
+
+
+# File hashes already worked out are passed in so files are only hashed once
+# Returns the path of the new entry
+def store_entry(key, file_names, stats, result, digests=None):
+    if digests is None:
+        digests = {}
+    datasets = []
+    header = {
+        'format': cache_format,
+        'files': [[os.path.abspath(f), stat[0], stat[1],
+                   digests[f] if f in digests else file_digest(f)]
+                  for f, stat in zip(file_names, stats)],
+        'result': encode(result, datasets)
+    }
+    header['datasets'] = [dataset_header(data) for data in datasets]
+    arrays = {'header': np.frombuffer(json.dumps(header).encode(),
+                                      dtype=np.uint8)}
+    for i, data in enumerate(datasets):
+        arrays['x%i' % i] = data.xaxis.data
+        for j, sig in enumerate(data.signals):
+            arrays['s%i_%i' % (i, j)] = sig.data
+
+    os.makedirs(config.cache_dir, exist_ok=True)
+    path = cache_path(key)
+    # Write to a temporary file first so a half written entry is never read
+    temp_path = path + '.%i.tmp' % os.getpid()
+    with open(temp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(temp_path, path)
+    return path
+
+
+# Returns the cached result, or None, and whether the stored file
+# information is out of date. Any file hashes worked out are added to digests
+def load_entry(key, file_names, stats, digests):
+    path = cache_path(key)
+    if not os.path.exists(path):
+        return None, False
+    stale = False
+    with np.load(path) as arrays:
+        header = json.loads(arrays['header'].tobytes().decode())
+        if header['format'] != cache_format:
+            return None, False
+        # Check the files haven't changed since they were cached
+        for f, stat, cached in zip(file_names, stats, header['files']):
+            if stat[0] != cached[1]:
+                return None, False
+            if stat[1] != cached[2]:
+                digests[f] = file_digest(f)
+                if digests[f] != cached[3]:
+                    return None, False
+                # Same contents with a new modification time
+                stale = True
+        datasets = [dataset_from_header(data_header, arrays, i)
+                    for i, data_header in enumerate(header['datasets'])]
+        result = decode(header['result'], datasets)
+    # Mark the entry as recently used
+    os.utime(path)
+    return result, stale
+
+
+# Remove the least recently used entries until the cache fits in its limit
+# The entry at keep is never removed, so a new entry survives on its own
+def evict(keep=None):
+    if not os.path.isdir(config.cache_dir):
+        return
+    entries = []
+    total = 0
+    for name in os.listdir(config.cache_dir):
+        if not name.endswith('.npz'):
+            continue
+        path = os.path.join(config.cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+    entries.sort()
+    limit = config.cache_size * 1e6
+    for _, size, path in entries:
+        if total <= limit:
+            break
+        if path == keep:
+            continue
+        logger.debug('Removing cached file %s' % path)
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+
+# Read in a file using the cached result if the file hasn't changed
+def read_cached(reader, file_names, args=(), progress=None):
+    if not config.use_cache:
+        return reader(*file_names, *args, progress=progress)
+
+    key = cache_key(reader, file_names, args)
+    stats = [file_stats(f) for f in file_names]
+    digests = {}
+    try:
+        result, stale = load_entry(key, file_names, stats, digests)
+        if result is not None:
+            logger.debug('Using cached data for %s' % ', '.join(file_names))
+            if stale:
+                # Store the new file information so the files aren't hashed
+                # every time they are read
+                try:
+                    store_entry(key, file_names, stats, result, digests)
+                except Exception as e:
+                    logger.warning('Could not update cached data: %s' % str(e))
+            return result
+    except Exception as e:
+        logger.warning('Could not read cached data: %s' % str(e))
+
+    result = reader(*file_names, *args, progress=progress)
+    try:
+        path = store_entry(key, file_names, stats, result, digests)
+        evict(path)
+    except Exception as e:
+        logger.warning('Could not cache data: %s' % str(e))
+    return result
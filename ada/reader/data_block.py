@@ -0,0 +1,47 @@
+# Standard imports
+import warnings
+import numpy as np
+
+
+# Parse a delimited block of numbers in a single vectorised call
+# Returns None if any of the rows are malformed
+def parse_data_block(block, n_columns, delimiter='\t'):
+    lines = block.splitlines()
+    if len(lines) == 0:
+        return None
+    for line in lines:
+        if line.count(delimiter) != n_columns - 1:
+            return None
+    if delimiter != '\t':
+        block = block.replace(delimiter, ' ')
+    with warnings.catch_warnings():
+        # Numpy only warns if it stops parsing part way through
+        warnings.simplefilter('error')
+        try:
+            values = np.fromstring(block, sep=' ')
+        except (ValueError, DeprecationWarning):
+            return None
+    if values.size != len(lines) * n_columns:
+        return None
+    return values.reshape(len(lines), n_columns)
+
+
+# Select the rows kept by downsampling from a block of rows
+# Rows are kept when their index in the file plus the offset divides evenly
+def downsample_rows(rows, first_row, downsample, offset=0):
+    if downsample == -1:
+        return rows
+    start = (-(first_row + offset)) % downsample
+    return rows[start::downsample]
+
+
+# Join blocks of rows into one array stored column by column
+# Each column is then a contiguous view that datasets can use without copying
+def stack_blocks(blocks, n_columns):
+    n_rows = sum(block.shape[0] for block in blocks)
+    values = np.empty((n_rows, n_columns), order='F')
+    start = 0
+    for block in blocks:
+        values[start:start + block.shape[0]] = block
+        start += block.shape[0]
+    return values
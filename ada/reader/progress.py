@@ -0,0 +1,57 @@
+# Raised inside a reader when loading has been cancelled
+# Derives from BaseException so the readers' error handling doesn't wrap it
+class LoadCancelled(BaseException):
+    pass
+
+
+# Class: Report reading progress and check for cancellation
+# The queue and event can be thread or multiprocessing manager objects
+class ReadProgress():
+
+    def __init__(self, queue=None, cancel_event=None, interval=1000):
+        self.queue = queue
+        self.cancel_event = cancel_event
+        self.interval = interval
+        self.index = 0
+        self.rows = 0
+        self.nbytes = 0
+        self.last_report = 0
+
+    # Reset the counters at the start of a new file
+    def start(self, index):
+        self.index = index
+        self.rows = 0
+        self.nbytes = 0
+        self.last_report = 0
+        self.check()
+
+    def check(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise LoadCancelled('Loading cancelled')
+
+    def report(self, done=False):
+        if self.queue is not None:
+            self.queue.put((self.index, self.rows, self.nbytes, done))
+
+    def update(self, rows=1, nbytes=0):
+        self.rows += rows
+        self.nbytes += nbytes
+        # Only talk to the other side every few rows, it can be slow
+        if self.rows - self.last_report >= self.interval:
+            self.last_report = self.rows
+            self.check()
+            self.report()
+
+    # Count rows read up to a position in the file, for readers that only
+    # see the file through a decompressing or parsing stream
+    def reached(self, position, rows=1):
+        self.update(rows, max(position - self.nbytes, 0))
+
+    def finish(self):
+        self.report(done=True)
+
+    # Wrap an iterable of lines, counting rows and characters as they are read
+    def lines(self, lines):
+        for line in lines:
+            self.update(1, len(line))
+            yield line
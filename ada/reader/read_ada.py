@@ -4,15 +4,22 @@ from dateutil.parser import parse
 
 # Local import
 from ada.data.algae_data import AlgaeData
+from ada.reader.progress import ReadProgress
+from ada.reader.ada_format import read_ada_binary
 
 
 # Loop over ADA csv files and read them in
-def read_ada(file_name):
+def read_ada(file_name, progress=None):
+    if progress is None:
+        progress = ReadProgress()
+    # Native files don't need parsing, the data is mapped straight in
+    if file_name.endswith('.ada'):
+        return read_ada_binary(file_name, progress)
     ada_data = AlgaeData(file_name)
     condition_data = AlgaeData(file_name)
     has_conditions = False
     with open(file_name, 'r', errors='ignore') as f:
-        reader = csv.reader(f, delimiter=',')
+        reader = csv.reader(progress.lines(f), delimiter=',')
         for row in reader:
             if row[0].lower() == 'name':
                 ada_data.reactor = row[1]
@@ -93,6 +100,8 @@ def read_ada(file_name):
                                'Different number of %s entries'
                                % (sig.name))
 
+    ada_data.finalise()
+    condition_data.finalise()
     if not has_conditions:
         condition_data = None
 
@@ -1,19 +1,51 @@
 # Standard imports
 import csv
+from itertools import islice
+import numpy as np
 from dateutil.parser import parse
 
 # Local import
 from ada.data.algae_data import AlgaeData
+from ada.reader.progress import ReadProgress
+from ada.reader.data_block import (parse_data_block, downsample_rows,
+                                   stack_blocks)
 
 
-# Loop over text files and read them in
-def read_algem_ht24(file_name, downsample=-1):
+# Parse the data rows one at a time, used when the fast path fails
+def parse_data_rows(rows, n_columns):
+    values = []
+    for count, row in rows:
+        if len(row) == 0:
+            continue
+        if len(row) != n_columns:
+            raise RuntimeError('Issue processing data:\n'
+                               'Expected %i columns on line %i'
+                               % (n_columns, count))
+        data_row = []
+        for dat in row:
+            try:
+                data_row.append(float(dat))
+            except Exception:
+                raise RuntimeError('Issue processing data:\n'
+                                   'Could not convert %s on line %i '
+                                   'to a number' % (dat, count))
+        values.append(data_row)
+    return np.array(values, dtype=float).reshape(-1, n_columns)
+
+
+# Read the header of a csv file and then yield the data in blocks of rows
+# Each block has the time in seconds followed by one column per reactor
+def iter_algem_ht24(file_name, downsample=-1, progress=None,
+                    block_size=10000):
+    if progress is None:
+        progress = ReadProgress()
     algem_data_list = []
     with open(file_name, 'r', errors='ignore') as f:
         try:
-            reader = csv.reader(f, delimiter=',')
+            header_line = f.readline()
+            progress.update(1, len(header_line))
             # Process the header data first
-            header = next(reader)
+            header = next(csv.reader([header_line], delimiter=','), [])
             x_name = ''
             x_unit = ''
             for i, name in enumerate(header):
@@ -46,45 +78,60 @@ def read_algem_ht24(file_name, downsample=-1):
                 raise RuntimeError('Issue processing header:\n'
                                    'Could not find sensor data')
 
-            count = 0
-            for row in reader:
-                # Check if downsampling is used
-                if downsample != -1:
-                    if count % downsample != 0:
-                        count = count + 1
-                        continue
-                count = count + 1
-
-                x_data = 0
-                for i, dat in enumerate(row):
-                    try:
-                        float(dat)
-                    except Exception:
-                        raise RuntimeError('Issue processing data:\n'
-                                           'Could not convert %s on line %i '
-                                           'to a number' % (dat, count))
-                    if i == 0:
-                        x_data = float(dat)
-                    if i != 0:
-                        algem_data_list[i-1].xaxis.append(x_data)
-                        algem_data_list[i-1].signals[0].append(float(dat))
-
-            # Check data has been read in
-            if(algem_data_list[0].xaxis.data.size == 0):
-                raise RuntimeError('Issue processing data:\n'
-                                   'Did not read in any data')
-            for sig in algem_data_list[0].signals:
-                if(sig.data.size != algem_data_list[0].xaxis.data.size):
-                    raise RuntimeError('Issue processing data:\n'
-                                       'Different number of %s entries'
-                                       % (sig.name))
-            # If everything is successful return the algem data product
-            return algem_data_list
+            # Parse every reactor in one go, row by row if that fails
+            n_columns = 1 + len(algem_data_list)
+            scale = algem_data_list[0].xaxis.scale()
+            first_row = 0
+            while True:
+                lines = list(islice(f, block_size))
+                if len(lines) == 0:
+                    break
+                progress.update(len(lines), sum(len(line) for line in lines))
+                selected = downsample_rows(lines, first_row, downsample)
+                values = parse_data_block(''.join(selected), n_columns, ',')
+                if values is None:
+                    counts = downsample_rows(
+                        range(first_row + 1, first_row + len(lines) + 1),
+                        first_row, downsample)
+                    rows = csv.reader(selected, delimiter=',')
+                    values = parse_data_rows(zip(counts, rows), n_columns)
+                first_row += len(lines)
+                if values.shape[0] == 0:
+                    continue
+                values[:, 0] *= scale
+                yield algem_data_list, values
 
         except Exception as e:
             raise RuntimeError('Error reading file '+file_name+'\n'+str(e))
 
 
+# Loop over text files and read them in
+def read_algem_ht24(file_name, downsample=-1, progress=None):
+    algem_data_list = None
+    blocks = []
+    for algem_data_list, values in iter_algem_ht24(file_name, downsample,
+                                                   progress):
+        blocks.append(values)
+
+    # Check data has been read in
+    if algem_data_list is None:
+        raise RuntimeError('Error reading file '+file_name+'\n'
+                           'Issue processing data:\n'
+                           'Did not read in any data')
+
+    # Store column by column so each reactor is contiguous
+    values = stack_blocks(blocks, 1 + len(algem_data_list))
+    # All of the reactors share the same time array
+    x_data = values[:, 0]
+    for i, algem_data in enumerate(algem_data_list):
+        algem_data.xaxis.data = x_data
+        algem_data.signals[0].data = values[:, i+1]
+        algem_data.finalise()
+
+    # If everything is successful return the algem data product
+    return algem_data_list
+
+
 def get_index(name, data_list):
     for i, data in enumerate(data_list):
         if data.sub_reactor == name:
@@ -92,10 +139,10 @@ def get_index(name, data_list):
     return -1
 
 
-def read_details(file_name, duplicate_name, downsample=-1):
+def read_details(file_name, duplicate_name, downsample=-1, progress=None):
 
     # Read in the algem data from the other file
-    algem_data_list = read_algem_ht24(file_name, downsample)
+    algem_data_list = read_algem_ht24(file_name, downsample, progress)
 
     f = open(duplicate_name, 'r', errors='ignore')
     reader = csv.reader(f, delimiter=',')
@@ -161,7 +208,8 @@ def read_details(file_name, duplicate_name, downsample=-1):
     return new_algem_data_list, replicate_data_list
 
 
-def read_algem_ht24_details(file_name1, file_name2, downsample=-1):
+def read_algem_ht24_details(file_name1, file_name2, downsample=-1,
+                            progress=None):
 
     # Determine which file is the details file
     f1 = open(file_name1, 'r', errors='ignore')
@@ -175,11 +223,11 @@ def read_algem_ht24_details(file_name1, file_name2, downsample=-1):
     if date1[0] == 'Date':
         f1.close()
         f2.close()
-        return read_details(file_name2, file_name1, downsample)
+        return read_details(file_name2, file_name1, downsample, progress)
     # Second file is details file
     elif date2[0] == 'Date':
         f1.close()
         f2.close()
-        return read_details(file_name1, file_name2, downsample)
+        return read_details(file_name1, file_name2, downsample, progress)
     else:
         raise RuntimeError('Neither file is a details file')
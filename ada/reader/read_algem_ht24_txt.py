@@ -4,10 +4,13 @@ from dateutil.parser import parse
 
 # Local import
 from ada.data.algae_data import AlgaeData
+from ada.reader.progress import ReadProgress
 
 
 # Loop over text files and read them in
-def read_algem_ht24_txt(file_name, downsample=-1):
+def read_algem_ht24_txt(file_name, downsample=-1, progress=None):
+    if progress is None:
+        progress = ReadProgress()
     algem_data_dict = {}
     condition_data_dict = {}
     replicate_dict = {}
@@ -85,7 +88,7 @@ def read_algem_ht24_txt(file_name, downsample=-1):
             f.seek(0)
             begin_read = False
             light_count = 0
-            for line in f:
+            for line in progress.lines(f):
                 if line.find('[Data]') != -1:
                     begin_read = True
                 if line.find('[End]') != -1:
@@ -118,6 +121,10 @@ def read_algem_ht24_txt(file_name, downsample=-1):
                     algem_data_dict[sub_reactor].signals[0].append(
                         float(data_str[3]))
 
+            for sub_reactor in algem_data_dict:
+                algem_data_dict[sub_reactor].finalise()
+                condition_data_dict[sub_reactor].finalise()
+
             # Separate out into replicates
             algem_data_list = []
             rep_algem_data_list = []
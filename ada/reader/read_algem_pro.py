@@ -1,12 +1,40 @@
 # Standard imports
+from itertools import islice
+import numpy as np
 from dateutil.parser import parse
 
 # Local import
 from ada.data.algae_data import AlgaeData
+from ada.reader.progress import ReadProgress
+from ada.reader.data_block import (parse_data_block, downsample_rows,
+                                   stack_blocks)
 
 
-# Loop over text files and read them in
-def read_algem_pro(file_name, downsample=-1):
+# Parse the [Data] lines one at a time, used when the fast path fails
+# Lines with the wrong number of columns are skipped
+def parse_data_lines(lines, n_columns):
+    rows = []
+    for line_index, line in lines:
+        data_str = line.split('\t')
+        if len(data_str) != n_columns:
+            continue
+        row = []
+        for dat in data_str:
+            try:
+                row.append(float(dat))
+            except Exception:
+                raise RuntimeError('Issue processing data:\n'
+                                   'Could not convert %s on line %i '
+                                   'to a number' % (dat, line_index))
+        rows.append(row)
+    return np.array(rows, dtype=float).reshape(-1, n_columns)
+
+
+# Read the header of a text file and then yield the data in blocks of rows
+# Each block has the time in seconds followed by one column per signal
+def iter_algem_pro(file_name, downsample=-1, progress=None, block_size=10000):
+    if progress is None:
+        progress = ReadProgress()
     algem_data = AlgaeData(file_name)
     with open(file_name, 'r', errors='ignore') as f:
         try:
@@ -44,52 +72,59 @@ def read_algem_pro(file_name, downsample=-1):
                                    'Could not find sensor data')
 
             # Process the data with any downsampling included
-            f.seek(0)
-            begin_read = False
-            count = 0
-            for line in f:
-                if line.find('[Data]') != -1:
-                    begin_read = True
-                if line.find('[End]') != -1:
+            n_columns = 1 + len(algem_data.signals)
+            scale = algem_data.xaxis.scale()
+            first_line = 0
+            finished = False
+            while not finished:
+                lines = list(islice(f, block_size))
+                if len(lines) == 0:
                     break
-                if not begin_read:
+                text = ''.join(lines)
+                data_end = text.find('[End]')
+                if data_end != -1:
+                    lines = text[:data_end].splitlines(True)
+                    text = text[:data_end]
+                    finished = True
+                progress.update(len(lines), len(text))
+                # The [Data] line counts as the first line read
+                selected = downsample_rows(lines, first_line, downsample, 1)
+                values = parse_data_block(''.join(selected), n_columns)
+                if values is None:
+                    indices = downsample_rows(
+                        range(first_line, first_line + len(lines)),
+                        first_line, downsample, 1)
+                    values = parse_data_lines(
+                        [(i + 2, line) for i, line in zip(indices, selected)],
+                        n_columns)
+                first_line += len(lines)
+                if values.shape[0] == 0:
                     continue
+                values[:, 0] *= scale
+                yield algem_data, values
+
+        except Exception as e:
+            raise RuntimeError('Error reading file '+file_name+'\n'+str(e))
 
-                # Check if downsampling is used
-                if downsample != -1:
-                    if count % downsample != 0:
-                        count = count + 1
-                        continue
-                count = count + 1
 
-                # Get the data from the columns
-                data_str = line.split('\t')
-                if len(data_str) != 1+len(algem_data.signals):
-                    continue
-                for i, dat in enumerate(data_str):
-                    try:
-                        float(dat)
-                    except Exception:
-                        raise RuntimeError('Issue processing data:\n'
-                                           'Could not convert %s on line %i '
-                                           'to a number' % (dat, count))
-                    if i == 0:
-                        algem_data.xaxis.append(float(dat))
-                        continue
-                    algem_data.signals[i-1].append(float(dat))
+# Loop over text files and read them in
+def read_algem_pro(file_name, downsample=-1, progress=None):
+    algem_data = None
+    blocks = []
+    for algem_data, values in iter_algem_pro(file_name, downsample, progress):
+        blocks.append(values)
 
-            # Check data has been read in
-            if(algem_data.xaxis.data.size == 0):
-                raise RuntimeError('Issue processing data:\n'
-                                   'Did not read in any data')
-            for sig in algem_data.signals:
-                if(sig.data.size != algem_data.xaxis.data.size):
-                    raise RuntimeError('Issue processing data:\n'
-                                       'Different number of %s entries'
-                                       % (sig.name))
+    # Check data has been read in
+    if algem_data is None:
+        raise RuntimeError('Error reading file '+file_name+'\n'
+                           'Issue processing data:\n'
+                           'Did not read in any data')
 
-            # If everything is successful return the algem data product
-            return algem_data
+    values = stack_blocks(blocks, 1 + len(algem_data.signals))
+    algem_data.xaxis.data = values[:, 0]
+    for i, sig in enumerate(algem_data.signals):
+        sig.data = values[:, i+1]
 
-        except Exception as e:
-            raise RuntimeError('Error reading file '+file_name+'\n'+str(e))
+    # If everything is successful return the algem data product
+    algem_data.finalise()
+    return algem_data
@@ -6,7 +6,8 @@ from ada.data.calibration_data import CalibrationData
 
 
 # Loop over ADA csv files and read them in
-def read_calibration(file_name):
+# The calibration model is fitted straight away so problems show up here
+def read_calibration(file_name, model='linear', degree=2):
     calibration_data = CalibrationData(file_name)
     with open(file_name, 'r', errors='ignore') as f:
         reader = csv.reader(f, delimiter=',')
@@ -15,4 +16,5 @@ def read_calibration(file_name):
         for row in reader:
             calibration_data.true.append(float(row[0]))
             calibration_data.measured.append(float(row[1]))
+    calibration_data.compile(model, degree)
     return calibration_data
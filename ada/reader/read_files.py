@@ -0,0 +1,156 @@
+# Standard imports
+from concurrent.futures import ProcessPoolExecutor
+
+# Local import
+from ada.data.algae_data import AlgaeData
+from ada.reader.read_algem_ht24 import (read_algem_ht24,
+                                        read_algem_ht24_details)
+from ada.reader.read_algem_pro import read_algem_pro
+from ada.reader.read_algem_ht24_txt import read_algem_ht24_txt
+from ada.reader.read_ip import read_ip
+from ada.reader.read_psi import read_psi
+from ada.reader.read_ada import read_ada
+from ada.reader.read_microbemeter import read_microbemeter
+from ada.reader.read_spectrostar import read_spectrostar
+from ada.reader.progress import ReadProgress, LoadCancelled
+from ada.reader.cache import read_cached
+from ada.logger import logger
+
+
+# Class: Description of a single file to be read in
+class ReadJob():
+
+    def __init__(self, file_type, file_name, details=None, downsample=-1,
+                 conditions=False):
+        self.file_type = file_type
+        self.file_name = file_name
+        self.details = details
+        self.downsample = downsample
+        self.conditions = conditions
+
+
+# Read in optional conditions files for algem machines
+def read_conditions_file(job, progress=None):
+    file_name = job.file_name
+    if job.file_type == 'Algem Pro' and file_name.endswith('.txt'):
+        logger.info('Loading Algem-Pro condition file %s, downsample %i' %
+                    (file_name, job.downsample))
+        return read_cached(read_algem_pro, [file_name], [job.downsample],
+                           progress)
+    if job.file_type == 'Algem HT24' and file_name.endswith('.csv'):
+        logger.info('Loading HT-24 condition file %s, downsample %i' %
+                    (file_name, job.downsample))
+        if job.details is None:
+            return read_cached(read_algem_ht24, [file_name],
+                               [job.downsample], progress)
+        return read_cached(read_algem_ht24_details, [file_name, job.details],
+                           [job.downsample], progress)
+    raise RuntimeError("File %s has the wrong extension" % (file_name))
+
+
+# Read in a file with the reader matching its type
+def read_file(job, progress=None):
+    file_name = job.file_name
+    file_type = job.file_type
+    if job.conditions:
+        return read_conditions_file(job, progress)
+    if file_type == 'Algem Pro' and file_name.endswith('.txt'):
+        logger.info('Loading an Algem-Pro file %s' % file_name)
+        return read_cached(read_algem_pro, [file_name], progress=progress)
+    if file_type == 'Algem HT24' and file_name.endswith('.txt'):
+        logger.info('Loading a partial HT-24 file %s, downsample: %i' %
+                    (file_name, job.downsample))
+        return read_cached(read_algem_ht24_txt, [file_name],
+                           [job.downsample], progress)
+    if file_type == 'Algem HT24' and file_name.endswith('.csv'):
+        logger.info('Loading HT-24 file %s' % file_name)
+        if job.details is None:
+            return read_cached(read_algem_ht24, [file_name],
+                               progress=progress)
+        return read_cached(read_algem_ht24_details, [file_name, job.details],
+                           progress=progress)
+    if file_type == 'IP' and file_name.endswith('.csv'):
+        logger.info('Loading IP file %s' % file_name)
+        try:
+            return read_cached(read_ip, [file_name], progress=progress)
+        except Exception as e:
+            raise RuntimeError('Error reading file '+file_name+'\n'+str(e))
+    if file_type == 'PSI' and file_name.endswith('.ods'):
+        logger.info('Loading PSI file %s' % file_name)
+        try:
+            return read_cached(read_psi, [file_name], progress=progress)
+        except Exception as e:
+            raise RuntimeError('Error reading file '+file_name+'\n'+str(e))
+    if file_type == 'ADA' and file_name.endswith('.csv'):
+        logger.info('Loading ADA file %s' % file_name)
+        return read_cached(read_ada, [file_name], progress=progress)
+    if file_type == 'ADA' and file_name.endswith('.ada'):
+        logger.info('Loading native ADA file %s' % file_name)
+        return read_ada(file_name, progress)
+    if file_type == 'MicrobeMeter' and file_name.endswith('.tsv'):
+        logger.info('Loading MicrobeMeter file %s' % file_name)
+        return read_cached(read_microbemeter, [file_name],
+                           progress=progress)
+    if file_type == 'SpectroStar' and file_name.endswith('.ods'):
+        logger.info('Loading SpectroStar file %s' % file_name)
+        return read_cached(read_spectrostar, [file_name],
+                           progress=progress)
+    raise RuntimeError("File %s has the wrong extension" % (file_name))
+
+
+# Read in a single file and report when it is finished
+def read_job(index, job, progress):
+    progress.start(index)
+    result = read_file(job, progress)
+    progress.finish()
+    return result
+
+
+# Share time axes again after results come back from other processes
+def share_time_axes(result):
+    if isinstance(result, AlgaeData):
+        result.xaxis.buffer.share()
+    elif isinstance(result, (list, tuple)):
+        for item in result:
+            share_time_axes(item)
+    elif isinstance(result, dict):
+        for item in result.values():
+            share_time_axes(item)
+
+
+# Read in a list of files, in parallel if more than one worker is requested
+# Results are returned in the same order as the jobs
+def read_files(jobs, workers=1, progress=None):
+    if progress is None:
+        progress = ReadProgress()
+    results = [None] * len(jobs)
+    errors = [None] * len(jobs)
+    if workers <= 1 or len(jobs) <= 1:
+        for i, job in enumerate(jobs):
+            try:
+                results[i] = read_job(i, job, progress)
+            except Exception as e:
+                errors[i] = e
+    else:
+        logger.debug('Reading %i files with %i workers' %
+                     (len(jobs), workers))
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures = [pool.submit(read_job, i, job, progress)
+                       for i, job in enumerate(jobs)]
+            for i, future in enumerate(futures):
+                try:
+                    results[i] = future.result()
+                    share_time_axes(results[i])
+                except LoadCancelled:
+                    # Don't start any files that are still waiting
+                    for waiting in futures:
+                        waiting.cancel()
+                    raise
+                except Exception as e:
+                    errors[i] = e
+
+    # Report every file that could not be read in one go
+    messages = [str(error) for error in errors if error is not None]
+    if len(messages) > 0:
+        raise RuntimeError('\n\n'.join(messages))
+    return results
@@ -4,14 +4,17 @@ from dateutil.parser import parse
 
 # Local import
 from ada.data.algae_data import AlgaeData
+from ada.reader.progress import ReadProgress
 
 
 # Loop over text files and read them in
-def read_ip(file_name):
+def read_ip(file_name, progress=None):
+    if progress is None:
+        progress = ReadProgress()
     ip_data = AlgaeData(file_name)
     condition_data = AlgaeData(file_name)
     with open(file_name, 'r', errors='ignore') as f:
-        reader = csv.reader(f, delimiter=',')
+        reader = csv.reader(progress.lines(f), delimiter=',')
         device_header = next(reader)
         ip_data.reactor = device_header[0]
         condition_data.reactor = device_header[0]
@@ -111,4 +114,6 @@ def read_ip(file_name):
                                % (sig.name))
 
     # If everything is successful return the IP data product
+    ip_data.finalise()
+    condition_data.finalise()
     return ip_data, condition_data
@@ -1,26 +1,61 @@
 # Standard imports
 import csv
+from itertools import islice
 from dateutil.parser import parse
 import numpy as np
 
 # Local import
 from ada.data.algae_data import AlgaeData
+from ada.reader.progress import ReadProgress
+from ada.reader.data_block import downsample_rows, stack_blocks
 
 
-def to_turbidity(data, initial, port4):
-    initial_corrected = initial * (initial/port4[0])
-    for i in range(data.size):
-        corrected = data[i] * (initial/port4[i])
-        data[i] = -np.log(corrected/initial_corrected)*(1/1.6)
-    return data
+# Convert port readings to turbidity, corrected with the reference port
+def to_turbidity(data, initial, port4, port4_initial=None):
+    if port4_initial is None:
+        port4_initial = port4[0]
+    initial_corrected = initial * (initial/port4_initial)
+    corrected = data * (initial/port4)
+    return -np.log(corrected/initial_corrected)*(1/1.6)
 
-# Loop over text files and read them in
-def read_microbemeter(file_name, downsample=-1):
+
+# Parse the data rows of a block, blank readings are stored as nan
+def parse_data_rows(rows, n_columns, start_datetime):
+    values = []
+    for count, row in rows:
+        if len(row) != n_columns:
+            raise RuntimeError('Issue processing data:\n'
+                               'Expected %i columns on line %i'
+                               % (n_columns, count))
+        current_datetime = parse(row[0])
+        data_row = [(current_datetime - start_datetime).total_seconds(),
+                    float(row[1])]
+        for dat in row[2:]:
+            if dat == 'Blank':
+                data_row.append(np.nan)
+                continue
+            try:
+                data_row.append(float(dat))
+            except Exception:
+                raise RuntimeError('Issue processing data:\n'
+                                   'Could not convert %s on line %i '
+                                   'to a number' % (dat, count))
+        values.append(data_row)
+    return np.array(values, dtype=float).reshape(-1, n_columns)
+
+
+# Read the header of a tsv file and then yield the data in blocks of rows
+# Each block has the time in seconds, the temperature and the three
+# turbidity measurements
+def iter_microbemeter(file_name, downsample=-1, progress=None,
+                      block_size=10000):
+    if progress is None:
+        progress = ReadProgress()
     data_list = []
     condition_data = AlgaeData(file_name)
     with open(file_name, 'r', errors='ignore') as f:
         try:
-            reader = csv.reader(f, delimiter='\t')
+            reader = csv.reader(progress.lines(f), delimiter='\t')
             # Process the header data first
             header = next(reader)
             title = ''
@@ -70,45 +105,61 @@ def read_microbemeter(file_name, downsample=-1):
                 raise RuntimeError('Issue processing header:\n'
                                    'Could not find sensor data')
 
-            count = 0
-            for row in reader:
-                # Check if downsampling is used
-                if downsample != -1:
-                    if count % downsample != 0:
-                        count = count + 1
-                        continue
-                count = count + 1
-
-                current_datetime = parse(row[0])
-                x_data = (current_datetime - start_datetime).total_seconds()
-                condition_data.xaxis.append(x_data)
-                condition_data.signals[0].append(float(row[1]))
-                for i, dat in enumerate(row):
-                    if i < 2 or dat == 'Blank':
-                        continue
-                    try:
-                        float(dat)
-                    except Exception:
-                        raise RuntimeError('Issue processing data:\n'
-                                           'Could not convert %s on line %i '
-                                           'to a number' % (dat, count))
-                    data_list[i-2].xaxis.append(x_data)
-                    data_list[i-2].signals[0].append(float(dat))
-
-            # Check data has been read in
-            if(data_list[0].xaxis.data.size == 0):
-                raise RuntimeError('Issue processing data:\n'
-                                   'Did not read in any data')
-            for sig in data_list[0].signals:
-                if(sig.data.size != data_list[0].xaxis.data.size):
-                    raise RuntimeError('Issue processing data:\n'
-                                       'Different number of %s entries'
-                                       % (sig.name))
-            # If everything is successful return the algem data product
-            port4 = data_list.pop().signals[0].data
-            for i in range(3):
-                data_list[i].signals[0].data = to_turbidity(data_list[i].signals[0].data, initial_readings[i], port4)
-            return data_list, condition_data
+            # The last port is the reference for the other three
+            port4_initial = None
+            data_list.pop()
+            first_row = 0
+            while True:
+                rows = list(islice(reader, block_size))
+                if len(rows) == 0:
+                    break
+                counts = downsample_rows(
+                    range(first_row + 1, first_row + len(rows) + 1),
+                    first_row, downsample)
+                selected = downsample_rows(rows, first_row, downsample)
+                first_row += len(rows)
+                values = parse_data_rows(zip(counts, selected),
+                                         len(headings), start_datetime)
+                if values.shape[0] == 0:
+                    continue
+                port4 = values[:, 5]
+                if port4_initial is None:
+                    measured = port4[~np.isnan(port4)]
+                    if measured.size > 0:
+                        port4_initial = measured[0]
+                for i in range(3):
+                    values[:, i+2] = to_turbidity(values[:, i+2],
+                                                  initial_readings[i], port4,
+                                                  port4_initial)
+                yield (data_list, condition_data), values[:, :5]
 
         except Exception as e:
             raise RuntimeError('Error reading file '+file_name+'\n'+str(e))
+
+
+# Loop over text files and read them in
+def read_microbemeter(file_name, downsample=-1, progress=None):
+    datasets = None
+    blocks = []
+    for datasets, values in iter_microbemeter(file_name, downsample,
+                                              progress):
+        blocks.append(values)
+
+    # Check data has been read in
+    if datasets is None:
+        raise RuntimeError('Error reading file '+file_name+'\n'
+                           'Issue processing data:\n'
+                           'Did not read in any data')
+
+    data_list, condition_data = datasets
+    values = stack_blocks(blocks, 5)
+    condition_data.xaxis.data = values[:, 0]
+    condition_data.signals[0].data = values[:, 1]
+    condition_data.finalise()
+    for i, data in enumerate(data_list):
+        # Blank readings are left out
+        measured = ~np.isnan(values[:, i+2])
+        data.xaxis.data = values[measured, 0]
+        data.signals[0].data = values[measured, i+2]
+        data.finalise()
+    return data_list, condition_data
@@ -0,0 +1,172 @@
+# Standard imports
+import zipfile
+import xml.etree.ElementTree as ET
+
+# Local import
+from ada.reader.progress import ReadProgress
+
+# Namespaces used in the spreadsheet content
+TABLE_NS = '{urn:oasis:names:tc:opendocument:xmlns:table:1.0}'
+OFFICE_NS = '{urn:oasis:names:tc:opendocument:xmlns:office:1.0}'
+TEXT_NS = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+
+TABLE = TABLE_NS + 'table'
+ROW = TABLE_NS + 'table-row'
+CELLS = (TABLE_NS + 'table-cell', TABLE_NS + 'covered-table-cell')
+PARAGRAPHS = (TEXT_NS + 'p', TEXT_NS + 'h')
+
+# Attribute holding the value of each type of cell
+VALUE_ATTRIBUTES = {
+    'float': OFFICE_NS + 'value',
+    'percentage': OFFICE_NS + 'value',
+    'currency': OFFICE_NS + 'value',
+    'date': OFFICE_NS + 'date-value',
+    'time': OFFICE_NS + 'time-value',
+    'boolean': OFFICE_NS + 'boolean-value'
+}
+NUMERIC_TYPES = ('float', 'percentage', 'currency')
+
+
+# Class: A single spreadsheet cell, behaves like an ezodf cell
+class OdsCell():
+    __slots__ = ('value_type', 'raw', 'text')
+
+    def __init__(self, value_type=None, raw=None, text=''):
+        self.value_type = value_type
+        self.raw = raw
+        self.text = text
+
+    @property
+    def value(self):
+        if self.value_type is None:
+            return None
+        if self.value_type == 'string':
+            return self.text
+        if self.raw is None:
+            return None
+        if self.value_type in NUMERIC_TYPES:
+            return float(self.raw)
+        if self.value_type == 'boolean':
+            return self.raw == 'true'
+        return self.raw
+
+    def plaintext(self):
+        return self.text
+
+    def empty(self):
+        return self.value_type is None and self.text == ''
+
+
+EMPTY_CELL = OdsCell()
+
+
+# Get a cell from a row, rows are trimmed so missing cells are empty
+def get_cell(row, column):
+    if column < len(row):
+        return row[column]
+    return EMPTY_CELL
+
+
+# Get a cell from a list of rows
+def sheet_cell(sheet, row, column):
+    if row < len(sheet):
+        return get_cell(sheet[row], column)
+    return EMPTY_CELL
+
+
+# Get the text of a paragraph including spaces, tabs and line breaks
+def element_text(element):
+    text = [element.text or '']
+    for child in element:
+        if child.tag == TEXT_NS + 's':
+            text.append(' ' * int(child.get(TEXT_NS + 'c', 1)))
+        elif child.tag == TEXT_NS + 'tab':
+            text.append('\t')
+        elif child.tag == TEXT_NS + 'line-break':
+            text.append('\n')
+        else:
+            text.append(element_text(child))
+        text.append(child.tail or '')
+    return ''.join(text)
+
+
+def make_cell(element):
+    value_type = element.get(OFFICE_NS + 'value-type')
+    raw = None
+    if value_type in VALUE_ATTRIBUTES:
+        raw = element.get(VALUE_ATTRIBUTES[value_type])
+    text = '\n'.join(element_text(p) for p in element if p.tag in PARAGRAPHS)
+    return OdsCell(value_type, raw, text)
+
+
+# Turn a row element into a list of cells
+# Repeated cells are expanded and trailing empty cells are dropped
+def make_row(element):
+    row = []
+    empty = 0
+    for child in element:
+        if child.tag not in CELLS:
+            continue
+        repeat = int(child.get(TABLE_NS + 'number-columns-repeated', 1))
+        cell = make_cell(child)
+        if cell.empty():
+            empty += repeat
+            continue
+        if empty > 0:
+            row.extend([EMPTY_CELL] * empty)
+            empty = 0
+        row.extend([cell] * repeat)
+    return row
+
+
+# Yield the rows of the current table as they are parsed
+# Repeated rows are expanded and trailing empty rows are dropped
+# Progress is the position reached in the compressed file
+def iter_rows(events, parents, source, progress):
+    empty = 0
+    for event, element in events:
+        if event == 'start':
+            parents.append(element)
+            continue
+        parents.pop()
+        if element.tag == TABLE:
+            return
+        if element.tag != ROW:
+            continue
+        repeat = int(element.get(TABLE_NS + 'number-rows-repeated', 1))
+        row = make_row(element)
+        # Free the parsed row so memory use doesn't grow with the file
+        parents[-1].remove(element)
+        progress.reached(source.tell(), repeat if len(row) > 0 else 0)
+        if len(row) == 0:
+            empty += repeat
+            continue
+        for _ in range(empty):
+            yield []
+        empty = 0
+        for _ in range(repeat):
+            yield row
+
+
+# Stream the sheets of an ods file without building the whole document
+# Yields the name of each sheet and a generator over its rows
+def iter_sheets(file_name, progress=None):
+    if progress is None:
+        progress = ReadProgress()
+    with open(file_name, 'rb') as source, zipfile.ZipFile(source) as archive:
+        with archive.open('content.xml') as content:
+            events = iter(ET.iterparse(content, events=('start', 'end')))
+            parents = []
+            for event, element in events:
+                if event == 'end':
+                    parents.pop()
+                    continue
+                parents.append(element)
+                if element.tag != TABLE:
+                    continue
+                rows = iter_rows(events, parents, source, progress)
+                yield element.get(TABLE_NS + 'name'), rows
+                # Skip any rows that weren't used
+                for _ in rows:
+                    pass
+                parents[-1].remove(element)
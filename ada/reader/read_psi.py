@@ -2,36 +2,41 @@
 from datetime import timedelta
 from dateutil.parser import parse
 
-import ezodf as ods
-
 # Local import
 from ada.data.algae_data import AlgaeData
+from ada.reader.progress import ReadProgress
+from ada.reader.read_ods import iter_sheets, get_cell, sheet_cell
 
 
 # Loop over text files and read them in
-def read_psi(file_name):
+def read_psi(file_name, progress=None):
+    if progress is None:
+        progress = ReadProgress()
     psi_data = AlgaeData(file_name)
     condition_data = AlgaeData(file_name)
 
-    ods_data = ods.opendoc(file_name)
     psi_index_map = {}
     cond_index_map = {}
-    for sheet in ods_data.sheets:
+    for sheet_name, rows in iter_sheets(file_name, progress):
+
+        # Only the data sheet is large enough to need streaming
+        if sheet_name != 'Data':
+            sheet = list(rows)
 
-        if sheet.name == 'Info':
+        if sheet_name == 'Info':
             # Get title
-            psi_data.title = sheet[0, 1].plaintext()
-            condition_data.title = sheet[0, 1].plaintext()
+            psi_data.title = sheet_cell(sheet, 0, 1).plaintext()
+            condition_data.title = sheet_cell(sheet, 0, 1).plaintext()
             # Get start date
-            start_datetime = parse(sheet[1, 1].plaintext())
+            start_datetime = parse(sheet_cell(sheet, 1, 1).plaintext())
             psi_data.date = start_datetime.date()
             condition_data.date = start_datetime.date()
             # Get start time
             psi_data.time = start_datetime.time()
             condition_data.time = start_datetime.time()
             # Get profile (medium + organism)
-            medium = sheet[10, 1].plaintext()
-            organism = sheet[11, 1].plaintext()
+            medium = sheet_cell(sheet, 10, 1).plaintext()
+            organism = sheet_cell(sheet, 11, 1).plaintext()
             psi_data.profile = medium + ' ' + organism
             condition_data.profile = medium + ' ' + organism
             # Get time units
@@ -40,15 +45,15 @@ def read_psi(file_name):
             condition_data.xaxis.name = 'Time'
             condition_data.xaxis.unit = 's'
 
-        if sheet.name == 'Devices':
+        if sheet_name == 'Devices':
             # Get reactor
-            psi_data.reactor = sheet[1, 1].plaintext()
-            condition_data.reactor = sheet[1, 1].plaintext()
+            psi_data.reactor = sheet_cell(sheet, 1, 1).plaintext()
+            condition_data.reactor = sheet_cell(sheet, 1, 1).plaintext()
 
-        if sheet.name == 'Events':
-            for i in range(1, sheet.nrows()):
-                xpos = float(sheet[i, 1].value) * 60 * 60
-                label = sheet[i, 3].plaintext()
+        if sheet_name == 'Events':
+            for i in range(1, len(sheet)):
+                xpos = float(sheet_cell(sheet, i, 1).value) * 60 * 60
+                label = sheet_cell(sheet, i, 3).plaintext()
                 found_existing = False
                 for evt in psi_data.events:
                     if xpos == evt.xpos:
@@ -62,14 +67,14 @@ def read_psi(file_name):
                         timedelta(seconds=xpos)
                     psi_data.events.append(data_event)
 
-        if sheet.name == 'Accessories':
+        if sheet_name == 'Accessories':
             # Get titles and units of measurements
             psi_i = 0
             cond_i = 0
-            for i in range(1, sheet.nrows()):
-                measurement_key = sheet[i, 0].plaintext()
-                measurement_name = sheet[i, 1].plaintext()
-                measurement_unit = sheet[i, 2].plaintext()
+            for i in range(1, len(sheet)):
+                measurement_key = sheet_cell(sheet, i, 0).plaintext()
+                measurement_name = sheet_cell(sheet, i, 1).plaintext()
+                measurement_unit = sheet_cell(sheet, i, 2).plaintext()
                 if measurement_name.find('OD') == 0:
                     psi_signal = psi_data.Signal()
                     psi_signal.name = measurement_name
@@ -85,26 +90,27 @@ def read_psi(file_name):
                     cond_index_map[measurement_key] = cond_i
                     cond_i += 1
 
-        if sheet.name == 'Data':
+        if sheet_name == 'Data':
+            header = next(rows, [])
             psi_col_index = {}
             cond_col_index = {}
-            for j in range(2, sheet.ncols()):
-                measurement_key = sheet[0, j].plaintext()
+            for j in range(2, len(header)):
+                measurement_key = get_cell(header, j).plaintext()
                 if measurement_key in psi_index_map:
                     psi_col_index[j] = psi_index_map[measurement_key]
                 if measurement_key in cond_index_map:
                     cond_col_index[j] = cond_index_map[measurement_key]
             # Get the measurement data
-            for i in range(1, sheet.nrows()):
-                time_s = float(sheet[i, 0].value) * 60 * 60
+            for row in rows:
+                time_s = float(get_cell(row, 0).value) * 60 * 60
                 od_measured = False
                 condition_data.xaxis.append(time_s)
-                for j in range(2, sheet.ncols()):
+                for j in range(2, len(header)):
                     try:
-                        measurement = sheet[i, j].value
-                    except:
+                        measurement = get_cell(row, j).value
+                    except Exception:
                         measurement = 0
-                    if measurement != '':
+                    if measurement is not None and measurement != '':
                         measurement = float(measurement)
                     else:
                         measurement = None
@@ -139,4 +145,6 @@ def read_psi(file_name):
                                % (sig.name))
 
     # If everything is successful return the IP data product
+    psi_data.finalise()
+    condition_data.finalise()
     return psi_data, condition_data
@@ -1,45 +1,47 @@
 # Standard imports
 from dateutil.parser import parse
 
-import ezodf as ods
-
 # Local import
 from ada.data.algae_data import AlgaeData
+from ada.reader.progress import ReadProgress
+from ada.reader.read_ods import iter_sheets, sheet_cell
 
 
 # Loop over text files and read them in
-def read_spectrostar(file_name):
+def read_spectrostar(file_name, progress=None):
+    if progress is None:
+        progress = ReadProgress()
     spectrostar_data = {}
 
-    ods_data = ods.opendoc(file_name)
-    for sheet in ods_data.sheets:
+    for sheet_name, rows in iter_sheets(file_name, progress):
 
-        if sheet.name == 'All_Cycles':
+        if sheet_name == 'All_Cycles':
+            sheet = list(rows)
             # Get title
-            title = sheet[3, 0].plaintext().split(': ')[1]
+            title = sheet_cell(sheet, 3, 0).plaintext().split(': ')[1]
             # Get start date
-            start_datetime = parse(sheet[4, 0].plaintext().split(': ')[1]+' '+sheet[5,0].plaintext().split(': ')[1])
+            start_datetime = parse(sheet_cell(sheet, 4, 0).plaintext().split(': ')[1]+' '+sheet_cell(sheet, 5, 0).plaintext().split(': ')[1])
             data_date = start_datetime.date()
             # Get start time
             data_time = start_datetime.time()
 
             times = [0]
             col = 5
-            while sheet[11, col].plaintext() != '':
-                time = sheet[11, col].plaintext().split(':')
+            while sheet_cell(sheet, 11, col).plaintext() != '':
+                time = sheet_cell(sheet, 11, col).plaintext().split(':')
                 times.append(60*60*int(time[0]) + 60*int(time[1]) + int(time[2]))
                 col += 1
 
             for i in range(12, 72):
-                if sheet[i, 1].plaintext() == '':
+                if sheet_cell(sheet, i, 1).plaintext() == '':
                     continue
                 data = AlgaeData(file_name)
                 data.title = title
                 data.date = data_date
                 data.time = data_time
-                data.reactor = sheet[i, 0].plaintext()
-                data.label = sheet[i, 1].plaintext()[:-2]
-                data.profile = sheet[i, 2].plaintext()
+                data.reactor = sheet_cell(sheet, i, 0).plaintext()
+                data.label = sheet_cell(sheet, i, 1).plaintext()[:-2]
+                data.profile = sheet_cell(sheet, i, 2).plaintext()
                 # Get titles and units of measurements
                 signal = data.Signal()
                 signal.name = 'OD'
@@ -50,7 +52,8 @@ def read_spectrostar(file_name):
                 data.xaxis.unit = 's'
                 for j in range(5, col):
                     data.xaxis.append(times[j-5])
-                    data.signals[0].append(float(sheet[i, j].value))
+                    data.signals[0].append(float(sheet_cell(sheet, i, j).value))
+                data.finalise()
 
                 if data.label not in spectrostar_data:
                     spectrostar_data[data.label] = []
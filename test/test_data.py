@@ -3,6 +3,7 @@ import sys
 import os
 from datetime import datetime, date, time
 import math
+import pickle
 import numpy as np
 
 from ada.reader.read_algem_pro import read_algem_pro
@@ -11,9 +12,15 @@ from ada.data.algae_data import AlgaeData
 from ada.data.data_holder import DataHolder
 from ada.data.models import get_model
 from ada.data.processor import (
-    align_to_y, remove_outliers, savitzky_golay, average_data,
-    time_average, time_average_arrays, get_exponent, exponent_text, exponent_text_errors)
+    align_to_y, crossing_index, crossing_point, calculate_gradients,
+    calculate_times_to, remove_outliers, rolling_median_mad, sorted_median_mad,
+    savitzky_golay, savitzky_golay_batch,
+    average_data, time_average, time_average_arrays, time_average_blocks, average_blocks,
+    get_exponent, exponent_text, exponent_text_errors)
+from ada.data.fitting import (FitJob, fit_batch, direct_fit, iterative_fit,
+                              CONVERGED, FAILED, HIT_BOUNDS, NO_ERRORS)
 from ada.data.data_manager import DataManager
+import ada.configuration as config
 
 
 class DataTest(unittest.TestCase):
@@ -91,10 +98,93 @@ class DataTest(unittest.TestCase):
         self.assertEqual(self.data.get_ytitle(
             'OD', 'name', 'unit', None, True), 'name [unit]', 'Incorrect ytitle')
 
+    def test_buffer_version(self):
+        versions = self.data.version()
+        copy = pickle.loads(pickle.dumps(self.data))
+        # Versions from another process mustn't match buffers in this one
+        self.assertNotEqual(copy.version(), versions, 'Version reused')
+        self.assertTrue(copy.signals[0].buffer.version >
+                        self.data.signals[0].buffer.version, 'Version reused')
+        self.assertTrue(np.array_equal(copy.signals[0].data,
+                                       self.data.signals[0].data),
+                        'Data not copied')
+
+    def test_algae_data_buffers(self):
+        data = AlgaeData('name.txt')
+        data.xaxis.unit = 'min'
+        for i in range(100):
+            data.xaxis.append(i)
+        data.xaxis.extend(np.array([100, 101]))
+        self.assertEqual(data.xaxis.data.size, 102, 'Incorrect x size')
+        self.assertEqual(data.xaxis.data[101], 6060, 'Incorrect x scaling')
+        signal = data.Signal()
+        signal.extend([1, 2, 3])
+        signal.append(4)
+        data.signals.append(signal)
+        data.finalise()
+        self.assertEqual(list(signal.data), [1, 2, 3, 4], 'Incorrect signal')
+        self.assertEqual(signal.data.dtype, np.float64, 'Incorrect dtype')
+        # Setting the data directly should not alter the original array
+        original = np.array([1., 2.])
+        signal.data = original
+        signal.append(3)
+        self.assertEqual(original.size, 2, 'Original array modified')
+        self.assertEqual(signal.data.size, 3, 'Incorrect signal size')
+
+    def test_shared_time_axis(self):
+        data_list = []
+        for i in range(3):
+            data = AlgaeData('name%i.txt' % i)
+            data.xaxis.extend(np.arange(10.))
+            data.finalise()
+            data_list.append(data)
+        # Identical time axes should be stored once
+        self.assertEqual(np.shares_memory(data_list[0].xaxis.data,
+                                          data_list[2].xaxis.data),
+                         True, 'Time axis not shared')
+        self.assertEqual(data_list[0].xaxis.data.flags.writeable, False,
+                         'Shared time axis can be modified')
+        # Appending to one should leave the others alone
+        data_list[1].xaxis.append(10)
+        self.assertEqual(data_list[1].xaxis.data.size, 11,
+                         'Incorrect x size after append')
+        self.assertEqual(data_list[0].xaxis.data.size, 10,
+                         'Shared time axis modified by append')
+        self.assertEqual(np.shares_memory(data_list[0].xaxis.data,
+                                          data_list[1].xaxis.data),
+                         False, 'Time axis not copied on write')
+
     # ====== data/calibration_data.py ========
     def test_calibration_data(self):
         self.assertEqual(len(self.calib.calibrate_od(
             self.data.get_signal('OD'))), 427)
+        cds = self.calib.calibrate_od([0.33, 0.46, 0.2, 4])
+        self.assertTrue(isinstance(cds, np.ndarray), 'Incorrect type')
+        self.assertAlmostEqual(cds[0], 0.12, 5, 'Incorrect calibration point')
+        self.assertAlmostEqual(cds[1], 0.172, 5, 'Incorrect interpolation')
+        # Lines are projected out from the first and last points
+        self.assertAlmostEqual(cds[2], 0.068, 5, 'Incorrect low projection')
+        self.assertAlmostEqual(cds[3], 5.849014, 5,
+                               'Incorrect high projection')
+
+    def test_calibration_models(self):
+        measured = np.array(self.calib.measured)
+        true = np.array(self.calib.true)
+        ods = np.linspace(0, 4, 101)
+        for model in ['PCHIP', 'polynomial', 'log-linear']:
+            cds = self.calib.calibrate_od(ods, model, 2)
+            self.assertEqual(cds.shape, ods.shape, 'Incorrect shape')
+            self.assertTrue(np.all(np.isfinite(cds)), 'Invalid calibration')
+        # The monotone curve goes through every point and keeps their order
+        cds = self.calib.calibrate_od(measured, 'PCHIP')
+        self.assertTrue(np.allclose(cds, true), 'Curve misses points')
+        cds = self.calib.calibrate_od(ods, 'PCHIP')
+        self.assertTrue(np.all(np.diff(cds) > 0), 'Curve not monotonic')
+        cds = self.calib.calibrate_od(ods, 'polynomial', 1)
+        self.assertTrue(np.allclose(cds, np.polyval(
+            np.polyfit(measured, true, 1), ods)), 'Incorrect polynomial')
+        with self.assertRaises(RuntimeError):
+            self.calib.calibrate_od(ods, 'polynomial', 7)
 
     # ====== data/data_holder.py ========
     def test_data_holder(self):
@@ -149,6 +239,27 @@ class DataTest(unittest.TestCase):
         func = model.func()
         self.assertEqual(math.floor(func([2], 0, 40, 0.4, 4)), 4)
 
+    def test_model_jacobians(self):
+        xdata = np.linspace(0, 10, 21)
+        params = {'flat line': [0.5], 'linear': [0.5, 2],
+                  'quadratic': [0.5, 2, -0.1], 'exponential': [0.5, 0.2],
+                  'zweitering': [0.1, 2, 0.3, 3]}
+        for name, values in params.items():
+            model = get_model(name)
+            func = model.func()
+            jac = model.jac()(xdata, *values)
+            self.assertEqual(jac.shape, (21, len(values)), 'Wrong shape')
+            # Compare against central finite differences
+            for i in range(len(values)):
+                step = 1e-6 * max(abs(values[i]), 1)
+                up = list(values)
+                up[i] += step
+                down = list(values)
+                down[i] -= step
+                numeric = (func(xdata, *up) - func(xdata, *down)) / (2 * step)
+                self.assertTrue(np.allclose(jac[:, i], numeric, atol=1e-6),
+                                'Wrong derivative for %s' % name)
+
     # ====== data/processor.py ========
     def test_align_to_y(self):
         xdata = np.array([0, 1, 2, 3, 4, 5, 6])
@@ -156,6 +267,26 @@ class DataTest(unittest.TestCase):
         newx = align_to_y(xdata, ydata, 2)
         self.assertEqual(newx[0], -2)
 
+    def test_crossing_point(self):
+        xdata = np.array([0, 1, 2, 3, 4, 5, 6])
+        ydata = np.array([0, 2, 4, 6, 8, 10, 12])
+        self.assertEqual(crossing_index(ydata, 5), 3, 'Incorrect index')
+        self.assertEqual(crossing_index(ydata, 13), -1, 'Incorrect index')
+        self.assertEqual(list(crossing_index(ydata, [1, 4, 20])), [1, 2, -1],
+                         'Incorrect batch of thresholds')
+        self.assertEqual(list(crossing_index(np.stack([ydata, ydata + 4]), 5)),
+                         [3, 1], 'Incorrect batch of series')
+        x, y = crossing_point(xdata, ydata, 5)
+        self.assertEqual((x, y), (3, 6), 'Incorrect crossing point')
+        x, y = crossing_point(xdata, ydata, 5, interpolate=True)
+        self.assertEqual((x, y), (2.5, 5), 'Incorrect interpolated point')
+        self.assertTrue(np.isnan(crossing_point(xdata, ydata, 13)[0]),
+                        'Missing crossing found')
+        self.assertEqual(calculate_times_to([xdata, xdata[:2]], [ydata, ydata[:2]], 5),
+                         [3, None], 'Incorrect times')
+        self.assertEqual(calculate_gradients([xdata, xdata], [ydata, ydata * 3], 2, 8),
+                         [2, 6], 'Incorrect gradients')
+
     def test_remove_outliers(self):
         xdata = np.array([0, 1, 2, 3, 4, 5, 6, 7, 8, 9])
         ydata = np.array([0, 1, 2, 3, 4, 5, 6, 7, 8, 30])
@@ -165,6 +296,92 @@ class DataTest(unittest.TestCase):
         newx, newy = remove_outliers(xdata, ydata, None, None, True, 5)
         self.assertEqual(len(newx), 9)
         self.assertEqual(len(newy), 9)
+        # Missing values are kept by the thresholds
+        ydata = np.array([0, 1, np.nan, 3, 4, 5, 6, 7, 8, 30])
+        newx, newy = remove_outliers(xdata, ydata, 2, 6, False, 0)
+        self.assertEqual(list(newx), [2, 3, 4, 5, 6])
+        # Consecutive jumps remove every other point in each pass
+        ydata = np.array([0, 0, 9, 0, 9, 0, 0, 0, 0, 0])
+        newx, newy = remove_outliers(xdata, ydata, None, None, True, 2)
+        self.assertEqual(list(newx), [0, 1, 3, 5, 6, 7, 8, 9])
+        newx, newy = remove_outliers(xdata[:1], ydata[:1], None, None, True, 2)
+        self.assertEqual(len(newx), 1)
+
+    def test_sorted_median_mad(self):
+        ydata = np.round(np.sin(np.arange(300) * 1.7) * 5)
+        for window in [3, 11, 31]:
+            median, mad = rolling_median_mad(ydata, window)
+            sorted_median, sorted_mad = sorted_median_mad(ydata, window)
+            self.assertTrue(np.array_equal(median, sorted_median),
+                            'Incorrect rolling median')
+            self.assertTrue(np.allclose(mad, sorted_mad),
+                            'Incorrect rolling MAD')
+        # Large windows use the sorted window
+        median, mad = rolling_median_mad(ydata, 101)
+        self.assertEqual(median[150], np.median(ydata[100:201]),
+                         'Incorrect median for a large window')
+        self.assertAlmostEqual(mad[0], 1.4826 * np.median(
+            np.abs(ydata[:101] - np.median(ydata[:101]))), 5,
+            'Incorrect MAD for a large window')
+
+    def test_rolling_outliers(self):
+        xdata = np.arange(50.)
+        noise = np.random.RandomState(1).normal(scale=0.05, size=50)
+        ydata = np.sin(xdata / 10.) + noise
+        ydata[[10, 30]] += 5
+        ydata[20] = np.nan
+        for method in ['rolling MAD', 'z-score']:
+            newx, newy = remove_outliers(xdata, ydata, None, None, True, 0,
+                                         method, 7, 3)
+            self.assertEqual(len(newx), 48, 'Incorrect points removed')
+            self.assertTrue(10 not in newx and 30 not in newx,
+                            'Outliers not removed')
+            self.assertTrue(np.isnan(newy[newx == 20][0]),
+                            'Missing value not kept')
+        # Hampel filter replaces outliers with the rolling median
+        newx, newy = remove_outliers(xdata, ydata, None, None, True, 0,
+                                     'hampel', 7, 3)
+        self.assertEqual(len(newx), 50, 'Points removed by hampel filter')
+        self.assertAlmostEqual(newy[10], np.sin(1.), delta=0.2,
+                               msg='Outlier not replaced by median')
+        self.assertEqual(newy[11], ydata[11], 'Good point changed')
+        # Quantised readings with a zero MAD only lose real outliers
+        ydata = np.full(60, 0.10)
+        ydata[::5] = 0.11
+        ydata[32] = 0.5
+        for method in ['rolling MAD', 'hampel']:
+            newx, newy = remove_outliers(np.arange(60.), ydata, None,
+                                         None, True, 0, method, 11, 3)
+            self.assertEqual(np.count_nonzero(newy == 0.11), 12,
+                             'Quantised readings removed by %s' % method)
+            self.assertFalse(np.any(newy == 0.5),
+                             'Outlier not removed by %s' % method)
+
+    def test_savitzky_golay(self):
+        # A quadratic is unchanged by a second order filter
+        xdata = np.arange(100.)
+        ydata = 0.5 * xdata**2 - 3 * xdata
+        smoothed = savitzky_golay(ydata, 11, 2)
+        self.assertTrue(np.allclose(smoothed[5:-5], ydata[5:-5]),
+                        'Quadratic changed by smoothing')
+        gradient = savitzky_golay(ydata, 11, 2, 1)
+        self.assertTrue(np.allclose(gradient[5:-5], xdata[5:-5] - 3),
+                        'Incorrect derivative')
+        # Rows of a 2D array are smoothed separately
+        noisy = ydata + np.random.RandomState(1).normal(size=100)
+        batch = savitzky_golay(np.stack([ydata, noisy]), 11, 2)
+        self.assertTrue(np.allclose(batch[1], savitzky_golay(noisy, 11, 2)),
+                        'Incorrect batch smoothing')
+        # Long series use FFT convolution
+        long_y = np.tile(noisy, 600)
+        fft = savitzky_golay(long_y, 61, 2)
+        direct = savitzky_golay(long_y[:1000], 61, 2)
+        self.assertTrue(np.allclose(fft[100:900], direct[100:900]),
+                        'Incorrect FFT smoothing')
+        smoothed = savitzky_golay_batch([ydata, noisy[:50], noisy], 11, 2)
+        self.assertEqual(len(smoothed[1]), 50, 'Incorrect batch length')
+        self.assertTrue(np.allclose(smoothed[2], batch[1]),
+                        'Incorrect batch order')
 
     def test_average_data(self):
         xdata = np.array([0, 1, 2, 3, 4, 5, 6, 7, 8, 9])
@@ -181,6 +398,13 @@ class DataTest(unittest.TestCase):
             [xdata, xdata], [ydata_1, ydata_2], True)
         self.assertAlmostEqual(err[0], 4.50, 2)
         self.assertAlmostEqual(err[4], 0.50, 2)
+        # Points outside of a replicate aren't included in the average
+        newx, newy, err = average_data(
+            [xdata, xdata[2:] - 0.5], [ydata_1, ydata_2[2:]])
+        self.assertEqual(newy[0], 0, 'Replicate extrapolated')
+        self.assertTrue(np.isnan(err[0]), 'Incorrect error for one replicate')
+        self.assertEqual(newy[4], 4.25, 'Incorrect interpolated average')
+        self.assertEqual(newy[9], 9, 'Replicate extrapolated')
 
     def test_time_average(self):
         xdata = np.array([0, 1, 2, 3, 4, 5, 6, 7, 8, 9])
@@ -195,6 +419,12 @@ class DataTest(unittest.TestCase):
         newx, newy, err = time_average(xdata, ydata, 2, True)
         self.assertAlmostEqual(err[0], 0.50, 2)
         self.assertAlmostEqual(err[4], 0.50, 2)
+        # Points before 0 go in the first window, empty windows are skipped
+        xdata = np.array([-1, 0, 1, 5, 9])
+        newx, newy, err = time_average(xdata, ydata[:5], 2)
+        self.assertEqual(list(newx), [0, 5, 9], 'Incorrect windows')
+        self.assertEqual(list(newy), [1, 3, 4], 'Incorrect averages')
+        self.assertEqual(err[1], 0, 'Incorrect error for a single point')
 
     def test_time_average_array(self):
         xdata1 = np.array([0, 1, 2, 3, 4, 5, 6, 7, 8, 9])
@@ -213,6 +443,34 @@ class DataTest(unittest.TestCase):
         newx, newy, err = time_average_arrays(xdatas, ydatas, 2, True)
         self.assertAlmostEqual(err[0], 2.90, 2)
         self.assertAlmostEqual(err[4], 2.90, 2)
+        # Points before 0 aren't included
+        newx, newy, err = time_average_arrays([xdata1 - 1, xdata2], ydatas, 2)
+        self.assertEqual(newx[0], 0.5, 'Negative times included')
+        self.assertEqual(newy[0], 6, 'Negative times included')
+
+    def test_time_average_blocks(self):
+        xdata = self.data.xaxis.data
+        ydata = self.data.signals[0].data
+        blocks = [(xdata[i:i+50], ydata[i:i+50])
+                  for i in range(0, xdata.size, 50)]
+        for show_err in [False, True]:
+            newx, newy, err = time_average(xdata, ydata, 10000, show_err)
+            blockx, blocky, blockerr = time_average_blocks(blocks, 10000,
+                                                           show_err)
+            self.assertEqual(np.allclose(newx, blockx), True,
+                             'Incorrect block x average')
+            self.assertEqual(np.allclose(newy, blocky), True,
+                             'Incorrect block y average')
+            self.assertEqual(np.allclose(err, blockerr), True,
+                             'Incorrect block error')
+        mean, error = average_blocks(blocks, 100000, 200000)
+        mask = (xdata >= 100000) & (xdata <= 200000)
+        self.assertAlmostEqual(mean, np.mean(ydata[mask]), 10)
+        self.assertAlmostEqual(error, np.std(ydata[mask], ddof=1), 10)
+        self.assertEqual(average_blocks(blocks, -2, -1), (None, None))
+        mean, error = average_blocks(blocks, xdata[3], xdata[3])
+        self.assertEqual(mean, ydata[3], 'Incorrect single point average')
+        self.assertTrue(np.isnan(error), 'Single point has an error')
 
     def test_get_exponent(self):
         self.assertEqual(get_exponent(100), 2)
@@ -248,6 +506,44 @@ class DataTest(unittest.TestCase):
         self.assertEqual(ydata[4], 0.106)
         self.assertEqual(err, None)
 
+    def test_processing_config(self):
+        settings = config.processing_config()
+        self.assertEqual(hash(settings), hash(config.processing_config()),
+                         'Snapshot not hashable')
+        self.assertEqual(pickle.loads(pickle.dumps(settings)), settings,
+                         'Snapshot not picklable')
+        # Explicit settings are used instead of the global configuration
+        _, ydata, _ = self.manager.get_xy_data(
+            0, 'OD', settings=settings._replace(initial_y=1))
+        self.assertAlmostEqual(ydata[0], 1, 5, 'Settings not used')
+        _, ydata, _ = self.manager.get_xy_data(0, 'OD')
+        self.assertNotAlmostEqual(ydata[0], 1, 5, 'Settings kept')
+
+    def test_processing_cache(self):
+        cache = self.manager.cache
+        xdata, ydata, _ = self.manager.get_xy_data(0, 'OD')
+        misses = cache.misses
+        # Settings that don't affect the data don't recalculate anything
+        config.legend_title = 'Legend'
+        new_xdata, _, _ = self.manager.get_xy_data(0, 'OD')
+        config.legend_title = ''
+        self.assertTrue(new_xdata is xdata, 'Result not cached')
+        self.assertEqual(cache.misses, misses, 'Result recalculated')
+        # Smoothing only recalculates the steps after it
+        config.smooth = True
+        _, smoothed, _ = self.manager.get_xy_data(0, 'OD')
+        config.smooth = False
+        self.assertEqual(cache.misses, misses + 3, 'Incorrect steps redone')
+        self.assertNotEqual(smoothed[4], ydata[4], 'Data not smoothed')
+        # Changing the data invalidates its results
+        self.data.signals[0].append(1)
+        _, new_ydata, _ = self.manager.get_xy_data(0, 'OD')
+        self.assertEqual(new_ydata.size, ydata.size + 1, 'Old data used')
+        self.assertFalse(ydata.flags.writeable, 'Cached data can be changed')
+        cache.clear()
+        self.assertEqual(len(cache.entries), 0, 'Results not cleared')
+        self.assertEqual(cache.hits + cache.misses, 0, 'Counts not cleared')
+
     def test_get_titles(self):
         self.assertEqual(self.manager.get_titles(0), ('Time [s]', ''))
 
@@ -297,10 +593,47 @@ class DataTest(unittest.TestCase):
         self.assertAlmostEqual(condition_at[0], 0.31, 2)
 
     def test_get_all_fit_params(self):
-        fit_params, error = self.manager.get_all_fit_params(
+        fit_params, error, status = self.manager.get_all_fit_params(
             'OD', 'linear', 100000, 200000, 'Gradient (p1)')
         self.assertAlmostEqual(fit_params[0], 1.41E-6, 2)
         self.assertAlmostEqual(error[0], 3.39E-8, 2)
+        self.assertEqual(status, [CONVERGED], 'Incorrect fit status')
+        # Fits that can't be done are flagged rather than raised
+        fit_params, error, status = self.manager.get_all_fit_params(
+            'OD', 'zweitering', 10000000, 20000000, 'Biomass yield (A)')
+        self.assertTrue(np.isnan(fit_params[0]), 'Failed fit has a value')
+        self.assertEqual(status, [FAILED], 'Failed fit not flagged')
+
+    def test_fit_batch(self):
+        xdata = np.linspace(0, 10, 50)
+        # Finite bounds so the fits go through curve_fit in the workers
+        jobs = [FitJob('linear', xdata, 1 + i * xdata, bounds=(-20, 20))
+                for i in range(10)]
+        # Fits that can't be done are returned instead of raised
+        jobs.append(FitJob('linear', [0], [1]))
+        jobs.append(FitJob('linear', xdata, 1 + xdata, bounds=([0, 0], [2, 0.5])))
+        jobs.append(FitJob('linear', xdata, 1 - 0.01 * xdata,
+                           bounds=([0, 0], [2, 0.5])))
+        # Small parameters well inside a bound aren't on it
+        jobs.append(FitJob('linear', xdata, 1 + 1E-6 * xdata,
+                           bounds=([0, 0], [10, 1])))
+        # Two points for two parameters leaves nothing to estimate errors
+        jobs.append(FitJob('linear', [0, 1], [1, 2], bounds=(-20, 20)))
+        jobs.append(FitJob('linear', [0, 1], [1, 2]))
+        serial = fit_batch(jobs)
+        parallel = fit_batch(jobs, 2)
+        for i in range(10):
+            self.assertAlmostEqual(parallel[i].params[1], i, 5, 'Wrong order')
+            self.assertEqual(parallel[i].status, CONVERGED, 'Fit failed')
+        self.assertEqual(parallel[10].status, FAILED, 'Failure not caught')
+        self.assertTrue(np.isnan(parallel[10].params[0]), 'Failed fit has values')
+        self.assertEqual(parallel[11].status, HIT_BOUNDS, 'Bound not found')
+        self.assertEqual(parallel[12].status, HIT_BOUNDS, 'Bound not found')
+        self.assertEqual(parallel[13].status, CONVERGED, 'Bound found')
+        self.assertEqual(parallel[14].status, NO_ERRORS, 'Errors not checked')
+        self.assertEqual(parallel[15].status, NO_ERRORS, 'Errors not checked')
+        self.assertEqual([r.status for r in serial],
+                         [r.status for r in parallel], 'Parallel fits differ')
 
     def test_get_fit_data(self):
         fit_x, fit_y, fit_sigma = self.manager.get_fit_data(
@@ -309,6 +642,45 @@ class DataTest(unittest.TestCase):
         self.assertEqual(len(fit_y), 55)
         self.assertEqual(fit_sigma, None)
 
+    def test_replicate_fit(self):
+        # The replicate starts later so the first points only have one value
+        self.manager.growth_data.add_replicate(
+            read_algem_pro('test/files/Algem-Pro/850.txt'), 0)
+        _, _, yerr = self.manager.get_xy_data(0, 'OD')
+        self.assertTrue(np.isnan(yerr[0]), 'Error given for one replicate')
+        fit_x, _, fit_sigma = self.manager.get_fit_data(0, 'OD', 0, 300000)
+        self.assertTrue(np.all(fit_sigma > 0), 'Unusable errors in fit')
+        self.assertEqual(fit_x.size, fit_sigma.size, 'Errors not matched')
+        for fit_name in ['linear', 'quadratic']:
+            result = self.manager.get_all_fits('OD', fit_name, 0, 300000)[0]
+            self.assertEqual(result.status, CONVERGED, 'Fit not converged')
+            self.assertTrue(np.all(np.isfinite(result.errors())),
+                            'Infinite fit errors for %s' % fit_name)
+
+    def test_fit_cache(self):
+        cache = self.manager.fit_cache
+        fit_result, _ = self.manager.get_fit(0, 'OD', 'zweitering')
+        misses = cache.misses
+        new_result, _ = self.manager.get_fit(0, 'OD', 'zweitering')
+        self.assertTrue(new_result is fit_result, 'Fit not cached')
+        self.assertEqual(cache.misses, misses, 'Fit recalculated')
+        self.assertFalse(fit_result.flags.writeable, 'Cached fit can be changed')
+        # Any change to the range or the data fits again
+        self.manager.get_fit(0, 'OD', 'zweitering', 0, 500000)
+        self.assertEqual(cache.misses, misses + 1, 'Range not used')
+        self.data.signals[0].data = self.data.signals[0].data * 2
+        self.manager.get_fit(0, 'OD', 'zweitering')
+        self.assertEqual(cache.misses, misses + 2, 'Old data used')
+        # Only the most recent fits are kept
+        size = config.fit_cache_size
+        config.fit_cache_size = 1
+        self.manager.get_fit(0, 'OD', 'linear')
+        config.fit_cache_size = size
+        self.assertEqual(len(cache.entries), 1, 'Old fits kept')
+        cache.clear()
+        self.assertEqual(len(cache.entries), 0, 'Fits not cleared')
+        self.assertEqual(cache.hits + cache.misses, 0, 'Counts not cleared')
+
     def test_get_fit(self):
         fit_result, _ = self.manager.get_fit(
             0, 'OD', 'flat line', 100000, 200000)
@@ -326,10 +698,53 @@ class DataTest(unittest.TestCase):
         self.assertAlmostEqual(fit_result[0], 0.09, 2)
         self.assertAlmostEqual(fit_result[1], 1.00E-3, 2)
         fit_result, _ = self.manager.get_fit(0, 'OD', 'zweitering')
-        self.assertAlmostEqual(fit_result[0], 0.11, 2)
-        self.assertAlmostEqual(fit_result[1], 1.61, 2)
-        self.assertAlmostEqual(fit_result[2], 1.27, 2)
-        self.assertAlmostEqual(fit_result[3], 2.42, 2)
+        self.assertAlmostEqual(fit_result[0], 0.085, 2)
+        self.assertAlmostEqual(fit_result[1], 3.26, 2)
+        # Compare relative to the size of the small parameters
+        self.assertAlmostEqual(fit_result[2] / 1.07E-5, 1, 2)
+        self.assertAlmostEqual(fit_result[3] / 2.47E5, 1, 2)
+
+    def test_direct_fit(self):
+        xdata = np.linspace(0, 200000, 100)
+        noise = 1 + 0.03 * np.sin(xdata)
+        sigma = 0.01 + 0.01 * np.cos(xdata)**2
+        for name, values in [('flat line', [0.5]), ('linear', [0.5, 1E-5]),
+                             ('quadratic', [0.5, 1E-5, 1E-11]),
+                             ('exponential', [0.1, 2E-5])]:
+            model = get_model(name)
+            ydata = model.func()(xdata, *values) * noise
+            job = FitJob(name, xdata, ydata, sigma)
+            direct = direct_fit(job, model)
+            fitted = iterative_fit(job)
+            self.assertTrue(direct is not None, 'No direct fit for %s' % name)
+            errors = fitted.errors()
+            # Both fits should agree well within the parameter errors
+            self.assertTrue(np.all(np.abs(direct.params - fitted.params) <
+                                   1E-3 * errors),
+                            'Wrong values for %s' % name)
+            self.assertTrue(np.allclose(direct.errors(), errors, rtol=1E-3),
+                            'Wrong errors for %s' % name)
+        # Bounded and non-positive exponential fits are left to curve_fit
+        job = FitJob('linear', xdata, xdata, bounds=(0, 1))
+        self.assertEqual(direct_fit(job, get_model('linear')), None)
+        job = FitJob('exponential', xdata, xdata - 1)
+        self.assertEqual(direct_fit(job, get_model('exponential')), None)
+
+    def test_initial_guess(self):
+        xdata = np.linspace(0, 100, 201)
+        model = get_model('zweitering')
+        values = [0.1, 2, 0.05, 30]
+        ydata = model.func()(xdata, *values)
+        guess = model.initial_guess(xdata, ydata)
+        for i, value in enumerate(values):
+            self.assertAlmostEqual(guess[i], value, delta=0.2 * value,
+                                   msg='Bad guess for %s' % model.params[i])
+        model = get_model('exponential')
+        guess = model.initial_guess(xdata, model.func()(xdata, 0.5, 0.02))
+        self.assertAlmostEqual(guess[0], 0.5, 5)
+        self.assertAlmostEqual(guess[1], 0.02, 5)
+        # Not enough data falls back to ones
+        self.assertEqual(list(model.initial_guess([1], [1])), [1, 1])
 
 
 if __name__ == '__main__':
@@ -1,18 +1,41 @@
 import unittest
 import sys
 import os
+import queue
+import threading
+import shutil
+import tempfile
+import zipfile
+import numpy as np
 from datetime import datetime, date, time
 
-from ada.reader.read_algem_pro import read_algem_pro
+from ada.reader.read_algem_pro import read_algem_pro, iter_algem_pro
 from ada.reader.read_ada import read_ada
-from ada.reader.read_algem_ht24 import read_algem_ht24, read_algem_ht24_details
+from ada.reader.ada_format import write_ada_binary
+from ada.reader.read_algem_ht24 import (read_algem_ht24, read_algem_ht24_details,
+                                        iter_algem_ht24)
 from ada.reader.read_algem_ht24_txt import read_algem_ht24_txt
 from ada.reader.read_ip import read_ip
 from ada.reader.read_psi import read_psi
 from ada.reader.read_calibration import read_calibration
+from ada.reader.read_ods import iter_sheets, sheet_cell
+from ada.reader.read_files import ReadJob, read_files
+from ada.reader.progress import ReadProgress, LoadCancelled
+from ada.reader.cache import read_cached
+import ada.reader.cache as cache
+import ada.configuration as config
 
 
 class ReaderTest(unittest.TestCase):
+    # Keep the cache away from the user's one
+    def setUp(self):
+        self.cache_dir = config.cache_dir
+        config.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(config.cache_dir, ignore_errors=True)
+        config.cache_dir = self.cache_dir
+
     # ====== reader/read_algem_pro.py ========
     def test_read_algem_pro(self):
         data = read_algem_pro('test/files/Algem-Pro/150.txt')
@@ -29,6 +52,28 @@ class ReaderTest(unittest.TestCase):
         self.assertEqual(data.xaxis.data.size, 426, 'Incorrect x data read')
         self.assertEqual(len(data.signals), 1, 'Incorrect y data read')
 
+    def test_read_algem_pro_downsample(self):
+        data = read_algem_pro('test/files/Algem-Pro/150.txt', 10)
+        self.assertEqual(data.xaxis.data.size, 42, 'Incorrect x data read')
+        self.assertEqual(data.xaxis.data[0], 16201, 'Incorrect x data read')
+        self.assertEqual(data.signals[0].data.size, 42,
+                         'Incorrect y data read')
+        self.assertEqual(data.signals[0].data[0], 0.081,
+                         'Incorrect y data read')
+
+    def test_iter_algem_pro(self):
+        data = read_algem_pro('test/files/Algem-Pro/150.txt', 3)
+        blocks = [values for _, values in
+                  iter_algem_pro('test/files/Algem-Pro/150.txt', 3,
+                                 block_size=10)]
+        self.assertEqual(sum(values.shape[0] for values in blocks), 142,
+                         'Incorrect number of rows')
+        values = np.concatenate(blocks)
+        self.assertEqual(np.array_equal(values[:, 0], data.xaxis.data), True,
+                         'Incorrect x data in blocks')
+        self.assertEqual(np.array_equal(values[:, 1], data.signals[0].data),
+                         True, 'Incorrect y data in blocks')
+
     # ====== reader/read_ada.py ========
     def test_read_ada(self):
         data, conditions = read_ada('test/files/ADA/IP_T-Iso.csv')
@@ -46,6 +91,39 @@ class ReaderTest(unittest.TestCase):
         self.assertEqual(len(conditions.signals), 6,
                          'Incorrect condition data read')
 
+    # ====== reader/ada_format.py ========
+    def test_read_ada_binary(self):
+        data, conditions = read_ada('test/files/ADA/IP_T-Iso.csv')
+        file_name = os.path.join(config.cache_dir, 'IP_T-Iso.ada')
+        write_ada_binary(file_name, data, conditions)
+        binary, binary_conditions = read_ada(file_name)
+        self.assertEqual(binary.label, 'IP_T-Iso', 'Incorrect label read')
+        self.assertEqual(binary.date, data.date, 'Incorrect date read')
+        self.assertEqual(binary.time, data.time, 'Incorrect time read')
+        self.assertEqual(binary.reactor, data.reactor,
+                         'Incorrect reactor read')
+        self.assertEqual(binary.xaxis.unit, 's', 'Incorrect x unit read')
+        self.assertEqual(np.array_equal(binary.xaxis.data, data.xaxis.data),
+                         True, 'Incorrect x data read')
+        self.assertEqual(np.array_equal(binary.signals[0].data,
+                                        data.signals[0].data),
+                         True, 'Incorrect y data read')
+        self.assertEqual(len(binary_conditions.signals), 6,
+                         'Incorrect condition data read')
+        self.assertEqual(np.array_equal(binary_conditions.signals[5].data,
+                                        conditions.signals[5].data),
+                         True, 'Incorrect condition data read')
+        # The data should be mapped rather than copied
+        self.assertEqual(binary.xaxis.data.flags.writeable, False,
+                         'Data not memory mapped')
+        # Appending to mapped data should not touch the file
+        binary.xaxis.append(1e9)
+        self.assertEqual(read_ada(file_name)[0].xaxis.data.size,
+                         data.xaxis.data.size, 'File modified by append')
+        write_ada_binary(file_name, data)
+        self.assertEqual(read_ada(file_name)[1], None,
+                         'Incorrect conditions read')
+
     # ====== reader/read_algem_ht24.py ========
     def test_read_algem_ht24(self):
         data_list = read_algem_ht24('test/files/Algem-HT24/19775 OD.csv')
@@ -59,6 +137,38 @@ class ReaderTest(unittest.TestCase):
         self.assertEqual(data.xaxis.unit, 's', 'Incorrect x unit read')
         self.assertEqual(data.xaxis.data.size, 1147, 'Incorrect x data read')
         self.assertEqual(len(data.signals), 1, 'Incorrect y data read')
+        self.assertEqual(data.signals[0].data[1], 0.019,
+                         'Incorrect y data read')
+        # Reactors should share a single time array
+        self.assertEqual(np.shares_memory(data.xaxis.data,
+                                          data_list[23].xaxis.data),
+                         True, 'Time data not shared')
+        data_list = read_algem_ht24('test/files/Algem-HT24/19775 OD.csv', 3)
+        self.assertEqual(data_list[0].xaxis.data.size, 383,
+                         'Incorrect downsampling')
+        self.assertEqual(data_list[0].xaxis.data[1], 2371,
+                         'Incorrect downsampling')
+        # Times in other units are converted to seconds
+        data_list = read_algem_ht24('test/files/Algem-HT24/19775 OD minutes.csv')
+        self.assertEqual(data_list[0].xaxis.unit, 'min', 'Incorrect x unit read')
+        self.assertEqual(data_list[0].xaxis.data[0], 34260,
+                         'Time not converted to seconds')
+        self.assertEqual(data_list[0].xaxis.data[1], 70260,
+                         'Time not converted to seconds')
+
+    def test_iter_algem_ht24(self):
+        data_list = read_algem_ht24('test/files/Algem-HT24/19775 OD.csv')
+        blocks = [values for _, values in
+                  iter_algem_ht24('test/files/Algem-HT24/19775 OD.csv',
+                                  block_size=100)]
+        self.assertEqual(len(blocks), 12, 'Incorrect number of blocks')
+        values = np.concatenate(blocks)
+        self.assertEqual(np.array_equal(values[:, 0],
+                                        data_list[0].xaxis.data),
+                         True, 'Incorrect x data in blocks')
+        self.assertEqual(np.array_equal(values[:, 24],
+                                        data_list[23].signals[0].data),
+                         True, 'Incorrect y data in blocks')
 
     def test_read_algem_ht24_details(self):
         data_list, replicate_list = read_algem_ht24_details('test/files/Algem-HT24/19775 OD.csv',
@@ -160,6 +270,48 @@ class ReaderTest(unittest.TestCase):
         self.assertEqual(len(conditions.signals), 6,
                          'Incorrect condition y data read')
 
+    # ====== reader/read_ods.py ========
+    def test_read_ods(self):
+        file_name = os.path.join(config.cache_dir, 'test.ods')
+        content = (
+            '<office:document-content '
+            'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+            'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" '
+            'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0">'
+            '<office:body><office:spreadsheet>'
+            '<table:table table:name="Info"><table:table-row>'
+            '<table:table-cell office:value-type="string">'
+            '<text:p>a<text:s text:c="2"/>b</text:p></table:table-cell>'
+            '</table:table-row></table:table>'
+            '<table:table table:name="Data">'
+            '<table:table-row table:number-rows-repeated="2">'
+            '<table:table-cell table:number-columns-repeated="2"/>'
+            '<table:table-cell office:value-type="float" office:value="1.5">'
+            '<text:p>1.5</text:p></table:table-cell>'
+            '<table:table-cell table:number-columns-repeated="1000"/>'
+            '</table:table-row>'
+            '<table:table-row table:number-rows-repeated="1000000">'
+            '<table:table-cell table:number-columns-repeated="1000"/>'
+            '</table:table-row></table:table>'
+            '</office:spreadsheet></office:body></office:document-content>')
+        with zipfile.ZipFile(file_name, 'w') as archive:
+            archive.writestr('content.xml', content)
+        sheets = {name: list(rows) for name, rows in iter_sheets(file_name)}
+        self.assertEqual(list(sheets.keys()), ['Info', 'Data'],
+                         'Incorrect sheets read')
+        self.assertEqual(sheet_cell(sheets['Info'], 0, 0).plaintext(),
+                         'a  b', 'Incorrect text read')
+        self.assertEqual(len(sheets['Data']), 2,
+                         'Incorrect number of rows read')
+        self.assertEqual(len(sheets['Data'][1]), 3,
+                         'Incorrect number of columns read')
+        self.assertEqual(sheet_cell(sheets['Data'], 1, 2).value, 1.5,
+                         'Incorrect value read')
+        self.assertEqual(sheet_cell(sheets['Data'], 1, 0).value, None,
+                         'Incorrect empty value read')
+        self.assertEqual(sheet_cell(sheets['Data'], 5, 5).value, None,
+                         'Incorrect missing value read')
+
     # ====== reader/read_calibration.py ========
     def test_read_calibration(self):
         calibration = read_calibration('test/files/calibration.csv')
@@ -169,6 +321,118 @@ class ReaderTest(unittest.TestCase):
                          'Incorrect true measurements')
         self.assertEqual(len(calibration.measured), 7,
                          'Incorrect measured measurements')
+        # The selected model is fitted when the file is read
+        calibration = read_calibration('test/files/calibration.csv',
+                                       'polynomial', 3)
+        self.assertTrue(('polynomial', 3) in calibration.models,
+                        'Calibration model not fitted')
+        for degree in [7, 0, -1]:
+            with self.assertRaises(RuntimeError):
+                read_calibration('test/files/calibration.csv', 'polynomial',
+                                 degree)
+
+    # ====== reader/read_files.py ========
+    def test_read_files(self):
+        jobs = [ReadJob('Algem Pro', 'test/files/Algem-Pro/150.txt'),
+                ReadJob('IP', 'test/files/IP/IP_T-Iso.csv'),
+                ReadJob('Algem Pro', 'test/files/Algem-Pro/500.txt'),
+                ReadJob('Algem Pro', 'test/files/Algem-Pro/850.txt', None,
+                        10, conditions=True)]
+        results = read_files(jobs, 2)
+        self.assertEqual(len(results), 4, 'Incorrect number of results')
+        self.assertEqual(results[0].label, '150', 'Incorrect result order')
+        self.assertEqual(results[1][0].label, 'IP_T-Iso',
+                         'Incorrect result order')
+        self.assertEqual(results[2].label, '500', 'Incorrect result order')
+        self.assertEqual(results[3].xaxis.data.size, 42,
+                         'Incorrect conditions downsampling')
+        with self.assertRaises(RuntimeError):
+            read_files([ReadJob('PSI', 'test/files/Algem-Pro/150.txt')])
+
+    # ====== reader/progress.py ========
+    def test_read_progress(self):
+        reports = queue.Queue()
+        progress = ReadProgress(reports, threading.Event())
+        read_files([ReadJob('IP', 'test/files/IP/IP_T-Iso.csv')],
+                   progress=progress)
+        last = None
+        while not reports.empty():
+            last = reports.get()
+        self.assertEqual(last[0], 0, 'Incorrect file index')
+        self.assertEqual(last[1], 18935, 'Incorrect number of rows')
+        self.assertEqual(last[3], True, 'File not finished')
+        # Spreadsheets report how far through the compressed file they are
+        file_name = 'test/files/PSI/PSI_bioreactor.ods'
+        read_files([ReadJob('PSI', file_name)], progress=progress)
+        nbytes = [reports.get()[2] for _ in range(reports.qsize())]
+        self.assertTrue(0 < nbytes[0] < nbytes[-1] <= os.path.getsize(
+            file_name), 'Incorrect bytes read from spreadsheet')
+        progress.cancel_event.set()
+        with self.assertRaises(LoadCancelled):
+            read_ip('test/files/IP/IP_T-Iso.csv', progress)
+
+    # ====== reader/cache.py ========
+    def test_read_cached(self):
+        file_name = os.path.join(config.cache_dir, '150.txt')
+        shutil.copy('test/files/Algem-Pro/150.txt', file_name)
+        data = read_cached(read_algem_pro, [file_name], [2])
+        self.assertEqual(len(os.listdir(config.cache_dir)), 2,
+                         'Cache entry not written')
+        cached = read_cached(read_algem_pro, [file_name], [2])
+        self.assertEqual(cached.date, data.date, 'Incorrect cached date')
+        self.assertEqual(cached.reactor, data.reactor,
+                         'Incorrect cached reactor')
+        self.assertEqual(np.array_equal(cached.xaxis.data, data.xaxis.data),
+                         True, 'Incorrect cached x data')
+        self.assertEqual(np.array_equal(cached.signals[0].data,
+                                        data.signals[0].data),
+                         True, 'Incorrect cached signal data')
+        # Changing the file should invalidate the entry
+        with open(file_name, 'a') as f:
+            f.write('\n')
+        self.assertEqual(read_cached(read_algem_pro, [file_name], [2])
+                         .xaxis.data.size, data.xaxis.data.size,
+                         'Incorrect data after file changed')
+        # Nested results should survive the round trip
+        details = read_cached(read_algem_ht24_details,
+                              ['test/files/Algem-HT24/19775 OD.csv',
+                               'test/files/Algem-HT24/19775 Details.csv'])
+        cached = read_cached(read_algem_ht24_details,
+                             ['test/files/Algem-HT24/19775 OD.csv',
+                              'test/files/Algem-HT24/19775 Details.csv'])
+        self.assertEqual(len(cached[0]), len(details[0]),
+                         'Incorrect number of cached datasets')
+        self.assertEqual(cached[0][1].label, details[0][1].label,
+                         'Incorrect cached label')
+        self.assertEqual([(d.label, i) for d, i in cached[1]],
+                         [(d.label, i) for d, i in details[1]],
+                         'Incorrect cached replicate information')
+        # Only the newest entry should be kept with a tiny cache
+        cache_size = config.cache_size
+        config.cache_size = 1e-6
+        read_cached(read_algem_pro, [file_name])
+        config.cache_size = cache_size
+        entries = [f for f in os.listdir(config.cache_dir)
+                   if f.endswith('.npz')]
+        self.assertEqual(len(entries), 1, 'Cache not evicted')
+
+    def test_read_cached_touched(self):
+        file_name = os.path.join(config.cache_dir, '150.txt')
+        shutil.copy('test/files/Algem-Pro/150.txt', file_name)
+        read_cached(read_algem_pro, [file_name])
+        # A file with a new modification time but the same contents is only
+        # hashed once, after that the stored file information is updated
+        stat = os.stat(file_name)
+        os.utime(file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        hashed = []
+        file_digest = cache.file_digest
+        cache.file_digest = lambda f: hashed.append(f) or file_digest(f)
+        try:
+            read_cached(read_algem_pro, [file_name])
+            read_cached(read_algem_pro, [file_name])
+        finally:
+            cache.file_digest = file_digest
+        self.assertEqual(hashed, [file_name], 'File hashed more than once')
 
 
 if __name__ == '__main__':